@@ -0,0 +1,105 @@
+# benchmarks/bench_allocation.py
+"""
+需求分配的微基准：比较排序注水法（calculations.water_fill）与逐轮重新分配溢出需求的朴素实现
+在 1 万玩家时的耗时，并检查两者的分配结果一致。
+
+朴素实现每一轮把剩余需求按吸引力分给未卖空的玩家，有玩家超出库存就截断后重新分配。
+每一轮是一次 O(P) 的向量运算（1 万玩家约 0.1 ms），注水法是一次排序加前缀和（约 1 ms），
+因此只有朴素实现需要十轮以上时注水法才更快。随机数据通常不超过十轮，这时朴素实现反而更快。
+
+"adversarial" 场景按水位排好一串玩家，使朴素实现每轮恰好只卖空其中一位。
+要让每轮只卖空一位，这串玩家的吸引力必须逐位按固定倍数递减，跨度随轮数指数增长：
+30 轮时已达 10^14，超过约 40 轮后双精度浮点数下两种实现都不再精确。
+所以 O(P²) 的最坏情况实际上达不到。注水法的好处是耗时有上界、与输入无关，而不是平均更快。
+
+运行: python -m benchmarks.bench_allocation
+"""
+
+import sys
+import time
+import numpy as np
+from game_logic.calculations import water_fill, OUTSIDE_OPTION_WEIGHT
+
+NUM_PLAYERS = 10000
+
+
+def iterative_fill(market_size: float, weights: np.ndarray, caps: np.ndarray,
+                   outside_weight: float = OUTSIDE_OPTION_WEIGHT):
+    """逐轮重新分配溢出需求，返回 (分配量, 轮数)。"""
+    allocation = np.zeros_like(weights)
+    active = weights > 0
+    remaining = market_size
+    passes = 0
+    while remaining > 0:
+        passes += 1
+        total_weight = weights[active].sum() + outside_weight
+        if total_weight <= 0:
+            break
+        share = np.where(active, remaining * weights / total_weight, 0)
+        over = active & (allocation + share > caps)
+        if not over.any():
+            allocation += share
+            break
+        remaining -= (caps[over] - allocation[over]).sum()
+        allocation[over] = caps[over]
+        active &= ~over
+    return allocation, passes
+
+
+def _timed(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scenarios(rng):
+    """(名称, 总需求, 吸引力, 库存上限)"""
+    n = NUM_PLAYERS
+    weights = rng.exponential(1.0, n)
+    yield "random caps", 5e5, weights, rng.uniform(0, 100, n)
+    # 卖空水位（库存 / 吸引力）跨越多个数量级，需求接近总库存：朴素实现需要较多轮
+    heavy = rng.pareto(1.0, n) + 1e-3
+    spread_caps = heavy * np.exp(rng.normal(0, 3, n))
+    yield "spread levels", spread_caps.sum() * 0.99, heavy, spread_caps
+    yield "ties", 5e5, np.repeat([1.0, 2.0], n // 2), np.repeat([20.0, 80.0], n // 2)
+    for passes in (10, 20, 30):
+        yield (f"adversarial {passes}", *adversarial(rng, passes))
+
+
+def adversarial(rng, passes: int, ratio: float = 1.2, n: int = NUM_PLAYERS, outside_weight: float = OUTSIDE_OPTION_WEIGHT):
+    """
+    让朴素实现每轮恰好卖空一位玩家、共 passes + 1 轮的输入，返回 (总需求, 吸引力, 库存上限)。
+
+    第 k 位玩家的吸引力是此时仍未卖空的总吸引力 W_k 的 ratio / (1 + ratio)，卖空水位比当轮水位 λ_k 低 δ：
+    卖空后水位上升 ratio·δ，下一位的卖空水位取在两次水位之间，使 λ 和 δ 每轮保持同样的增量。
+    其余玩家吸引力为 1、库存足够，不会卖空。
+    """
+    rest = n - passes
+    steps = np.arange(passes)
+    chain_weights = ratio * (rest + outside_weight) * (1 + ratio) ** (passes - 1 - steps)
+    delta = 0.25
+    chain_levels = 1 + ratio * delta * steps - delta # λ_0 = 1，λ_k = 1 + ratio·δ·k
+    weights = np.concatenate([chain_weights, np.ones(rest)])
+    caps = np.concatenate([chain_levels * chain_weights, np.full(rest, 10 * (1 + ratio * delta * passes))])
+    order = rng.permutation(n)
+    return weights.sum() + outside_weight, weights[order], caps[order]
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{NUM_PLAYERS} players, Python {sys.version.split()[0]}")
+    print(f"{'scenario':<16}{'water_fill (ms)':>17}{'iterative (ms)':>16}{'passes':>8}{'max diff':>11}")
+    for name, market_size, weights, caps in scenarios(rng):
+        size = np.array([market_size])
+        fast = _timed(lambda: water_fill(size, weights[:, None], caps[:, None]))
+        slow = _timed(lambda: iterative_fill(market_size, weights, caps), repeat=1)
+        expected, passes = iterative_fill(market_size, weights, caps)
+        diff = np.abs(water_fill(size, weights[:, None], caps[:, None])[:, 0] - expected).max()
+        print(f"{name:<16}{fast * 1000:>17.2f}{slow * 1000:>16.2f}{passes:>8}{diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
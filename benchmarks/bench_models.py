@@ -0,0 +1,204 @@
+# benchmarks/bench_models.py
+"""
+Player 模型的微基准：比较 __slots__ + 生成编解码 与 基线提交中的 Player（__dict__ + 手写 .get()，
+原样复制在下面）的内存占用和 1 万玩家的批量编解码耗时。
+
+运行: python -m benchmarks.bench_models
+"""
+
+import gc
+import json
+import random
+import string
+import sys
+import time
+import tracemalloc
+from game_logic.models import Player
+
+NUM_PLAYERS = 10000
+
+
+class LegacyPlayer:
+    """基线提交中的 Player，原样复制（只改了类名）：__dict__ 实例属性、手写的字典字面量和逐字段 .get() 解码。"""
+    def __init__(self, player_id: str, company_name: str, initial_capital: float = 100000, password: str = None):
+        self.player_id = player_id
+        self.company_name = company_name
+        self.password = password if password else self._generate_password() # 新增密码
+        self.capital = initial_capital
+        self.debt = 0 # 新增贷款
+        self.production_capacity = 1000 # 初始生产能力
+        self.employees = 10 # 初始员工数
+        self.product_quality = 5 # 初始产品质量 (1-10)
+
+        # 玩家决策 (存储玩家输入的原始决策)
+        self.current_production_plan = 0
+        self.current_price = 0
+        self.current_advertising_budget = 0
+        self.current_performance_investment = 0 # 新增性能投资
+        self.current_welfare_investment = 0 # 新增福利投资
+        self.current_new_stores = {} # 新增城市店铺数量 {city_name: count}
+        self.current_loan_amount = 0 # 新增本轮贷款申请额
+        self.current_repay_loan_amount = 0 # 新增本轮还款额
+        self.main_city = "" # 主场城市
+
+        # 实际执行的投资 (经过资金/效率判断后的实际扣款和产量)
+        self.actual_production = 0
+        self.actual_advertising_investment = 0
+        self.actual_performance_investment = 0
+        self.actual_welfare_investment = 0
+        self.actual_new_stores_cost = 0
+
+        # 运营报表数据 (每回合更新)
+        self.last_round_revenue = 0
+        self.last_round_costs = 0
+        self.last_round_profit = 0
+        self.net_asset = initial_capital # 净资产 = 资金 - 负债
+
+        self.market_share = 0 # 总市场份额
+        self.cpi_per_city = {} # 每城市的CPI {city_name: cpi_value}
+        self.hidden_cpi_per_city = {} # 每城市的隐藏CPI (管理员可见)
+        self.actual_sales_per_city = {} # 每城市的实际销售量
+        self.surplus_goods = 0 # 剩余货物
+
+        # 报表购买状态 (存储玩家是否购买了城市报表)
+        self.bought_city_reports = {} # {city_name: True/False}
+
+    def _generate_password(self):
+        """生成一个8位包含大小写字母和数字的随机密码"""
+        characters = string.ascii_letters + string.digits
+        return ''.join(random.choice(characters) for i in range(8))
+
+    def to_dict(self):
+        # 方便保存到文件或数据库
+        return {
+            "player_id": self.player_id,
+            "company_name": self.company_name,
+            "password": self.password, # 保存密码
+            "capital": self.capital,
+            "debt": self.debt,
+            "production_capacity": self.production_capacity,
+            "employees": self.employees,
+            "product_quality": self.product_quality,
+            "current_production_plan": self.current_production_plan,
+            "current_price": self.current_price,
+            "current_advertising_budget": self.current_advertising_budget,
+            "current_performance_investment": self.current_performance_investment,
+            "current_welfare_investment": self.current_welfare_investment,
+            "current_new_stores": self.current_new_stores,
+            "current_loan_amount": self.current_loan_amount,
+            "current_repay_loan_amount": self.current_repay_loan_amount,
+            "main_city": self.main_city,
+            "actual_production": self.actual_production,
+            "actual_advertising_investment": self.actual_advertising_investment,
+            "actual_performance_investment": self.actual_performance_investment,
+            "actual_welfare_investment": self.actual_welfare_investment,
+            "actual_new_stores_cost": self.actual_new_stores_cost,
+            "last_round_revenue": self.last_round_revenue,
+            "last_round_costs": self.last_round_costs,
+            "last_round_profit": self.last_round_profit,
+            "net_asset": self.net_asset,
+            "market_share": self.market_share,
+            "cpi_per_city": self.cpi_per_city,
+            "hidden_cpi_per_city": self.hidden_cpi_per_city,
+            "actual_sales_per_city": self.actual_sales_per_city,
+            "surplus_goods": self.surplus_goods,
+            "bought_city_reports": self.bought_city_reports
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        player = cls(
+            player_id=data['player_id'],
+            company_name=data['company_name'],
+            initial_capital=data.get('capital', 100000),
+            password=data.get('password') # 从数据加载密码
+        )
+        # 更新其他属性，使用 .get() 避免旧数据没有新字段时出错
+        player.capital = data.get('capital', player.capital)
+        player.debt = data.get('debt', player.debt)
+        player.production_capacity = data.get('production_capacity', player.production_capacity)
+        player.employees = data.get('employees', player.employees)
+        player.product_quality = data.get('product_quality', player.product_quality)
+        player.current_production_plan = data.get('current_production_plan', player.current_production_plan)
+        player.current_price = data.get('current_price', player.current_price)
+        player.current_advertising_budget = data.get('current_advertising_budget', player.current_advertising_budget)
+        player.current_performance_investment = data.get('current_performance_investment', 0)
+        player.current_welfare_investment = data.get('current_welfare_investment', 0)
+        player.current_new_stores = data.get('current_new_stores', {})
+        player.current_loan_amount = data.get('current_loan_amount', 0)
+        player.current_repay_loan_amount = data.get('current_repay_loan_amount', 0)
+        player.main_city = data.get('main_city', "")
+        
+        player.actual_production = data.get('actual_production', 0)
+        player.actual_advertising_investment = data.get('actual_advertising_investment', 0)
+        player.actual_performance_investment = data.get('actual_performance_investment', 0)
+        player.actual_welfare_investment = data.get('actual_welfare_investment', 0)
+        player.actual_new_stores_cost = data.get('actual_new_stores_cost', 0)
+
+        player.last_round_revenue = data.get('last_round_revenue', 0)
+        player.last_round_costs = data.get('last_round_costs', 0)
+        player.last_round_profit = data.get('last_round_profit', 0)
+        player.net_asset = data.get('net_asset', player.capital) # 初始化为capital，后续计算
+        
+        player.market_share = data.get('market_share', 0)
+        player.cpi_per_city = data.get('cpi_per_city', {})
+        player.hidden_cpi_per_city = data.get('hidden_cpi_per_city', {})
+        player.actual_sales_per_city = data.get('actual_sales_per_city', {})
+        player.surplus_goods = data.get('surplus_goods', 0)
+
+        player.bought_city_reports = data.get('bought_city_reports', {})
+        return player
+
+
+def _timed(funcs: dict, repeat=15) -> dict:
+    """
+    各函数轮流运行 repeat 次，分别取最短耗时。轮流运行让机器负载的波动同样落在两种实现上；
+    与 timeit 一样计时期间关闭垃圾回收，减少批量分配对象时的抖动。
+    """
+    best = dict.fromkeys(funcs, float('inf'))
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for name, func in funcs.items():
+                start = time.perf_counter()
+                func()
+                best[name] = min(best[name], time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
+
+
+def _memory(factory):
+    tracemalloc.start()
+    objects = factory()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current
+
+
+def main():
+    records = json.loads(json.dumps([Player(f"player{i+1}", f"公司{i+1}").to_dict() for i in range(NUM_PLAYERS)]))
+
+    models = (("legacy (__dict__)", LegacyPlayer), ("schema (__slots__)", Player))
+    objects = {cls: [cls.from_dict(r) for r in records] for _, cls in models}
+    times = _timed({
+        **{(cls, 'decode'): (lambda cls=cls: [cls.from_dict(r) for r in records]) for _, cls in models},
+        **{(cls, 'encode'): (lambda cls=cls: [p.to_dict() for p in objects[cls]]) for _, cls in models},
+    })
+    results = [(label, times[(cls, 'decode')], times[(cls, 'encode')], _memory(lambda: [cls.from_dict(r) for r in records]))
+               for label, cls in models]
+
+    print(f"{NUM_PLAYERS} players, Python {sys.version.split()[0]}")
+    print(f"{'model':<20}{'decode (ms)':>14}{'encode (ms)':>14}{'memory (KiB)':>15}")
+    for label, decode, encode, memory in results:
+        print(f"{label:<20}{decode * 1000:>14.1f}{encode * 1000:>14.1f}{memory / 1024:>15.0f}")
+    legacy, schema = results
+    print(f"decode speedup: {legacy[1] / schema[1]:.2f}x, encode speedup: {legacy[2] / schema[2]:.2f}x, "
+          f"memory: {schema[3] / legacy[3]:.0%} of legacy")
+
+
+if __name__ == "__main__":
+    main()
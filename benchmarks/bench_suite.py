@@ -0,0 +1,233 @@
+# benchmarks/bench_suite.py
+"""
+数据层与回合流程的基准测试套件。
+
+在临时目录中生成 10 / 100 / 1k / 10k 玩家、2 到 100 个城市的合成数据，计时：
+load_players_data（冷/热缓存）、save_players_data、Player.from_dict / to_dict、
+随历史增长的 save_round_history（每次追加前推进一个回合）、get_ranked_players、回合计算，
+以及两个存储后端上与管理员推进回合相同的完整流程（读取、叠加决策日志、计算、commit_round）。
+结果写成 JSON，便于不同运行之间对比、发现性能回退。
+
+运行:
+    python -m benchmarks.bench_suite --output bench.json
+    python -m benchmarks.bench_suite --quick --compare bench.json   # 与上次结果对比
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from game_logic.models import Player, GameSettings
+from game_logic.calculations import calculate_round_results, get_ranked_players
+from game_logic.cache import file_cache
+from game_logic.decisions import decision_event, apply_decision_log
+from game_logic.history import RoundHistoryStore
+from game_logic.reports import build_city_reports
+from game_logic.simulate import generate_game, random_decisions, apply_decisions, build_round_history
+from game_logic.storage import JsonStorage, SqliteStorage
+
+PLAYER_SIZES = (10, 100, 1000, 10000)
+CITY_SIZES = (2, 10, 100)
+QUICK_PLAYER_SIZES = (10, 100, 1000)
+QUICK_CITY_SIZES = (2, 10)
+HISTORY_ROUNDS = 20 # save_round_history 基准中追加的回合数
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """运行 func repeat 次，返回最小值和中位数（秒）。setup 在每次计时前调用，不计入耗时。"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {"seconds_min": min(samples), "seconds_median": statistics.median(samples), "repeat": repeat}
+
+
+def decision_events(players, markets, settings, rng: random.Random) -> list[dict]:
+    """每位玩家一条随机决策事件，与玩家端提交决策写入日志的格式相同。"""
+    round_number = markets[0].current_round if markets else 0
+    return [decision_event(player_id, round_number, fields)
+            for player_id, fields in random_decisions(players, markets, settings, rng).items()]
+
+
+def synthetic_game(num_players: int, num_cities: int, seed: int = 0):
+    """生成一局游戏，叠加一轮随机决策后跑一个回合，让 CPI、销量等每城市字段都有数据。"""
+    players, markets, settings = generate_game(num_players, num_cities, seed=seed)
+    apply_decision_log(players, decision_events(players, markets, settings, random.Random(seed)))
+    calculate_round_results(players, markets, settings)
+    return players, markets, settings
+
+
+def advance_round(storage):
+    """与 game_logic/round_jobs.py 中推进回合的流程相同：读取、叠加决策日志、计算、一次性提交。"""
+    players = storage.load_players_data()
+    markets = storage.load_markets_data()
+    settings = storage.load_game_settings() or GameSettings()
+    decision_log = storage.load_decision_log()
+    apply_decision_log(players, decision_log)
+    players, markets, aggregates = calculate_round_results(players, markets, settings, with_aggregates=True)
+    round_data = build_round_history(markets, players)
+    round_data["decision_log"] = decision_log
+    storage.commit_round(players, markets, round_data, city_reports=build_city_reports(players, markets, aggregates),
+                         decision_events=len(decision_log))
+
+
+def bench_case(num_players: int, num_cities: int, repeat: int, history_rounds: int) -> list[dict]:
+    players, markets, settings = synthetic_game(num_players, num_cities)
+    records = [p.to_dict() for p in players]
+    results = []
+
+    def add(name, timing, **extra):
+        results.append({"benchmark": name, "players": num_players, "cities": num_cities, **timing, **extra})
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = JsonStorage(data_dir)
+        storage.save_players_data(players)
+        storage.save_markets_data(markets)
+        storage.save_game_settings(settings)
+        file_size = os.path.getsize(storage.players_file)
+
+        add("save_players_data", measure(lambda: storage.save_players_data(players), repeat), file_bytes=file_size)
+        add("load_players_data_cold", measure(storage.load_players_data, repeat,
+                                              setup=file_cache.invalidate), file_bytes=file_size)
+        storage.load_players_data()
+        add("load_players_data_warm", measure(storage.load_players_data, repeat))
+        add("load_player", measure(lambda: storage.load_player(players[-1].player_id), repeat))
+
+        add("player_from_dict", measure(lambda: [Player.from_dict(r) for r in records], repeat))
+        add("player_to_dict", measure(lambda: [p.to_dict() for p in players], repeat))
+        add("get_ranked_players", measure(lambda: get_ranked_players(players), repeat))
+
+        # 推进回合：每次计时前恢复为同一份初始状态
+        state = {}
+        def reset_round():
+            state["players"] = [Player.from_dict(r) for r in records]
+            state["markets"] = [type(m).from_dict(m.to_dict()) for m in markets]
+        add("calculate_round_results", measure(
+            lambda: calculate_round_results(state["players"], state["markets"], settings), repeat, setup=reset_round))
+
+        # 追加回合历史：分别记录历史较短和较长时的单次追加耗时。
+        # 每次追加前用随机决策推进一个回合（不计时），记录之间互不相同，差异编码不会退化为空记录
+        history = RoundHistoryStore(os.path.join(data_dir, "history"))
+        history_players = [Player.from_dict(r) for r in records]
+        history_markets = [type(m).from_dict(m.to_dict()) for m in markets]
+        rng = random.Random(1)
+        append_times = []
+        for _ in range(history_rounds):
+            apply_decisions(history_players, random_decisions(history_players, history_markets, settings, rng))
+            calculate_round_results(history_players, history_markets, settings)
+            round_data = build_round_history(history_markets, history_players)
+            start = time.perf_counter()
+            history.append(round_data)
+            append_times.append(time.perf_counter() - start)
+        add("save_round_history_first", {"seconds_min": append_times[0], "seconds_median": append_times[0], "repeat": 1})
+        tail = append_times[-max(1, history_rounds // 4):]
+        add("save_round_history_last", {"seconds_min": min(tail), "seconds_median": statistics.median(tail),
+                                        "repeat": len(tail)}, history_rounds=history_rounds)
+        add("load_round_last", measure(lambda: history.load_at(-1), repeat))
+
+        # 完整推进回合：每次计时前把存储恢复为同一份初始状态，并为每位玩家提交一条决策
+        events = decision_events(players, markets, settings, random.Random(2))
+        backends = {"json": JsonStorage(os.path.join(data_dir, "advance")),
+                    "sqlite": SqliteStorage(os.path.join(data_dir, "advance.db"))}
+        for backend, target in backends.items():
+            def reset_storage():
+                target.save_players_data([Player.from_dict(r) for r in records])
+                target.save_markets_data(markets)
+                target.save_game_settings(settings)
+                target.clear_round_history()
+                target.clear_decision_log()
+                for event in events:
+                    target.append_decision(event)
+            add(f"advance_round_{backend}", measure(lambda: advance_round(target), repeat, setup=reset_storage))
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_suite(player_sizes, city_sizes, repeat: int, history_rounds: int, progress=None) -> dict:
+    results = []
+    for num_cities in city_sizes:
+        for num_players in player_sizes:
+            if progress:
+                progress(num_players, num_cities)
+            results.extend(bench_case(num_players, num_cities, repeat, history_rounds))
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """对比两次运行的中位数耗时，返回变慢超过 threshold（比例）的条目描述。"""
+    key = lambda r: (r["benchmark"], r["players"], r["cities"])
+    previous = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        old = previous.get(key(r))
+        if old is None or old["seconds_median"] <= 0:
+            continue
+        ratio = r["seconds_median"] / old["seconds_median"]
+        if ratio > 1 + threshold:
+            regressions.append(f"{r['benchmark']} (players={r['players']}, cities={r['cities']}): "
+                               f"{old['seconds_median'] * 1000:.2f} ms -> {r['seconds_median'] * 1000:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据层与回合流程的基准测试")
+    parser.add_argument("--quick", action="store_true", help="只运行较小的规模（最多 1k 玩家、10 个城市）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项基准的重复次数")
+    parser.add_argument("--history-rounds", type=int, default=HISTORY_ROUNDS, help="追加的回合历史数量")
+    parser.add_argument("--output", help="结果 JSON 输出路径")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为性能回退的变慢比例")
+    args = parser.parse_args(argv)
+
+    player_sizes = QUICK_PLAYER_SIZES if args.quick else PLAYER_SIZES
+    city_sizes = QUICK_CITY_SIZES if args.quick else CITY_SIZES
+    report = run_suite(player_sizes, city_sizes, args.repeat, args.history_rounds,
+                       progress=lambda n, c: print(f"players={n} cities={c} ...", file=sys.stderr))
+
+    print(f"{'benchmark':<28}{'players':>8}{'cities':>7}{'median (ms)':>14}")
+    for r in report["results"]:
+        print(f"{r['benchmark']:<28}{r['players']:>8}{r['cities']:>7}{r['seconds_median'] * 1000:>14.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print("\n性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n未发现性能回退。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# game_logic/cache.py
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+# 缓存占用上限（按被缓存文件的大小估算），可通过环境变量 BOYI_CACHE_MAX_MB 调整
+CACHE_MAX_BYTES_ENV = "BOYI_CACHE_MAX_MB"
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class FileCache:
+    """
+    进程级共享的文件解析缓存。
+
+    缓存键为 文件路径 + (mtime, size, inode)：文件未变化时，所有会话共享同一份
+    解析结果；文件被任何进程改写后（保存采用“写临时文件再替换”，inode 必然变化）
+    自动重新解析。本进程内保存文件时调用 invalidate() 立即失效。
+
+    缓存按文件所在目录分区（每局游戏一个数据目录），各分区独立失效；所有分区
+    合计超过 max_bytes 时，按最近最少使用的顺序整个分区淘汰，最近访问的分区始终保留。
+
+    不对应单个文件的内存数据（回合历史的最后一个完整快照、城市报表快照）通过
+    remember / recall 放在所属游戏的分区中，按调用方给出的字节数计入上限，随分区一起淘汰。
+    """
+    def __init__(self, max_bytes: int = None):
+        if max_bytes is None:
+            max_mb = os.environ.get(CACHE_MAX_BYTES_ENV)
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_CACHE_MAX_BYTES
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._partitions = OrderedDict() # {目录: {(path, key): (signature, value)}}，按最近使用排序
+        self._partition_bytes = {} # {目录: 该分区缓存文件的总大小}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _signature(path: str):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @classmethod
+    def signature(cls, path: str):
+        """文件当前的签名 (修改时间, 大小, inode)，文件不存在时返回 None。"""
+        try:
+            return cls._signature(path)
+        except FileNotFoundError:
+            return None
+
+    def get(self, path: str, loader, key: str = None):
+        """
+        返回 path 的解析结果；缓存失效时调用 loader(path) 重新解析。
+        同一文件的不同解析形式（例如对象列表和按 ID 的索引）用 key 区分。
+        文件不存在时抛出 FileNotFoundError，由调用方处理。
+        """
+        path = os.path.abspath(path)
+        partition = os.path.dirname(path)
+        signature = self._signature(path)
+        with self._lock:
+            entries = self._partitions.get(partition)
+            entry = entries.get((path, key)) if entries is not None else None
+            if entry is not None and entry[0] == signature:
+                self._partitions.move_to_end(partition)
+                self.hits += 1
+                return entry[1]
+        value = loader(path)
+        with self._lock:
+            self.misses += 1
+            # 解析期间文件可能又被改写，只有签名未变时才写入缓存
+            if self._signature(path) == signature:
+                self._store(partition, (path, key), signature, value)
+        return value
+
+    def _store(self, partition: str, entry_key: tuple, signature: tuple, value):
+        entries = self._partitions.setdefault(partition, {})
+        self._partitions.move_to_end(partition)
+        old = entries.get(entry_key)
+        size = self._partition_bytes.get(partition, 0) - (old[0][1] if old else 0) + signature[1]
+        entries[entry_key] = (signature, value)
+        self._partition_bytes[partition] = size
+        while len(self._partitions) > 1 and self.total_bytes() > self.max_bytes:
+            evicted, _ = self._partitions.popitem(last=False)
+            del self._partition_bytes[evicted]
+            self.evictions += 1
+
+    def remember(self, partition: str, key: tuple, value, nbytes: int):
+        """在 partition（数据目录）下缓存 value，按 nbytes 计入容量；key 的第一项为数据种类。"""
+        with self._lock:
+            self._store(os.path.abspath(partition), (None, key), (None, nbytes, None), value)
+
+    def recall(self, partition: str, key: tuple):
+        """取回 remember 缓存的值，不存在（或所在分区已被淘汰）时返回 None。"""
+        partition = os.path.abspath(partition)
+        with self._lock:
+            entries = self._partitions.get(partition)
+            entry = entries.get((None, key)) if entries is not None else None
+            if entry is None:
+                return None
+            self._partitions.move_to_end(partition)
+            return entry[1]
+
+    def forget(self, partition: str, kind: str):
+        """删除 partition 下种类为 kind 的所有 remember 条目。"""
+        partition = os.path.abspath(partition)
+        with self._lock:
+            entries = self._partitions.get(partition)
+            if not entries:
+                return
+            for entry_key in [k for k in entries if k[0] is None and k[1][0] == kind]:
+                self._partition_bytes[partition] -= entries.pop(entry_key)[0][1]
+
+    def total_bytes(self) -> int:
+        return sum(self._partition_bytes.values())
+
+    def get_copy(self, path: str, loader):
+        """
+        返回缓存的对象（或对象列表中每个对象）的副本，调用方修改对象属性不会影响其他会话。
+        模型类的 __copy__ 同时复制 dict 类型的字段（见 models._build_codec），原地修改这些字典也不会。
+        """
+        value = self.get(path, loader)
+        if isinstance(value, list):
+            return [copy.copy(item) for item in value]
+        return copy.copy(value)
+
+    def invalidate(self, path: str = None):
+        """使 path 的缓存失效；path 为空时清空全部缓存。"""
+        with self._lock:
+            if path is None:
+                self._partitions.clear()
+                self._partition_bytes.clear()
+                return
+            path = os.path.abspath(path)
+            partition = os.path.dirname(path)
+            entries = self._partitions.get(partition)
+            if not entries:
+                return
+            for entry_key in [k for k in entries if k[0] == path]:
+                self._partition_bytes[partition] -= entries.pop(entry_key)[0][1]
+
+
+
+# 进程内所有会话共享的缓存实例
+file_cache = FileCache()
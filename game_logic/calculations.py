@@ -0,0 +1,541 @@
+# game_logic/calculations.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from game_logic.models import Player, Market, GameSettings
+from game_logic.leaderboard import Leaderboard
+from game_logic import instrumentation
+
+# --- 回合计算参数 ---
+PRICE_ELASTICITY = 2.0 # 价格弹性：价格相对城市初始均价越低，吸引力越高
+BASE_QUALITY = 5.0 # 基准产品质量（对应质量系数 1.0）
+AD_SCALE = 1000.0 # 广告投入的规模单位
+AD_WEIGHT = 0.3 # 广告对吸引力的加成权重（对数递减）
+STORE_WEIGHT = 0.2 # 每间店铺对吸引力的加成
+OUTSIDE_OPTION_WEIGHT = 1.0 # 外部选择（不购买/其他品牌）的吸引力，等同一个中性竞争者
+PERFORMANCE_COST_PER_QUALITY = 20000.0 # 提升 1 点产品质量所需的性能投资
+MAX_QUALITY = 10.0 # 产品质量上限
+WELFARE_COST_PER_HIRE = 5000.0 # 每招聘 1 名员工所需的福利投资
+
+# --- 按城市分块并行 ---
+CITY_CHUNK = 16 # 每个计算块的城市数；分块与线程数无关，所以任何线程数下结果都逐位相同
+CITY_WORKERS_ENV = "BOYI_CITY_WORKERS" # 并行计算城市块的线程数，默认取 CPU 核数（最多 8）
+
+
+def _market_arrays(markets: list[Market]):
+    """把市场列表转换为按城市排列的数组。"""
+    names = [m.name for m in markets]
+    size = np.array([m.total_market_size for m in markets], dtype=float)
+    material = np.array([m.base_material_cost for m in markets], dtype=float)
+    labor = np.array([m.base_labor_cost for m in markets], dtype=float)
+    rate = np.array([m.loan_interest_rate for m in markets], dtype=float)
+    ref_price = np.array([m.initial_avg_price for m in markets], dtype=float)
+    return names, size, material, labor, rate, ref_price
+
+
+def _player_arrays(players: list[Player], city_index: dict):
+    """把玩家列表转换为 玩家 或 玩家×城市 的数组。"""
+    n = len(players)
+    c = len(city_index)
+
+    def column(attr, dtype=float):
+        return np.fromiter((getattr(p, attr) for p in players), dtype=dtype, count=n)
+
+    arrays = {
+        "capital": column("capital"),
+        "debt": column("debt"),
+        "production_capacity": column("production_capacity"),
+        "employees": column("employees"),
+        "product_quality": column("product_quality"),
+        "surplus_goods": column("surplus_goods"),
+        "plan": column("current_production_plan"),
+        "price": column("current_price"),
+        "advertising": column("current_advertising_budget"),
+        "performance": column("current_performance_investment"),
+        "welfare": column("current_welfare_investment"),
+        "loan": column("current_loan_amount"),
+        "repay": column("current_repay_loan_amount"),
+        "main_city": np.fromiter((city_index.get(p.main_city, -1) for p in players), dtype=np.int64, count=n),
+    }
+
+    # 玩家×城市 的店铺矩阵（已有店铺 / 本回合新增店铺）
+    stores = np.zeros((n, c))
+    new_stores = np.zeros((n, c))
+    for i, p in enumerate(players):
+        for city, count in p.stores_per_city.items():
+            j = city_index.get(city)
+            if j is not None:
+                stores[i, j] = count
+        for city, count in p.current_new_stores.items():
+            j = city_index.get(city)
+            if j is not None:
+                new_stores[i, j] = count
+    arrays["stores"] = stores
+    arrays["new_stores"] = new_stores
+    return arrays
+
+
+def _per_player_city_param(values: np.ndarray, main_city: np.ndarray) -> np.ndarray:
+    """按主场城市取城市参数；未选择主场城市的玩家取所有城市的平均值。"""
+    if values.size == 0:
+        return np.zeros(main_city.shape)
+    return np.where(main_city >= 0, values[np.maximum(main_city, 0)], values.mean())
+
+
+# --- 决策校验 ---
+# 决策被调整的原因
+ADJUST_NEGATIVE = 1
+ADJUST_FUNDS = 2
+ADJUST_CAPACITY = 3
+ADJUST_EMPLOYEES = 4
+ADJUST_DEBT = 5
+ADJUST_PRICE_RANGE = 6
+ADJUST_PRICE_DEFAULT = 7
+ADJUSTMENT_REASONS = {
+    ADJUST_NEGATIVE: "不能为负数",
+    ADJUST_FUNDS: "资金不足",
+    ADJUST_CAPACITY: "超过生产能力",
+    ADJUST_EMPLOYEES: "员工不足",
+    ADJUST_DEBT: "超过当前负债",
+    ADJUST_PRICE_RANGE: "超出允许的价格范围",
+    ADJUST_PRICE_DEFAULT: "未定价，按城市平均初始价格执行",
+}
+
+# 决策名（玩家×城市 的新增店铺按每位玩家的总数报告）
+DECISIONS = ("loan", "repay", "price", "plan", "new_stores", "advertising", "performance", "welfare")
+
+
+def _spend(requested: np.ndarray, budget: np.ndarray):
+    """在剩余预算内执行一项投入，返回 (实际投入, 剩余预算, 调整原因)。"""
+    actual = np.minimum(np.maximum(requested, 0), np.maximum(budget, 0))
+    reason = np.select([requested < 0, actual < requested], [ADJUST_NEGATIVE, ADJUST_FUNDS], 0)
+    return actual, budget - actual, reason
+
+
+class DecisionValidation:
+    """
+    回合开始时对所有玩家决策的校验结果。
+
+    所有限制都按回合开始时的真实状态（资金、负债、产能、员工）在数组上一次性检查，
+    不依赖页面输入控件的上下限。总支出按固定顺序在资金内执行：贷款与还款 -> 利息与工资 ->
+    生产 -> 新开店铺 -> 广告 -> 性能 -> 福利，超出部分被削减。
+    requested / actual / reasons 都是 {决策名: 按玩家排列的数组}，actual 直接作为本回合的执行值；
+    capital、debt、interest、wages、unit_material 是贷款还款后的资金状态和固定支出。
+    """
+    __slots__ = ('requested', 'actual', 'reasons', 'capital', 'debt', 'interest', 'wages', 'unit_material')
+
+    def __init__(self, requested, actual, reasons, capital, debt, interest, wages, unit_material):
+        self.requested = requested
+        self.actual = actual
+        self.reasons = reasons
+        self.capital = capital
+        self.debt = debt
+        self.interest = interest
+        self.wages = wages
+        self.unit_material = unit_material
+
+    def adjusted(self) -> np.ndarray:
+        """至少有一项决策被调整的玩家下标。"""
+        flags = np.zeros(len(self.capital), dtype=bool)
+        for reason in self.reasons.values():
+            flags |= reason != 0
+        return np.flatnonzero(flags)
+
+    def player_report(self, i: int) -> dict:
+        """第 i 位玩家被调整的决策：{决策名: {"requested": 提交值, "actual": 执行值, "reason": 原因}}。"""
+        report = {}
+        for name in DECISIONS:
+            reason = int(self.reasons[name][i])
+            if reason:
+                actual = self.actual[name]
+                report[name] = {
+                    "requested": float(self.requested[name][i]),
+                    "actual": float(actual[i].sum() if actual.ndim == 2 else actual[i]),
+                    "reason": ADJUSTMENT_REASONS[reason],
+                }
+        return report
+
+
+def validate_decisions(arrays: dict, material, labor, rate, ref_price, game_settings: GameSettings) -> DecisionValidation:
+    """
+    校验并削减所有玩家的决策，返回 DecisionValidation。
+    整个校验只包含数组运算，不对单个玩家做 Python 分支。
+    """
+    main_city = arrays["main_city"]
+    c = arrays["stores"].shape[1]
+
+    # 1. 贷款与还款：还款不超过负债和现有资金
+    capital = arrays["capital"].copy()
+    debt = arrays["debt"].copy()
+    loan = np.maximum(arrays["loan"], 0)
+    capital += loan
+    debt += loan
+    repay = np.clip(arrays["repay"], 0, np.minimum(debt, np.maximum(capital, 0)))
+    capital -= repay
+    debt -= repay
+
+    # 2. 固定支出：利息与工资（按主场城市的参数）
+    unit_material = _per_player_city_param(material, main_city)
+    unit_labor = _per_player_city_param(labor, main_city)
+    interest = debt * _per_player_city_param(rate, main_city)
+    wages = arrays["employees"] * unit_labor
+    budget = capital - interest - wages
+
+    # 3. 定价与生产：生产受计划、产能、员工效率和资金四重约束
+    requested_price = arrays["price"]
+    price = np.clip(
+        np.where(requested_price > 0, requested_price, ref_price.mean() if c else 0),
+        game_settings.min_product_price, game_settings.max_product_price,
+    )
+    plan = arrays["plan"]
+    staffed_units = arrays["employees"] * game_settings.engineer_efficiency
+    max_units = np.minimum(np.maximum(plan, 0), np.minimum(arrays["production_capacity"], staffed_units))
+    affordable_units = np.floor(np.maximum(budget, 0) / np.where(unit_material > 0, unit_material, 1))
+    production = np.floor(np.minimum(max_units, affordable_units))
+    budget = budget - production * unit_material
+
+    # 4. 新开店铺：资金不足时本回合不开店
+    requested_stores = np.maximum(arrays["new_stores"], 0)
+    store_cost = requested_stores.sum(axis=1) * game_settings.city_store_cost
+    store_ok = store_cost <= np.maximum(budget, 0)
+    new_stores = requested_stores * store_ok[:, None]
+    budget = budget - np.where(store_ok, store_cost, 0)
+
+    # 5. 广告、性能、福利投入依次在剩余预算内执行
+    advertising, budget, advertising_reason = _spend(arrays["advertising"], budget)
+    performance, budget, performance_reason = _spend(arrays["performance"], budget)
+    welfare, budget, welfare_reason = _spend(arrays["welfare"], budget)
+
+    requested = {
+        "loan": arrays["loan"], "repay": arrays["repay"], "price": requested_price, "plan": plan,
+        "new_stores": arrays["new_stores"].sum(axis=1), "advertising": arrays["advertising"],
+        "performance": arrays["performance"], "welfare": arrays["welfare"],
+    }
+    actual = {
+        "loan": loan, "repay": repay, "price": price, "plan": production, "new_stores": new_stores,
+        "advertising": advertising, "performance": performance, "welfare": welfare,
+    }
+    reasons = {
+        "loan": np.where(arrays["loan"] < 0, ADJUST_NEGATIVE, 0),
+        "repay": np.select([arrays["repay"] < 0, arrays["repay"] > debt + repay, repay < arrays["repay"]],
+                           [ADJUST_NEGATIVE, ADJUST_DEBT, ADJUST_FUNDS], 0),
+        "price": np.select([requested_price <= 0, price != requested_price],
+                           [ADJUST_PRICE_DEFAULT, ADJUST_PRICE_RANGE], 0),
+        # 只有资金能支付的数量少于按计划（取整后）可生产的数量时才是资金不足，计划带小数时向下取整不算调整
+        "plan": np.select([plan < 0, (max_units < plan) & (arrays["production_capacity"] <= staffed_units),
+                           max_units < plan, affordable_units < np.floor(max_units)],
+                          [ADJUST_NEGATIVE, ADJUST_CAPACITY, ADJUST_EMPLOYEES, ADJUST_FUNDS], 0),
+        "new_stores": np.select([(arrays["new_stores"] < 0).any(axis=1), ~store_ok & (store_cost > 0)],
+                                [ADJUST_NEGATIVE, ADJUST_FUNDS], 0),
+        "advertising": advertising_reason,
+        "performance": performance_reason,
+        "welfare": welfare_reason,
+    }
+    return DecisionValidation(requested, actual, reasons, capital, debt, interest, wages, unit_material)
+
+
+class MarketAggregates:
+    """
+    每个城市的竞争汇总：在售玩家数、供给量、按供给加权的均价、广告总投入、
+    平均产品质量、店铺总数和吸引力总和。每回合对所有玩家只按列汇总一次（O(P·C)），
+    之后每位玩家的 CPI 只需用自己的吸引力除以所在城市的汇总值，不需要再扫描竞争对手。
+    供给量：每位玩家的库存（本回合产量 + 上回合剩余）平均分配到其可销售的城市。
+    """
+    __slots__ = ('names', 'sellers', 'supply', 'avg_price', 'advertising', 'avg_quality', 'stores', 'attractiveness')
+
+    def __init__(self, names, sellers, supply, avg_price, advertising, avg_quality, stores, attractiveness):
+        self.names = names
+        self.sellers = sellers
+        self.supply = supply
+        self.avg_price = avg_price
+        self.advertising = advertising
+        self.avg_quality = avg_quality
+        self.stores = stores
+        self.attractiveness = attractiveness
+
+    @classmethod
+    def compute(cls, names: list[str], eligible: np.ndarray, price: np.ndarray, quality: np.ndarray,
+                stock_share: np.ndarray, ads_per_city: np.ndarray, stores: np.ndarray, attractiveness: np.ndarray):
+        """
+        汇总一组城市（玩家×城市 数组的若干列）。stock_share 是每位玩家分到每个可销售城市的库存，
+        按玩家的全部城市计算，所以各组城市可以分别汇总后用 merge 合并。
+        """
+        sellers = eligible.sum(axis=0)
+        offered = eligible * stock_share[:, None]
+        supply = offered.sum(axis=0)
+        priced_supply = (offered * price[:, None]).sum(axis=0)
+        seller_price = (eligible * price[:, None]).sum(axis=0)
+        avg_price = np.where(supply > 0, priced_supply / np.where(supply > 0, supply, 1),
+                             seller_price / np.maximum(sellers, 1))
+        avg_quality = (eligible * quality[:, None]).sum(axis=0) / np.maximum(sellers, 1)
+        return cls(names, sellers, supply, avg_price, ads_per_city.sum(axis=0), avg_quality,
+                   stores.sum(axis=0), attractiveness.sum(axis=0))
+
+    @classmethod
+    def merge(cls, parts: list):
+        """按城市顺序合并各组城市的汇总。"""
+        if len(parts) == 1:
+            return parts[0]
+        return cls([name for part in parts for name in part.names],
+                   *(np.concatenate([getattr(part, attr) for part in parts]) for attr in cls.__slots__[1:]))
+
+    def city(self, name: str) -> dict:
+        j = self.names.index(name)
+        return {
+            "sellers": int(self.sellers[j]),
+            "supply": float(self.supply[j]),
+            "avg_price": float(self.avg_price[j]),
+            "advertising": float(self.advertising[j]),
+            "avg_quality": float(self.avg_quality[j]),
+            "stores": int(self.stores[j]),
+            "attractiveness": float(self.attractiveness[j]),
+        }
+
+    def to_dict(self) -> dict:
+        return {name: self.city(name) for name in self.names}
+
+
+def compute_round(arrays: dict, decisions: DecisionValidation, size, ref_price, game_settings: GameSettings,
+                  names: list[str] = None) -> dict:
+    """
+    在 玩家×城市 数组上用校验后的决策（validate_decisions 的结果）计算一个回合的结果。
+    整个计算只包含数组运算，不对单个玩家做 Python 循环。
+    结果中的 "aggregates" 为本回合各城市的 MarketAggregates，"decisions" 为传入的校验结果。
+    """
+    main_city = arrays["main_city"]
+    n, c = arrays["stores"].shape
+    actual = decisions.actual
+    price = actual["price"]
+    actual_production = actual["plan"]
+    advertising = actual["advertising"]
+    performance = actual["performance"]
+    welfare = actual["welfare"]
+    interest = decisions.interest
+    wages = decisions.wages
+    production_cost = actual_production * decisions.unit_material
+    actual_store_cost = actual["new_stores"].sum(axis=1) * game_settings.city_store_cost
+    stores = arrays["stores"] + actual["new_stores"]
+
+    # 1. 每城市的吸引力、竞争汇总与 CPI
+    # 玩家只在有店铺的城市和主场城市销售，广告投入和库存平均分配到这些城市
+    eligible = stores > 0
+    if c:
+        eligible[np.arange(n)[main_city >= 0], main_city[main_city >= 0]] = True
+    eligible_count = np.maximum(eligible.sum(axis=1), 1)
+    # 库存 = 本回合产量 + 上回合剩余
+    stock = actual_production + arrays["surplus_goods"]
+    player_terms = {
+        "price": price,
+        "quality": arrays["product_quality"],
+        "quality_factor": arrays["product_quality"] / BASE_QUALITY,
+        "ads_share": advertising / eligible_count,
+        "stock_share": stock / eligible_count,
+    }
+    names = names if names is not None else [str(j) for j in range(c)]
+    # 城市之间在这一步互不依赖，按固定的城市块分别计算，城市多时在线程池中并行
+    chunks = [slice(start, min(start + CITY_CHUNK, c)) for start in range(0, c, CITY_CHUNK)] or [slice(0, 0)]
+    with instrumentation.stage("calculation.cities"):
+        parts = _map_city_chunks(
+            lambda cols: _city_chunk(names[cols], eligible[:, cols], stores[:, cols], size[cols], ref_price[cols], player_terms),
+            chunks,
+        )
+    with instrumentation.stage("calculation.aggregates"):
+        aggregates = MarketAggregates.merge([part[0] for part in parts])
+        attractiveness, cpi, demand = (np.concatenate([part[k] for part in parts], axis=1) for k in (1, 2, 3))
+
+    # 2. 需求与销售：每位玩家的库存按其在各城市的需求比例分配，作为该城市的销售上限；
+    # 各城市用注水法分配总需求，卖空的玩家满足不了的需求流向其他玩家和外部选择
+    total_demand = demand.sum(axis=1)
+    caps = demand * (stock / np.where(total_demand > 0, total_demand, 1))[:, None]
+    with instrumentation.stage("calculation.allocation"):
+        allocation = np.concatenate(_map_city_chunks(
+            lambda cols: water_fill(size[cols], attractiveness[:, cols], caps[:, cols]), chunks), axis=1)
+    sales = np.floor(allocation)
+    total_sales = sales.sum(axis=1)
+
+    # 3. 财务结算
+    revenue = total_sales * price
+    costs = interest + wages + production_cost + actual_store_cost + advertising + performance + welfare
+    capital = decisions.capital - costs + revenue
+    debt = decisions.debt
+    total_size = size.sum()
+
+    return {
+        "capital": capital,
+        "debt": debt,
+        "employees": arrays["employees"] + np.floor(welfare / WELFARE_COST_PER_HIRE),
+        "product_quality": np.minimum(arrays["product_quality"] + performance / PERFORMANCE_COST_PER_QUALITY, MAX_QUALITY),
+        "price": price,
+        "actual_production": actual_production,
+        "actual_advertising_investment": advertising,
+        "actual_performance_investment": performance,
+        "actual_welfare_investment": welfare,
+        "actual_new_stores_cost": actual_store_cost,
+        "stores": stores,
+        "cpi": cpi,
+        "hidden_cpi": attractiveness,
+        "sales": sales,
+        "surplus_goods": stock - total_sales,
+        "last_round_revenue": revenue,
+        "last_round_costs": costs,
+        "last_round_profit": revenue - costs,
+        "net_asset": capital - debt,
+        "market_share": total_sales / total_size if total_size > 0 else np.zeros(n),
+        "aggregates": aggregates,
+        "decisions": decisions,
+    }
+
+
+def water_fill(market_size: np.ndarray, weights: np.ndarray, caps: np.ndarray,
+               outside_weight: float = OUTSIDE_OPTION_WEIGHT) -> np.ndarray:
+    """
+    注水法分配需求：每个城市（列 j）的总需求 market_size[j] 按吸引力 weights 分给玩家和外部选择，
+    玩家 i 最多分到 caps[i, j]，超出上限的需求按吸引力比例流向其余未卖空的玩家和外部选择。
+
+    即求水位 λ 使 Σ min(λ·w_i, cap_i) + λ·w_0 = S，玩家分到 min(λ·w_i, cap_i)。
+    玩家在水位 cap_i / w_i 时卖空；按该水位排序后，前 k 位卖空时所需的总需求可以用前缀和
+    一次算出，第一个不会卖空的位置就确定了 λ。每个城市 O(P log P)，不需要反复重新分配。
+    同一水位的玩家（例如决策完全相同）要么同时卖空、要么都不卖空，分到的量相同。
+    """
+    n, c = weights.shape
+    cols = np.arange(c)
+    active = weights > 0 # 没有吸引力的玩家（不在该城市销售）不参与分配
+    caps = np.where(active, np.maximum(caps, 0), 0)
+    level = np.where(active, caps / np.where(active, weights, 1), np.inf)
+    order = np.argsort(level, axis=0, kind="stable")
+    sorted_level = np.take_along_axis(level, order, axis=0)
+    sorted_caps = np.take_along_axis(caps, order, axis=0)
+    sorted_weights = np.take_along_axis(weights * active, order, axis=0)
+
+    caps_before = np.cumsum(sorted_caps, axis=0) - sorted_caps # 排在前面的玩家全部卖空时卖出的量
+    weights_from = np.cumsum(sorted_weights[::-1], axis=0)[::-1] # 自己和排在后面的玩家的吸引力之和
+    with np.errstate(invalid="ignore"):
+        sold_out = caps_before + sorted_level * (weights_from + outside_weight) < market_size[None, :]
+    count = np.cumprod(sold_out, axis=0).sum(axis=0) # 卖空的玩家数（排序后的前缀）
+
+    padded_caps = np.vstack([np.zeros((1, c)), np.cumsum(sorted_caps, axis=0)])
+    padded_weights = np.vstack([np.zeros((1, c)), np.cumsum(sorted_weights, axis=0)])
+    remaining_weight = padded_weights[n] - padded_weights[count, cols] + outside_weight
+    remaining_demand = np.maximum(market_size - padded_caps[count, cols], 0)
+    water = np.where(remaining_weight > 0, remaining_demand / np.where(remaining_weight > 0, remaining_weight, 1), np.inf)
+    with np.errstate(invalid="ignore"):
+        return np.where(active, np.minimum(water[None, :] * weights, caps), 0)
+
+
+def _city_chunk(names: list[str], eligible, stores, size, ref_price, player_terms: dict):
+    """
+    计算一组城市的吸引力、竞争汇总、CPI 和需求，返回 (aggregates, attractiveness, cpi, demand)。
+    只读取这组城市的列和按玩家排列的量，可以与其他城市块并行执行。
+    """
+    ads_per_city = np.where(eligible, player_terms["ads_share"][:, None], 0)
+    attractiveness = (
+        eligible
+        * (ref_price[None, :] / player_terms["price"][:, None]) ** PRICE_ELASTICITY
+        * player_terms["quality_factor"][:, None]
+        * (1 + AD_WEIGHT * np.log1p(ads_per_city / AD_SCALE))
+        * (1 + STORE_WEIGHT * stores)
+    )
+    aggregates = MarketAggregates.compute(names, eligible, player_terms["price"], player_terms["quality"],
+                                          player_terms["stock_share"], ads_per_city, stores, attractiveness)
+    cpi = attractiveness / (aggregates.attractiveness + OUTSIDE_OPTION_WEIGHT)[None, :]
+    return aggregates, attractiveness, cpi, size[None, :] * cpi
+
+
+_city_executor = None
+
+def _get_city_executor() -> ThreadPoolExecutor:
+    global _city_executor
+    if _city_executor is None:
+        workers = int(os.environ.get(CITY_WORKERS_ENV, "0")) or min(8, os.cpu_count() or 1)
+        _city_executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="round-cities")
+    return _city_executor
+
+def _map_city_chunks(func, chunks: list):
+    """
+    对每个城市块调用 func，结果按城市块顺序返回。只有一个块时直接在当前线程计算。
+    使用线程池而不是进程池：块内全是 NumPy 运算（执行时释放 GIL），而进程池需要把
+    玩家×城市 数组序列化传给每个子进程，开销与计算本身相当。
+    """
+    if len(chunks) == 1:
+        return [func(chunks[0])]
+    return list(_get_city_executor().map(func, chunks))
+
+
+def _write_back(players: list[Player], names: list[str], result: dict):
+    """把数组结果写回每个 Player 对象；决策被调整的玩家写入调整报告。"""
+    columns = {key: value.tolist() for key, value in result.items() if isinstance(value, np.ndarray) and value.ndim == 1}
+    stores = result["stores"].astype(int).tolist()
+    cpi = result["cpi"].tolist()
+    hidden_cpi = result["hidden_cpi"].tolist()
+    sales = result["sales"].astype(int).tolist()
+
+    for i, p in enumerate(players):
+        p.capital = columns["capital"][i]
+        p.debt = columns["debt"][i]
+        p.employees = int(columns["employees"][i])
+        p.product_quality = columns["product_quality"][i]
+        p.current_price = columns["price"][i]
+        p.actual_production = int(columns["actual_production"][i])
+        p.actual_advertising_investment = columns["actual_advertising_investment"][i]
+        p.actual_performance_investment = columns["actual_performance_investment"][i]
+        p.actual_welfare_investment = columns["actual_welfare_investment"][i]
+        p.actual_new_stores_cost = columns["actual_new_stores_cost"][i]
+        p.stores_per_city = {name: count for name, count in zip(names, stores[i]) if count}
+        # 每城市字段只保存非零项（读取方都按 .get(城市, 0) 处理缺失），玩家数据和历史快照不随城市数膨胀
+        p.cpi_per_city = {name: value for name, value in zip(names, cpi[i]) if value}
+        p.hidden_cpi_per_city = {name: value for name, value in zip(names, hidden_cpi[i]) if value}
+        p.actual_sales_per_city = {name: value for name, value in zip(names, sales[i]) if value}
+        p.surplus_goods = int(columns["surplus_goods"][i])
+        p.last_round_revenue = columns["last_round_revenue"][i]
+        p.last_round_costs = columns["last_round_costs"][i]
+        p.last_round_profit = columns["last_round_profit"][i]
+        p.net_asset = columns["net_asset"][i]
+        p.market_share = columns["market_share"][i]
+
+        # 一次性决策在结算后清零，持续性决策（产量、价格、广告等）保留为下回合默认值
+        p.current_new_stores = {}
+        p.current_loan_amount = 0
+        p.current_repay_loan_amount = 0
+        p.decision_adjustments = {}
+
+    decisions = result["decisions"]
+    for i in decisions.adjusted().tolist():
+        players[i].decision_adjustments = decisions.player_report(i)
+
+
+def calculate_round_results(players: list[Player], markets: list[Market], game_settings: GameSettings,
+                            with_aggregates: bool = False):
+    """
+    计算一个回合的结果：把每位玩家的 current_* 决策转换为 actual_*、CPI、销售量、
+    剩余货物、上一回合报表和净资产，并推进所有市场的回合数。
+    返回 (players, markets)，对象会被原地更新；with_aggregates 为 True 时返回
+    (players, markets, aggregates)，aggregates 为本回合的 MarketAggregates（没有玩家时为 None）。
+    """
+    names, size, material, labor, rate, ref_price = _market_arrays(markets)
+    aggregates = None
+    if players:
+        city_index = {name: j for j, name in enumerate(names)}
+        with instrumentation.stage("calculation.extract"):
+            arrays = _player_arrays(players, city_index)
+        with instrumentation.stage("calculation.validate"):
+            decisions = validate_decisions(arrays, material, labor, rate, ref_price, game_settings)
+        with instrumentation.stage("calculation.compute"):
+            result = compute_round(arrays, decisions, size, ref_price, game_settings, names)
+        with instrumentation.stage("calculation.write_back"):
+            _write_back(players, names, result)
+        aggregates = result["aggregates"]
+
+    for m in markets:
+        m.current_round += 1
+    if with_aggregates:
+        return players, markets, aggregates
+    return players, markets
+
+def get_ranked_players(players: list[Player], metric: str = "capital", top_k: int = None) -> list[Player]:
+    """
+    按指标（capital / net_asset / profit / market_share）从高到低排列玩家。
+    页面上需要反复查询时，请使用 game_logic.leaderboard.get_leaderboard 按数据版本缓存。
+    """
+    leaderboard = Leaderboard(players)
+    return leaderboard.ranked(metric) if top_k is None else leaderboard.top(top_k, metric)
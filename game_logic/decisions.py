@@ -0,0 +1,105 @@
+# game_logic/decisions.py
+"""
+玩家决策和报表购买的事件日志。
+
+玩家每次提交决策或购买城市报表时向日志追加一条事件，不重写玩家数据：
+    决策: {"player_id": 玩家ID, "round": 提交时的回合, "fields": {决策字段: 值}, "submitted_at": 提交时间}
+    购买: {"player_id": 玩家ID, "round": 提交时的回合, "city_report": 城市名, "cost": 价格, "submitted_at": 提交时间}
+日志中只保存尚未参与结算的事件。某位玩家当前的状态 = 玩家数据依次叠加该玩家的事件：
+决策字段后提交的覆盖先提交的；同一城市的报表只扣一次款，资金不足时该次购买不生效。
+叠加结果在内存中计算，开销与事件数成正比。
+
+推进回合时先把日志中的事件叠加到所有玩家上再计算，事件随回合历史快照保存
+（快照的 "decision_log"，即每回合决策修改的审计记录），然后从日志中删除（压缩）。
+计算期间提交的事件不会被删除，留到下一回合，叠加到新回合的状态上。
+JSON 后端在玩家数据中记录已结算到日志的哪个位置，压缩之前中断时读取也会跳过已结算的事件。
+"""
+
+from datetime import datetime
+from game_logic.models import Player
+
+# 玩家可以提交的决策字段
+DECISION_FIELDS = (
+    "current_production_plan",
+    "current_price",
+    "current_advertising_budget",
+    "current_performance_investment",
+    "current_welfare_investment",
+    "current_new_stores",
+    "current_loan_amount",
+    "current_repay_loan_amount",
+    "main_city",
+)
+
+
+def decision_event(player_id: str, round_number: int, fields: dict) -> dict:
+    """构造一条决策事件；包含不支持的字段时抛出 ValueError。"""
+    unknown = [name for name in fields if name not in DECISION_FIELDS]
+    if unknown:
+        raise ValueError(f"不支持的决策字段: {', '.join(unknown)}")
+    return {
+        "player_id": player_id,
+        "round": round_number,
+        "fields": dict(fields),
+        "submitted_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def purchase_event(player_id: str, round_number: int, city: str, cost: float) -> dict:
+    """构造一条购买城市报表的事件。"""
+    return {
+        "player_id": player_id,
+        "round": round_number,
+        "city_report": city,
+        "cost": cost,
+        "submitted_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def decision_fields(player: Player) -> dict:
+    """玩家当前的全部决策字段（用于把决策表单的结果整体提交）。"""
+    fields = {name: getattr(player, name) for name in DECISION_FIELDS}
+    fields["current_new_stores"] = dict(fields["current_new_stores"])
+    return fields
+
+
+def fold_decisions(events, folded: dict = None) -> dict:
+    """
+    按提交顺序叠加事件，返回 {玩家ID: {"fields": {决策字段: 值}, "city_reports": {城市名: 价格}}}。
+    给出 folded 时在其基础上继续叠加（用于只处理新追加的事件）。
+    """
+    folded = {} if folded is None else folded
+    for event in events:
+        pending = folded.setdefault(event["player_id"], {"fields": {}, "city_reports": {}})
+        if "fields" in event:
+            pending["fields"].update(event["fields"])
+        else:
+            pending["city_reports"].setdefault(event["city_report"], event["cost"])
+    return folded
+
+
+def apply_pending(player: Player, pending: dict):
+    """
+    把一位玩家叠加后的事件写到玩家对象上（字典值复制一份，不与事件共享）。
+    已购买的报表不重复扣款，资金不足时该次购买不生效。
+    """
+    for name, value in pending["fields"].items():
+        setattr(player, name, dict(value) if isinstance(value, dict) else value)
+    for city, cost in pending["city_reports"].items():
+        if player.bought_city_reports.get(city) or player.capital < cost:
+            continue
+        player.capital -= cost
+        player.net_asset -= cost
+        player.bought_city_reports = {**player.bought_city_reports, city: True}
+
+
+def apply_decision_log(players: list[Player], events) -> int:
+    """把事件叠加到玩家上（不属于任何现有玩家的事件被忽略），返回受影响的玩家数。"""
+    folded = fold_decisions(events)
+    applied = 0
+    for p in players:
+        pending = folded.get(p.player_id)
+        if pending:
+            apply_pending(p, pending)
+            applied += 1
+    return applied
@@ -0,0 +1,192 @@
+# game_logic/export.py
+"""
+把回合历史导出为便于分析的列式表格：
+
+- players:       每 (回合, 玩家) 一行，包含玩家的所有标量字段（不含密码）
+- player_cities: 每 (回合, 玩家, 城市) 一行，包含 CPI、隐藏 CPI、销量、店铺等每城市字段
+
+安装了 pyarrow 时输出 Parquet（每批数据写成一个 row group），否则输出 CSV。
+回合历史逐回合读取、按批写出，内存占用只与批大小有关，与游戏长度无关。
+
+用法:
+    python -m game_logic.export data/ --output-dir export/
+    python -m game_logic.export data/ --game class-3a --format csv --batch-rows 50000
+"""
+
+import argparse
+import csv
+import os
+import sys
+from game_logic.models import PLAYER_FIELDS
+from game_logic.storage import get_storage, DEFAULT_GAME_ID
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pyarrow 是可选依赖，没有时导出 CSV
+    pa = None
+    pq = None
+
+DEFAULT_BATCH_ROWS = 100_000 # 每批写出的行数（每个表单独计算）
+EXCLUDED_PLAYER_FIELDS = {"password"}
+
+# players 表：回合号 + 玩家的标量字段
+PLAYER_COLUMNS = [("round", int)] + [
+    (f.name, f.type) for f in PLAYER_FIELDS if f.type is not dict and f.name not in EXCLUDED_PLAYER_FIELDS
+]
+
+# player_cities 表：列名 -> (玩家字段, 类型)
+CITY_FIELDS = {
+    "cpi": ("cpi_per_city", float),
+    "hidden_cpi": ("hidden_cpi_per_city", float),
+    "sales": ("actual_sales_per_city", int),
+    "stores": ("stores_per_city", int),
+    "new_stores": ("current_new_stores", int),
+    "bought_report": ("bought_city_reports", bool),
+}
+CITY_COLUMNS = [("round", int), ("player_id", str), ("city", str)] + [(name, t) for name, (_, t) in CITY_FIELDS.items()]
+
+
+def _convert(value, type_):
+    if value is None or value == "":
+        return None if type_ is not str else value
+    return type_(value)
+
+
+def player_rows(round_data: dict):
+    """一个回合快照中每位玩家的一行。"""
+    round_number = round_data.get("round")
+    for state in round_data.get("player_states", []):
+        row = {"round": round_number}
+        for name, type_ in PLAYER_COLUMNS[1:]:
+            row[name] = _convert(state.get(name), type_)
+        yield row
+
+
+def city_rows(round_data: dict, cities: list[str]):
+    """一个回合快照中每位玩家在每个城市的一行。"""
+    round_number = round_data.get("round")
+    for state in round_data.get("player_states", []):
+        per_city = {name: state.get(field) or {} for name, (field, _) in CITY_FIELDS.items()}
+        for city in cities:
+            row = {"round": round_number, "player_id": state.get("player_id"), "city": city}
+            for name, (_, type_) in CITY_FIELDS.items():
+                row[name] = _convert(per_city[name].get(city, type_()), type_) # 缺失表示 0 / 未购买
+            yield row
+
+
+def _round_cities(round_data: dict) -> list[str]:
+    """回合中出现的所有城市：市场参数中的城市，加上玩家数据中出现过的其他城市。"""
+    cities = [m["name"] for m in round_data.get("market_params", [])]
+    known = set(cities)
+    for state in round_data.get("player_states", []):
+        for field, _ in CITY_FIELDS.values():
+            for city in state.get(field) or {}:
+                if city not in known:
+                    known.add(city)
+                    cities.append(city)
+    return cities
+
+
+class _CsvTableWriter:
+    def __init__(self, path: str, columns: list):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=[name for name, _ in columns])
+        self._writer.writeheader()
+
+    def write(self, rows: list[dict]):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetTableWriter:
+    _TYPES = {int: "int64", float: "float64", str: "string", bool: "bool_"}
+
+    def __init__(self, path: str, columns: list):
+        self.path = path
+        self.schema = pa.schema([(name, getattr(pa, self._TYPES[t])()) for name, t in columns])
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows: list[dict]):
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class _BatchedTable:
+    """缓冲行数据，满 batch_rows 行时写出一批。"""
+    def __init__(self, writer, batch_rows: int):
+        self.writer = writer
+        self.batch_rows = batch_rows
+        self.rows = []
+        self.total_rows = 0
+
+    def extend(self, rows):
+        for row in rows:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_rows:
+                self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write(self.rows)
+            self.total_rows += len(self.rows)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def export_history(rounds, output_dir: str, fmt: str = "auto", batch_rows: int = DEFAULT_BATCH_ROWS) -> dict:
+    """
+    把回合快照的可迭代对象（例如 storage.iter_round_history()）导出到 output_dir。
+    fmt 为 "parquet"、"csv" 或 "auto"（有 pyarrow 时用 Parquet）。
+    返回 {表名: {"path": 文件路径, "rows": 行数}}。
+    """
+    if fmt == "auto":
+        fmt = "parquet" if pa is not None else "csv"
+    if fmt == "parquet" and pa is None:
+        raise ValueError("导出 Parquet 需要安装 pyarrow（pip install pyarrow），或改用 --format csv")
+    if fmt not in ("parquet", "csv"):
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    writer_class = _ParquetTableWriter if fmt == "parquet" else _CsvTableWriter
+    extension = "parquet" if fmt == "parquet" else "csv"
+    tables = {
+        "players": _BatchedTable(writer_class(os.path.join(output_dir, f"players.{extension}"), PLAYER_COLUMNS), batch_rows),
+        "player_cities": _BatchedTable(writer_class(os.path.join(output_dir, f"player_cities.{extension}"), CITY_COLUMNS), batch_rows),
+    }
+    try:
+        for round_data in rounds:
+            tables["players"].extend(player_rows(round_data))
+            tables["player_cities"].extend(city_rows(round_data, _round_cities(round_data)))
+    finally:
+        for table in tables.values():
+            table.close()
+    return {name: {"path": table.writer.path, "rows": table.total_rows} for name, table in tables.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把回合历史导出为 Parquet / CSV 表格")
+    parser.add_argument("data_dir", help="数据目录")
+    parser.add_argument("--game", default=DEFAULT_GAME_ID, help="游戏编号")
+    parser.add_argument("--output-dir", default="export", help="输出目录")
+    parser.add_argument("--format", choices=["auto", "parquet", "csv"], default="auto",
+                        help="auto: 安装了 pyarrow 时输出 Parquet，否则输出 CSV")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS, help="每批写出的行数")
+    args = parser.parse_args(argv)
+
+    storage = get_storage(args.data_dir, game_id=args.game)
+    result = export_history(storage.iter_round_history(), args.output_dir, args.format, args.batch_rows)
+    for name, info in result.items():
+        print(f"{name}: {info['rows']} 行 -> {info['path']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# game_logic/history.py
+
+import base64
+import copy
+import json
+import os
+import struct
+import threading
+import zlib
+from game_logic.cache import file_cache
+from game_logic.locking import file_lock
+from game_logic import instrumentation
+
+# 每条索引记录: 回合号、数据偏移、数据长度、是否关键帧（均为 8 字节有符号整数，小端）
+_INDEX_RECORD = struct.Struct('<qqqq')
+
+# 每隔多少条记录保存一次完整快照（关键帧），其余回合只保存与上一回合的差异
+DEFAULT_KEYFRAME_INTERVAL = 10
+
+# 记录内容的 zlib 压缩级别（0 表示不压缩）。玩家决策每回合都变化时差异记录并不比完整快照小多少，
+# 主要靠压缩重复的字段名、城市名和调整原因；压缩是无损的
+DEFAULT_COMPRESSION_LEVEL = 6
+
+
+# --- 差异编码 ---
+def diff_player_state(old: dict, new: dict) -> dict:
+    """
+    计算一个玩家在两个回合之间的字段级差异。
+    普通字段只记录变化后的值；字典字段（如 cpi_per_city）再细化到键级别。
+    """
+    changed = {}
+    changed_dicts = {}
+    for field, value in new.items():
+        if field not in old:
+            changed[field] = value
+            continue
+        old_value = old[field]
+        if old_value == value:
+            continue
+        if isinstance(old_value, dict) and isinstance(value, dict):
+            entry = {}
+            updated = {k: v for k, v in value.items() if k not in old_value or old_value[k] != v}
+            removed = [k for k in old_value if k not in value]
+            if updated:
+                entry['set'] = updated
+            if removed:
+                entry['del'] = removed
+            changed_dicts[field] = entry
+        else:
+            changed[field] = value
+
+    delta = {}
+    if changed:
+        delta['set'] = changed
+    if changed_dicts:
+        delta['dict'] = changed_dicts
+    removed_fields = [field for field in old if field not in new]
+    if removed_fields:
+        delta['del'] = removed_fields
+    return delta
+
+
+def apply_player_delta(state: dict, delta: dict) -> dict:
+    """把 diff_player_state 生成的差异应用到玩家状态上，返回新的状态。"""
+    state = dict(state)
+    for field, entry in delta.get('dict', {}).items():
+        value = dict(state.get(field) or {})
+        value.update(entry.get('set', {}))
+        for key in entry.get('del', []):
+            value.pop(key, None)
+        state[field] = value
+    state.update(delta.get('set', {}))
+    for field in delta.get('del', []):
+        state.pop(field, None)
+    return state
+
+
+def encode_round(previous: dict, round_data: dict) -> dict:
+    """把一个完整的回合快照编码为相对上一回合的差异记录。"""
+    previous_states = {p['player_id']: p for p in previous.get('player_states', [])}
+    order = [p['player_id'] for p in round_data.get('player_states', [])]
+
+    player_deltas = {}
+    for state in round_data.get('player_states', []):
+        delta = diff_player_state(previous_states.get(state['player_id'], {}), state)
+        if delta:
+            player_deltas[state['player_id']] = delta
+
+    record = {
+        'round': round_data.get('round'),
+        'keyframe': False,
+        'data': {k: v for k, v in round_data.items() if k != 'player_states'},
+        'player_deltas': player_deltas,
+    }
+    if order != list(previous_states):
+        record['player_order'] = order
+    return record
+
+
+def decode_round(previous: dict, record: dict) -> dict:
+    """根据上一回合的完整快照和差异记录，重建本回合的完整快照。"""
+    if record.get('keyframe', True):
+        return record['data'] if 'data' in record else record
+    previous_states = {p['player_id']: p for p in previous.get('player_states', [])}
+    order = record.get('player_order', list(previous_states))
+    deltas = record['player_deltas']
+    round_data = dict(record['data'])
+    round_data['player_states'] = [
+        apply_player_delta(previous_states.get(pid, {}), deltas[pid]) if pid in deltas else previous_states[pid]
+        for pid in order
+    ]
+    return round_data
+
+
+def _unpack(record: dict) -> dict:
+    """还原 _pack 压缩的记录；未压缩的记录（包括旧版本写入的）原样返回。"""
+    if 'z' not in record:
+        return record
+    return json.loads(zlib.decompress(base64.b64decode(record['z'])))
+
+
+class RoundHistoryStore:
+    """
+    追加写入的回合历史存储。
+
+    - rounds_history.jsonl: 每回合一行 JSON，只追加不重写
+    - rounds_history.idx:   定长二进制偏移索引，每回合一条记录
+
+    每 keyframe_interval 条记录保存一次完整快照（关键帧），其余回合只保存每个玩家
+    与上一回合的字段级差异；每条记录再经 zlib 压缩（compression_level 为 0 时不压缩）。
+    读取第 k 回合时通过索引定位到最近的关键帧，最多再应用 keyframe_interval - 1 条差异记录，
+    不需要解析更早的回合。
+
+    管理端、玩家端和命令行工具可能在不同进程中读写同一份历史：每次访问都比对两个文件的签名，
+    其他进程追加、截断或删除后重新读取索引；改写文件和补全索引时持有跨进程的 rounds_history.lock。
+    """
+    def __init__(self, data_dir: str, name: str = 'rounds_history', keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 compression_level: int = DEFAULT_COMPRESSION_LEVEL):
+        self.data_dir = data_dir
+        self.data_file = os.path.join(data_dir, f'{name}.jsonl')
+        self.index_file = os.path.join(data_dir, f'{name}.idx')
+        self.legacy_file = os.path.join(data_dir, f'{name}.json')
+        self.lock_file = os.path.join(data_dir, f'{name}.lock')
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._index = None # [(round, offset, length, is_keyframe)]，首次使用时加载
+        self._positions = {} # {回合号: 该回合最后一条记录的位置}
+        self._synced = None # 读取 _index 时 (索引文件, 数据文件) 的签名
+        # 最后一条记录的完整快照（用于计算下一回合的差异）放在 file_cache 中本游戏的分区里，
+        # 按最近关键帧未压缩时的大小计入缓存上限，分区被淘汰后下次追加时重新构建
+        self._last_state_key = (f'{name}.last_state',)
+
+    def _forget_last_state(self):
+        file_cache.forget(self.data_dir, self._last_state_key[0])
+
+    # --- 索引 ---
+    def _files_signature(self) -> tuple:
+        return (file_cache.signature(self.index_file), file_cache.signature(self.data_file))
+
+    def _load_index(self):
+        """
+        返回与文件一致的索引。两个文件的签名与上次读取时相同时直接返回内存中的索引，
+        否则（其他进程追加、截断或删除了历史）持有跨进程锁重新读取。调用方须持有 _lock。
+        """
+        signature = self._files_signature()
+        if self._index is not None and signature == self._synced:
+            return self._index
+        if signature == (None, None) and not os.path.exists(self.legacy_file):
+            self._index, self._positions, self._synced = [], {}, signature # 还没有历史，不必创建目录和锁文件
+            return self._index
+        with file_lock(self.lock_file):
+            self._reload()
+        return self._index
+
+    def _reload(self):
+        """从文件重新读取索引并补全（调用方须持有跨进程锁）。"""
+        if self._index is not None and self._files_signature() == self._synced:
+            return # 索引已是最新（写入前调用时的常见情况）
+        index = []
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'rb') as f:
+                raw = f.read()
+            usable = len(raw) - len(raw) % _INDEX_RECORD.size # 丢弃写了一半的记录
+            index = [_INDEX_RECORD.unpack_from(raw, pos) for pos in range(0, usable, _INDEX_RECORD.size)]
+            if usable != len(raw):
+                with open(self.index_file, 'r+b') as f:
+                    f.truncate(usable)
+        self._index = index
+        self._positions = {entry[0]: position for position, entry in enumerate(index)}
+        # 文件可能已被其他进程改写，缓存的最后快照不一定还是最后一条记录
+        self._forget_last_state()
+        self._recover()
+        if not self._index and os.path.exists(self.legacy_file):
+            self._migrate_legacy()
+        self._synced = self._files_signature()
+
+    def _recover(self):
+        """数据已写入但索引未写入（进程中断）时，扫描索引之后的数据补全索引。"""
+        if not os.path.exists(self.data_file):
+            return
+        indexed_end = self._index[-1][1] + self._index[-1][2] if self._index else 0
+        if os.path.getsize(self.data_file) <= indexed_end:
+            return
+        with open(self.data_file, 'rb') as f:
+            f.seek(indexed_end)
+            offset = indexed_end
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break # 最后一行未写完，忽略并在下次追加时覆盖
+                record = json.loads(line)
+                self._append_index(record.get('round', len(self._index) + 1), offset, len(line), record.get('keyframe', True))
+                offset += len(line)
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+        if offset < end:
+            with open(self.data_file, 'r+b') as f:
+                f.truncate(offset)
+
+    def _append_index(self, round_number: int, offset: int, length: int, is_keyframe: bool):
+        with open(self.index_file, 'ab') as f:
+            f.write(_INDEX_RECORD.pack(round_number, offset, length, int(is_keyframe)))
+        self._positions[round_number] = len(self._index)
+        self._index.append((round_number, offset, length, int(is_keyframe)))
+
+    def _migrate_legacy(self):
+        """把旧版 rounds_history.json（整个列表）转换为追加格式。"""
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                legacy_history = json.load(f)
+        except json.JSONDecodeError:
+            legacy_history = [] # 历史数据文件损坏，重新创建
+        for round_data in legacy_history:
+            self._append(round_data)
+        os.replace(self.legacy_file, self.legacy_file + '.migrated')
+
+    # --- 读写 ---
+    def _pack(self, payload: bytes, record: dict) -> bytes:
+        """
+        把一条记录（payload 为它的 JSON）编码为数据文件中的一行。压缩时外层仍是一行 JSON，
+        保留回合号和关键帧标记（_recover 扫描数据时只读这两项），内容经 zlib 压缩后以 base64 保存在 "z" 中。
+        """
+        if self.compression_level:
+            wrapper = {'round': record['round'], 'keyframe': record['keyframe'],
+                       'z': base64.b64encode(zlib.compress(payload, self.compression_level)).decode('ascii')}
+            payload = json.dumps(wrapper, separators=(',', ':')).encode('utf-8')
+        return payload + b'\n'
+
+    def _append(self, round_data: dict):
+        position = len(self._index)
+        if position % self.keyframe_interval == 0:
+            record = {'round': round_data.get('round'), 'keyframe': True, 'data': round_data}
+            state_bytes = None # 等于本条记录未压缩的大小
+        else:
+            cached = file_cache.recall(self.data_dir, self._last_state_key)
+            if cached is None:
+                last_state = self._reconstruct(position - 1)
+                state_bytes = len(json.dumps(last_state, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            else:
+                last_state, state_bytes = cached
+            record = encode_round(last_state, round_data)
+
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if state_bytes is None:
+            state_bytes = len(payload)
+        line = self._pack(payload, record)
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(self.data_file, 'ab') as f:
+            offset = f.tell()
+            f.write(line)
+            instrumentation.add_bytes_written(len(line))
+            f.flush()
+            os.fsync(f.fileno())
+        self._append_index(round_data.get('round', position + 1), offset, len(line), record['keyframe'])
+        if self.keyframe_interval > 1: # 每条都是关键帧时不需要保留上一条快照
+            file_cache.remember(self.data_dir, self._last_state_key, (copy.deepcopy(round_data), state_bytes), state_bytes)
+
+    def append(self, round_data: dict):
+        """追加一个回合的历史数据（完整快照），按需编码为关键帧或差异记录。"""
+        with self._lock, file_lock(self.lock_file):
+            self._reload()
+            self._append(round_data)
+            self._synced = self._files_signature()
+
+    def _read_record(self, f, position: int) -> dict:
+        _, offset, length, _ = self._index[position]
+        f.seek(offset)
+        instrumentation.add_bytes_read(length)
+        return _unpack(json.loads(f.read(length)))
+
+    def _reconstruct(self, position: int) -> dict:
+        """从最近的关键帧开始应用差异，重建第 position 条记录的完整快照。"""
+        start = position
+        while start > 0 and not self._index[start][3]:
+            start -= 1
+        state = {}
+        with open(self.data_file, 'rb') as f:
+            for i in range(start, position + 1):
+                state = decode_round(state, self._read_record(f, i))
+        return state
+
+    def rounds(self) -> list[int]:
+        """返回已记录的所有回合号（按写入顺序）。"""
+        with self._lock:
+            return [entry[0] for entry in self._load_index()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._load_index())
+
+    def load_round(self, round_number: int):
+        """
+        读取指定回合的完整快照（同一回合写入多次时取最后一次），不存在时返回 None。
+        通过索引直接定位，最多读取 keyframe_interval 条记录。
+        """
+        with self._lock:
+            self._load_index()
+            position = self._positions.get(round_number)
+            return self._reconstruct(position) if position is not None else None
+
+    def record_location(self, round_number: int):
+        """
+        指定回合（最后一次写入）的记录在数据文件中的 (偏移, 字节数)，不存在时返回 None。
+        回退后重新写入的同一回合位于不同的位置，可以用它区分同一回合号的新旧记录。
+        """
+        with self._lock:
+            index = self._load_index()
+            position = self._positions.get(round_number)
+            return index[position][1:3] if position is not None else None
+
+    def load_at(self, position: int) -> dict:
+        """按写入顺序读取第 position 条记录的完整快照（支持负数下标）。"""
+        with self._lock:
+            index = self._load_index()
+            return self._reconstruct(range(len(index))[position])
+
+    def iter_rounds(self):
+        """按写入顺序逐回合重建完整快照，内存中每次只保留一个回合。"""
+        with self._lock:
+            index = list(self._load_index())
+        if not index:
+            return
+        state = {}
+        with open(self.data_file, 'rb') as f:
+            for _, offset, length, _ in index:
+                f.seek(offset)
+                state = decode_round(state, _unpack(json.loads(f.read(length))))
+                yield state
+
+    def load_all(self) -> list[dict]:
+        return list(self.iter_rounds())
+
+    def truncate_after_round(self, round_number: int):
+        """
+        删除 round_number 之后写入的所有记录（用于把游戏回退到某一回合）。
+        保留到最后一条回合号不大于 round_number 的记录为止。
+        """
+        with self._lock, file_lock(self.lock_file):
+            self._reload()
+            index = self._index
+            keep = len(index)
+            while keep > 0 and index[keep - 1][0] > round_number:
+                keep -= 1
+            if keep == len(index):
+                return
+            data_end = index[keep - 1][1] + index[keep - 1][2] if keep else 0
+            # 先截断索引再截断数据：若中途中断，多出的数据会在下次加载时由 _recover 重新加入索引，相当于没有回退
+            with open(self.index_file, 'r+b') as f:
+                f.truncate(keep * _INDEX_RECORD.size)
+            with open(self.data_file, 'r+b') as f:
+                f.truncate(data_end)
+            self._index = index[:keep]
+            self._positions = {entry[0]: position for position, entry in enumerate(self._index)}
+            self._synced = self._files_signature()
+            self._forget_last_state()
+
+    def clear(self):
+        """删除全部历史数据和索引。"""
+        with self._lock, file_lock(self.lock_file):
+            for path in (self.data_file, self.index_file, self.legacy_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._index = None
+            self._positions = {}
+            self._forget_last_state()
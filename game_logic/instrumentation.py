@@ -0,0 +1,176 @@
+# game_logic/instrumentation.py
+"""
+推进回合的分阶段计时。
+
+用法:
+    with instrumentation.record_round(5):          # 开始记录第 5 回合
+        with instrumentation.stage("load"):        # 计时一个阶段
+            ...
+        instrumentation.add_bytes_read(n)          # 累计读写字节数
+
+    @instrumentation.timed("calculation")         # 以装饰器形式计时
+    def compute(...): ...
+
+只有在 record_round 内部（同一线程）才会记录；其余时候 stage() 返回一个共享的
+空上下文，计数函数直接返回，开销接近于零。设置环境变量 BOYI_INSTRUMENTATION=0
+可完全关闭。
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+MAX_RECORDED_ROUNDS = 50 # 每局游戏在内存中保留的最近回合计时数量
+
+_enabled = os.environ.get("BOYI_INSTRUMENTATION", "1") != "0"
+_local = threading.local()
+_recent = {} # {游戏编号: deque[RoundTiming]}，每局游戏各自保留最近的记录
+_recent_lock = threading.Lock()
+_sequence = itertools.count() # 记录的先后顺序（合并多局游戏的记录时使用）
+
+
+class RoundTiming:
+    """一次推进回合的计时记录：各阶段耗时（秒）与读写字节数。"""
+    __slots__ = ('label', 'game_id', 'sequence', 'started_at', 'stages', 'bytes_read', 'bytes_written', 'total_seconds')
+
+    def __init__(self, label, game_id=None):
+        self.label = label
+        self.game_id = game_id
+        self.sequence = next(_sequence)
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.total_seconds = 0.0
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "game_id": self.game_id,
+            "started_at": self.started_at,
+            "total_seconds": self.total_seconds,
+            "stages": dict(self.stages),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('record', 'name', 'start')
+
+    def __init__(self, record: RoundTiming, name: str):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.record.stages[self.name] = self.record.stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+def set_enabled(enabled: bool):
+    global _enabled
+    _enabled = enabled
+
+
+def stage(name: str):
+    """计时一个阶段；同名阶段多次进入时耗时累加。"""
+    record = getattr(_local, 'record', None)
+    if record is None:
+        return _NULL_STAGE
+    return _Stage(record, name)
+
+
+def timed(name: str = None):
+    """把整个函数作为一个阶段计时的装饰器。"""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = getattr(_local, 'record', None)
+            if record is None:
+                return func(*args, **kwargs)
+            with _Stage(record, stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_bytes_read(count: int):
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record.bytes_read += count
+
+def add_bytes_written(count: int):
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record.bytes_written += count
+
+
+@contextmanager
+def record_round(label, game_id: str = None):
+    """在当前线程记录一次推进回合的计时，结束后加入游戏 game_id 的最近记录列表。"""
+    if not _enabled:
+        yield None
+        return
+    record = RoundTiming(label, game_id)
+    previous = getattr(_local, 'record', None)
+    _local.record = record
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.total_seconds = time.perf_counter() - start
+        _local.record = previous
+        with _recent_lock:
+            _recent.setdefault(game_id, deque(maxlen=MAX_RECORDED_ROUNDS)).append(record)
+
+
+def recent_rounds(limit: int = None, game_id: str = None) -> list[dict]:
+    """
+    游戏 game_id 最近 limit 次推进回合的计时（最新的在最后）。
+    game_id 为空时返回所有游戏的记录（按记录先后合并）。
+    """
+    with _recent_lock:
+        if game_id is not None:
+            records = list(_recent.get(game_id, ()))
+        else:
+            records = sorted((r for game in _recent.values() for r in game), key=lambda r: r.sequence)
+    if limit is not None:
+        records = records[-limit:]
+    return [r.to_dict() for r in records]
+
+
+def export_json(limit: int = None, game_id: str = None) -> str:
+    return json.dumps(recent_rounds(limit, game_id), indent=2, ensure_ascii=False)
+
+
+def clear():
+    with _recent_lock:
+        _recent.clear()
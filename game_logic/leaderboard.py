@@ -0,0 +1,127 @@
+# game_logic/leaderboard.py
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from game_logic.models import Player
+
+# 排名指标 -> Player 属性
+RANKING_METRICS = {
+    "capital": "capital",
+    "net_asset": "net_asset",
+    "profit": "last_round_profit",
+    "market_share": "market_share",
+}
+
+
+class Leaderboard:
+    """
+    某一数据版本的排行榜。
+
+    各指标的取值在构造时提取为数组；每个指标的排序只在第一次用到时计算一次，
+    之后的排名查询、分页和 top-K 都直接复用。尚未排序的指标做 top-K 时使用
+    argpartition，只对前 K 名排序。
+    """
+    def __init__(self, players: list[Player]):
+        self.players = list(players)
+        self._values = {}
+        self._orders = {}
+        self._ranks = {}
+        self._positions = {p.player_id: i for i, p in enumerate(self.players)}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.players)
+
+    def _metric_values(self, metric: str) -> np.ndarray:
+        if metric not in RANKING_METRICS:
+            raise ValueError(f"未知的排名指标: {metric}")
+        values = self._values.get(metric)
+        if values is None:
+            attr = RANKING_METRICS[metric]
+            values = np.fromiter((getattr(p, attr) for p in self.players), dtype=float, count=len(self.players))
+            self._values[metric] = values
+        return values
+
+    def order(self, metric: str = "capital") -> np.ndarray:
+        """按指标从高到低的玩家下标（同分时保持原顺序）。"""
+        with self._lock:
+            order = self._orders.get(metric)
+            if order is None:
+                order = np.argsort(-self._metric_values(metric), kind="stable")
+                ranks = np.empty_like(order)
+                ranks[order] = np.arange(1, len(order) + 1)
+                self._orders[metric] = order
+                self._ranks[metric] = ranks
+            return order
+
+    def ranked(self, metric: str = "capital") -> list[Player]:
+        """完整的排名列表。"""
+        return [self.players[i] for i in self.order(metric)]
+
+    def top(self, k: int, metric: str = "capital") -> list[Player]:
+        """前 k 名。"""
+        n = len(self.players)
+        k = max(0, min(k, n))
+        if metric in self._orders or k == n:
+            return [self.players[i] for i in self.order(metric)[:k]]
+        if k == 0:
+            return []
+        values = -self._metric_values(metric)
+        # argpartition 找出第 k 名的取值，再取出所有不差于它的玩家（包含同分者）排序，
+        # flatnonzero 按下标递增返回，稳定排序后同分顺序与完整排序一致
+        threshold = values[np.argpartition(values, k - 1)[k - 1]]
+        candidates = np.flatnonzero(values <= threshold)
+        best = candidates[np.argsort(values[candidates], kind="stable")][:k]
+        return [self.players[i] for i in best]
+
+    def rank_of(self, player_id: str, metric: str = "capital"):
+        """单个玩家的名次（从 1 开始），玩家不存在时返回 None。"""
+        position = self._positions.get(player_id)
+        if position is None:
+            return None
+        self.order(metric)
+        return int(self._ranks[metric][position])
+
+    def page(self, page: int, page_size: int, metric: str = "capital") -> list[tuple]:
+        """第 page 页（从 1 开始）的 [(名次, Player)]。"""
+        start = max(0, (page - 1) * page_size)
+        indices = self.order(metric)[start:start + page_size]
+        return [(start + offset + 1, self.players[i]) for offset, i in enumerate(indices)]
+
+    def page_count(self, page_size: int) -> int:
+        return max(1, -(-len(self.players) // page_size))
+
+
+# --- 按数据版本缓存的排行榜 ---
+_leaderboards = OrderedDict() # 按最近使用排序，多局游戏共享
+_leaderboards_lock = threading.Lock()
+_MAX_CACHED_LEADERBOARDS = 32
+
+def get_leaderboard(players, version) -> Leaderboard:
+    """
+    返回 version 对应的排行榜，同一版本只构建一次。
+    version 通常取 (游戏编号, 存储的 data_version())：玩家数据的每次写入（包括其他进程的写入）都会改变它。
+    同一进程内推进回合、重置、生成账户之后仍调用 invalidate_leaderboards() 释放旧版本。
+    players 可以是玩家列表，也可以是返回玩家列表的函数（只在缓存未命中时调用，命中时不加载玩家）。
+    """
+    with _leaderboards_lock:
+        leaderboard = _leaderboards.get(version)
+        if leaderboard is not None:
+            _leaderboards.move_to_end(version)
+            return leaderboard
+    # 加载和排序不持有锁；并发构建同一版本时结果相同，先写入的保留
+    leaderboard = Leaderboard(players() if callable(players) else players)
+    with _leaderboards_lock:
+        existing = _leaderboards.get(version)
+        if existing is not None:
+            return existing
+        if len(_leaderboards) >= _MAX_CACHED_LEADERBOARDS:
+            _leaderboards.popitem(last=False)
+        _leaderboards[version] = leaderboard
+        return leaderboard
+
+def invalidate_leaderboards():
+    """清空排行榜缓存（回合提交、重置游戏后调用）。"""
+    with _leaderboards_lock:
+        _leaderboards.clear()
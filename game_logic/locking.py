@@ -0,0 +1,23 @@
+# game_logic/locking.py
+
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError: # Windows 没有 fcntl，只能依靠调用方在进程内的 threading.Lock 互斥
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """
+    跨进程独占锁：对锁文件 path（不存在时创建）加 flock，退出时释放。
+    管理端、玩家端和命令行工具运行在不同进程中，改写同一份数据文件时用它互斥。
+    同一线程内不可重入；锁文件不存放数据，不要删除它。
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX) # 关闭文件时自动释放
+        yield
@@ -0,0 +1,155 @@
+# game_logic/provisioning.py
+"""
+批量创建/更新玩家账户。
+
+- 名单（roster）是 [(玩家ID, 公司名称)]，可以按数量生成（player1..playerN），也可以从 CSV 读取
+- 与现有玩家合并时使用 {玩家ID: Player} 哈希索引，整体 O(N)
+- 新玩家的密码从密码学安全的随机字节一次性批量生成，不逐个调用 random.choice
+- 结果通过 save_players_data 一次写入（SQLite 为单个事务，JSON 为一次原子替换）
+
+CSV 需要包含玩家ID和公司名称两列，表头可以是 player_id / company_name，
+也可以是管理员端下载的登录信息中的 “玩家ID” / “公司名称”（多余的列，例如登录密码，会被忽略）。
+
+用法:
+    python -m game_logic.provisioning data/ roster.csv --game class-3a --credentials credentials.csv
+"""
+
+import argparse
+import csv
+import secrets
+import string
+import sys
+import numpy as np
+from game_logic.models import Player, GameSettings
+from game_logic.storage import get_storage, DEFAULT_GAME_ID
+
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+PASSWORD_LENGTH = 8
+ROSTER_COLUMNS = {
+    "player_id": ("player_id", "玩家ID", "ID"),
+    "company_name": ("company_name", "公司名称"),
+}
+CREDENTIAL_COLUMNS = ("玩家ID", "公司名称", "登录密码")
+
+
+def generate_passwords(count: int, length: int = PASSWORD_LENGTH) -> list[str]:
+    """
+    批量生成 count 个由大小写字母和数字组成的随机密码。
+    随机字节一次性从 secrets.token_bytes（操作系统的密码学安全随机源）取出，再映射到字母表上：
+    只保留小于字母表长度整数倍的字节（拒绝采样），取模后每个字符的概率完全相同。
+    """
+    alphabet = np.frombuffer(PASSWORD_ALPHABET.encode('ascii'), dtype=np.uint8)
+    needed = count * length
+    limit = 256 - 256 % len(alphabet) # 62 个字符时为 248，拒绝约 3% 的字节
+    chars = np.empty(0, dtype=np.uint8)
+    while len(chars) < needed:
+        missing = needed - len(chars)
+        raw = np.frombuffer(secrets.token_bytes(missing + missing // 16 + 16), dtype=np.uint8) # 多取一些抵消被拒绝的字节
+        chars = np.concatenate([chars, raw[raw < limit]])
+    text = alphabet[chars[:needed] % len(alphabet)].tobytes().decode('ascii')
+    return [text[i:i + length] for i in range(0, needed, length)]
+
+
+def sequential_roster(count: int) -> list[tuple]:
+    """player1..playerN 和 公司1..公司N。"""
+    return [(f"player{i + 1}", f"公司{i + 1}") for i in range(count)]
+
+
+def read_roster_csv(stream) -> list[tuple]:
+    """
+    从文本流中读取名单，返回 [(玩家ID, 公司名称)]。
+    缺少必需的列、玩家ID 为空或重复时抛出 ValueError（错误信息包含行号）；公司名称为空时使用玩家ID。
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("CSV 文件为空")
+    header = [name.strip() for name in header]
+    positions = {}
+    for column, aliases in ROSTER_COLUMNS.items():
+        position = next((header.index(alias) for alias in aliases if alias in header), None)
+        if position is None:
+            raise ValueError(f"CSV 缺少列: {' / '.join(aliases)}")
+        positions[column] = position
+    id_at, name_at = positions["player_id"], positions["company_name"]
+
+    roster = []
+    seen = {}
+    for line, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue # 跳过空行
+        player_id = row[id_at].strip() if id_at < len(row) else ""
+        company_name = row[name_at].strip() if name_at < len(row) else ""
+        if not player_id:
+            raise ValueError(f"第 {line} 行: 玩家ID 为空")
+        if player_id in seen:
+            raise ValueError(f"第 {line} 行: 玩家ID {player_id} 与第 {seen[player_id]} 行重复")
+        seen[player_id] = line
+        roster.append((player_id, company_name or player_id))
+    return roster
+
+
+def provision_players(existing: list[Player], roster: list[tuple], initial_capital: float,
+                      replace: bool = False, rename: bool = True):
+    """
+    按名单创建/更新玩家，返回 (players, created, updated)。
+
+    名单中已有的玩家保留密码和全部游戏数据，rename 为 True 时更新公司名称；
+    新玩家使用 initial_capital 和批量生成的密码，追加在现有玩家之后。
+    replace 为 True 时只保留名单中的玩家（按名单顺序），否则名单外的现有玩家保持不变。
+    """
+    index = {p.player_id: p for p in existing}
+    listed = set()
+    new_entries = []
+    updated = 0
+    for player_id, company_name in roster:
+        listed.add(player_id)
+        player = index.get(player_id)
+        if player is None:
+            new_entries.append((player_id, company_name))
+        elif rename and player.company_name != company_name:
+            player.company_name = company_name
+            updated += 1
+
+    passwords = generate_passwords(len(new_entries))
+    created = [Player(player_id, company_name, initial_capital, password)
+               for (player_id, company_name), password in zip(new_entries, passwords)]
+    if replace:
+        created_index = {p.player_id: p for p in created}
+        players = [index.get(player_id) or created_index[player_id] for player_id, _ in roster]
+    else:
+        players = list(existing) + created
+    return players, len(created), updated
+
+
+def write_credentials(players: list[Player], stream):
+    """把玩家的登录信息逐行写成 CSV（与管理员端下载的登录信息格式相同）。"""
+    writer = csv.writer(stream)
+    writer.writerow(CREDENTIAL_COLUMNS)
+    writer.writerows((p.player_id, p.company_name, p.password) for p in players)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从 CSV 名单批量创建/更新玩家账户")
+    parser.add_argument("data_dir", help="数据目录")
+    parser.add_argument("roster", help="名单 CSV（player_id/company_name 或 玩家ID/公司名称 两列）")
+    parser.add_argument("--game", default=DEFAULT_GAME_ID, help="游戏编号")
+    parser.add_argument("--replace", action="store_true", help="只保留名单中的玩家（默认与现有玩家合并）")
+    parser.add_argument("--credentials", help="把所有玩家的登录信息写入该 CSV 文件")
+    args = parser.parse_args(argv)
+
+    storage = get_storage(args.data_dir, game_id=args.game)
+    with open(args.roster, 'r', encoding='utf-8-sig', newline='') as f:
+        roster = read_roster_csv(f)
+    settings = storage.load_game_settings() or GameSettings()
+    players, created, updated = provision_players(storage.load_players_data(), roster,
+                                                  settings.initial_player_capital, replace=args.replace)
+    storage.save_players_data(players)
+    if args.credentials:
+        with open(args.credentials, 'w', encoding='utf-8-sig', newline='') as f:
+            write_credentials(players, f)
+    print(f"新增 {created} 位玩家，更新 {updated} 位玩家，共 {len(players)} 位玩家", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# game_logic/reports.py
+"""
+城市报表：每回合结算后为每个城市计算一次，作为不可变快照与回合一起保存。
+玩家购买某城市的报表（Player.bought_city_reports）后，页面按回合号直接读取快照，
+不需要在每次页面刷新时重新汇总所有玩家的数据。
+"""
+
+import numpy as np
+from game_logic.models import Player, Market
+from game_logic.calculations import MarketAggregates
+
+PRICE_PERCENTILES = (25, 50, 75)
+
+
+def build_city_reports(players: list[Player], markets: list[Market], aggregates: MarketAggregates = None) -> dict:
+    """
+    根据结算后的玩家状态和本回合的 MarketAggregates 生成所有城市的报表快照：
+    {"round": 回合号, "cities": {城市名: 报表}}。
+
+    每个城市的报表包括在售玩家数、供给量、需求量、销量、广告总投入、平均产品质量、
+    店铺总数、价格分布（最低/四分位/最高/按销量加权的均价），以及 CPI 的分布
+    （最高/最低/极差/标准差）和外部选择份额。汇总量直接取自 aggregates，不重新扫描玩家。
+    """
+    names = [m.name for m in markets]
+    round_number = markets[0].current_round if markets else 0
+    n, c = len(players), len(names)
+    size = np.array([m.total_market_size for m in markets], dtype=float)
+    price = np.fromiter((p.current_price for p in players), dtype=float, count=n)
+    cpi = np.array([[p.cpi_per_city.get(name, 0.0) for name in names] for p in players], dtype=float).reshape(n, c)
+    sales = np.array([[p.actual_sales_per_city.get(name, 0) for name in names] for p in players], dtype=float).reshape(n, c)
+    demand = cpi * size[None, :]
+
+    cities = {}
+    for j, name in enumerate(names):
+        competition = aggregates.city(name) if aggregates is not None else {}
+        sellers = cpi[:, j] > 0
+        city_prices = price[sellers]
+        city_sales = sales[sellers, j]
+        city_cpi = cpi[sellers, j]
+        report = {
+            "market_size": float(size[j]),
+            "sellers": competition.get("sellers", int(sellers.sum())),
+            "total_supply": competition.get("supply", 0.0),
+            "total_demand": float(demand[:, j].sum()),
+            "total_sales": int(city_sales.sum()),
+            "advertising": competition.get("advertising", 0.0),
+            "avg_quality": competition.get("avg_quality", 0.0),
+            "stores": competition.get("stores", 0),
+            "outside_share": float(1 - city_cpi.sum()),
+            "price": None,
+            "cpi": None,
+        }
+        if len(city_prices):
+            quartiles = np.percentile(city_prices, PRICE_PERCENTILES)
+            report["price"] = {
+                "min": float(city_prices.min()),
+                "p25": float(quartiles[0]),
+                "median": float(quartiles[1]),
+                "p75": float(quartiles[2]),
+                "max": float(city_prices.max()),
+                "weighted_mean": float((city_prices * city_sales).sum() / city_sales.sum()) if city_sales.sum() > 0
+                                 else float(city_prices.mean()),
+            }
+            report["cpi"] = {
+                "max": float(city_cpi.max()),
+                "min": float(city_cpi.min()),
+                "spread": float(city_cpi.max() - city_cpi.min()),
+                "std": float(city_cpi.std()),
+            }
+        cities[name] = report
+    return {"round": round_number, "cities": cities}
+
+
+def format_city_report(report: dict) -> list[dict]:
+    """把一个城市的报表转换为页面表格的行：[{"指标": ..., "数值": ...}]。"""
+    rows = [
+        {"指标": "市场总需求量", "数值": f"{report['market_size']:,.0f} 单位"},
+        {"指标": "在售公司数", "数值": f"{report['sellers']}"},
+        {"指标": "总供给量", "数值": f"{report['total_supply']:,.0f} 单位"},
+        {"指标": "广告总投入", "数值": f"¥{report.get('advertising', 0):,.2f}"},
+        {"指标": "平均产品质量", "数值": f"{report.get('avg_quality', 0):.2f}"},
+        {"指标": "店铺总数", "数值": f"{report.get('stores', 0)}"},
+        {"指标": "总需求量（各公司吸引到的需求）", "数值": f"{report['total_demand']:,.0f} 单位"},
+        {"指标": "总销量", "数值": f"{report['total_sales']:,} 单位"},
+        {"指标": "流向外部选择的需求份额", "数值": f"{report['outside_share']:.2%}"},
+    ]
+    price = report.get("price")
+    if price:
+        rows += [
+            {"指标": "价格区间", "数值": f"¥{price['min']:,.2f} - ¥{price['max']:,.2f}"},
+            {"指标": "价格四分位 (25% / 50% / 75%)",
+             "数值": f"¥{price['p25']:,.2f} / ¥{price['median']:,.2f} / ¥{price['p75']:,.2f}"},
+            {"指标": "按销量加权的平均价格", "数值": f"¥{price['weighted_mean']:,.2f}"},
+        ]
+    cpi = report.get("cpi")
+    if cpi:
+        rows += [
+            {"指标": "CPI 最高 / 最低", "数值": f"{cpi['max']:.2%} / {cpi['min']:.2%}"},
+            {"指标": "CPI 极差 / 标准差", "数值": f"{cpi['spread']:.2%} / {cpi['std']:.2%}"},
+        ]
+    return rows
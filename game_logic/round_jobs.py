@@ -0,0 +1,158 @@
+# game_logic/round_jobs.py
+"""
+后台推进回合：管理员提交任务后页面立即返回，计算在工作线程中进行，页面按任务 ID 轮询进度。
+
+- 每局游戏同一时间只运行一个任务，重复提交（例如刷新页面后再次点击）返回正在运行的任务
+- 开始计算前把决策日志中的事件叠加到玩家上（见 game_logic/decisions.py），事件随回合历史保存（"decision_log"）
+- 计算全部在内存中完成，结束时通过 storage.commit_round 一次性保存玩家、市场、回合历史和城市报表，
+  并从决策日志中删除已结算的事件；计算期间提交的决策留到下一回合
+- 提交时记下当前回合；开始计算前发现回合已被推进（例如被另一个进程推进）则放弃
+
+使用线程池而不是进程池：任务要共享进程内的存储实例和文件缓存，而回合计算的主体是
+NumPy 运算，执行期间会释放 GIL，不会阻塞 Streamlit 的会话线程。
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from game_logic.models import GameSettings
+from game_logic.calculations import calculate_round_results
+from game_logic.decisions import apply_decision_log
+from game_logic.leaderboard import invalidate_leaderboards
+from game_logic.view_cache import invalidate_views
+from game_logic.simulate import build_round_history
+from game_logic.reports import build_city_reports
+from game_logic import instrumentation
+
+ROUND_WORKERS_ENV = "BOYI_ROUND_WORKERS" # 工作线程数量（同时推进回合的游戏数），默认 2
+MAX_FINISHED_JOBS = 100 # 内存中保留的已结束任务数量
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 各阶段开始时的进度
+_STAGE_PROGRESS = {"load": 0.05, "calculation": 0.2, "commit": 0.7}
+
+
+class RoundJob:
+    """一次推进回合任务的状态，由工作线程更新、页面线程读取。"""
+    __slots__ = ('job_id', 'game_id', 'expected_round', 'status', 'stage', 'progress', 'error',
+                 'result_round', 'submitted_at', 'finished_at')
+
+    def __init__(self, game_id: str, expected_round: int):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.game_id = game_id
+        self.expected_round = expected_round
+        self.status = JOB_QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.error = None
+        self.result_round = None
+        self.submitted_at = datetime.now().isoformat(timespec="seconds")
+        self.finished_at = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    def _enter_stage(self, stage: str):
+        self.stage = stage
+        self.progress = _STAGE_PROGRESS[stage]
+        return instrumentation.stage(stage)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+_executor = None
+_jobs = OrderedDict() # {job_id: RoundJob}
+_active = {} # {game_id: RoundJob}
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        workers = int(os.environ.get(ROUND_WORKERS_ENV, "2"))
+        _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="round-job")
+    return _executor
+
+
+def submit_round(storage, game_id: str, expected_round: int) -> RoundJob:
+    """
+    提交一个推进回合任务，expected_round 为提交时的当前回合。
+    该游戏已有任务在运行时不重复提交，直接返回该任务。
+    """
+    with _lock:
+        job = _active.get(game_id)
+        if job is not None:
+            return job
+        job = RoundJob(game_id, expected_round)
+        _active[game_id] = job
+        _jobs[job.job_id] = job
+        while len(_jobs) > MAX_FINISHED_JOBS:
+            oldest = next(iter(_jobs.values()))
+            if oldest.is_active:
+                break
+            _jobs.popitem(last=False)
+        executor = _get_executor()
+    executor.submit(_run, job, storage)
+    return job
+
+
+def _run(job: RoundJob, storage):
+    job.status = JOB_RUNNING
+    status = JOB_FAILED
+    try:
+        with instrumentation.record_round(job.expected_round + 1, job.game_id):
+            with job._enter_stage("load"):
+                players = storage.load_players_data()
+                markets = storage.load_markets_data()
+                settings = storage.load_game_settings() or GameSettings()
+                decision_log = storage.load_decision_log()
+                apply_decision_log(players, decision_log)
+            if not markets:
+                raise ValueError("无法推进回合：未设置任何市场数据。")
+            if markets[0].current_round != job.expected_round:
+                raise ValueError(f"回合已被推进到 {markets[0].current_round}，本次任务已取消。")
+
+            with job._enter_stage("calculation"):
+                players, markets, aggregates = calculate_round_results(players, markets, settings, with_aggregates=True)
+
+            with job._enter_stage("commit"):
+                round_data = build_round_history(markets, players)
+                round_data["decision_log"] = decision_log
+                storage.commit_round(players, markets, round_data,
+                                     city_reports=build_city_reports(players, markets, aggregates),
+                                     decision_events=len(decision_log))
+        invalidate_leaderboards()
+        invalidate_views(job.game_id)
+        job.result_round = markets[0].current_round
+        job.progress = 1.0
+        status = JOB_DONE
+    except Exception as e: # 任务在后台线程中运行，错误记录到任务状态里由页面展示
+        job.error = str(e)
+    finally:
+        # 状态与“当前运行的任务”一起更新：页面看到任务结束时，一定可以提交下一个任务
+        with _lock:
+            job.finished_at = datetime.now().isoformat(timespec="seconds")
+            job.status = status
+            if _active.get(job.game_id) is job:
+                del _active[job.game_id]
+
+def get_job(job_id: str):
+    """按任务 ID 查询任务，不存在（或已被清理）时返回 None。"""
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def active_job(game_id: str):
+    """返回该游戏正在运行的任务，没有时返回 None（刷新页面后据此恢复进度显示）。"""
+    with _lock:
+        return _active.get(game_id)
+
@@ -0,0 +1,214 @@
+# game_logic/simulate.py
+"""
+无界面的游戏模拟器：加载或生成玩家、市场和游戏设置，不经过 Streamlit 跑完所有回合。
+
+用法示例:
+    python -m game_logic.simulate --players 2000 --cities 50 --strategy random --output-dir out/
+    python -m game_logic.simulate --data-dir data/ --decisions decisions.json
+
+决策脚本 (--decisions) 为 JSON：{回合号: {玩家ID: {字段: 值}}}，回合号或玩家ID
+可以写 "*" 表示所有回合/所有玩家，具体的条目覆盖 "*" 条目。
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from game_logic.models import Player, Market, GameSettings
+from game_logic.calculations import calculate_round_results
+from game_logic.leaderboard import Leaderboard
+from game_logic.history import RoundHistoryStore
+from game_logic.storage import get_storage, DEFAULT_GAME_ID
+from game_logic.decisions import DECISION_FIELDS, apply_decision_log
+
+
+def generate_game(num_players: int, num_cities: int, seed: int = 0, settings: GameSettings = None):
+    """生成一局随机的游戏：玩家、城市市场和游戏设置。"""
+    rng = random.Random(seed)
+    settings = settings or GameSettings()
+    markets = [
+        Market(
+            name=f"城市{i+1}市场",
+            total_market_size=rng.randrange(5000, 20001, 500),
+            base_material_cost=round(rng.uniform(4, 7), 2),
+            base_labor_cost=round(rng.uniform(8, 13), 2),
+            loan_interest_rate=round(rng.uniform(0.03, 0.08), 3),
+            initial_avg_price=round(rng.uniform(15, 30), 2),
+        )
+        for i in range(num_cities)
+    ]
+    players = [
+        Player(player_id=f"player{i+1}", company_name=f"公司{i+1}", initial_capital=settings.initial_player_capital,
+               password=f"sim{i+1}")
+        for i in range(num_players)
+    ]
+    return players, markets, settings
+
+
+def random_decisions(players: list[Player], markets: list[Market], settings: GameSettings, rng: random.Random) -> dict:
+    """一个简单的随机策略，用于压力测试经济系统。"""
+    city_names = [m.name for m in markets]
+    decisions = {}
+    for p in players:
+        decision = {
+            "current_production_plan": rng.randrange(0, p.production_capacity + 1, 50),
+            "current_price": round(rng.uniform(settings.min_product_price, settings.max_product_price / 3), 2),
+            "current_advertising_budget": rng.randrange(0, 5001, 100),
+            "current_performance_investment": rng.choice((0, 0, 5000, 10000)),
+            "current_welfare_investment": rng.choice((0, 0, 5000)),
+        }
+        if city_names:
+            if not p.main_city:
+                decision["main_city"] = rng.choice(city_names)
+            if rng.random() < 0.2:
+                decision["current_new_stores"] = {rng.choice(city_names): 1}
+        decisions[p.player_id] = decision
+    return decisions
+
+
+def scripted_decisions(script: dict, round_number: int) -> dict:
+    """取出决策脚本中第 round_number 回合的决策：{玩家ID: {字段: 值}}，"*" 表示所有玩家。"""
+    merged = {}
+    for round_key in ("*", str(round_number)):
+        for player_id, decision in script.get(round_key, {}).items():
+            merged.setdefault(player_id, {}).update(decision)
+    return merged
+
+
+def apply_decisions(players: list[Player], decisions: dict):
+    """把决策写入玩家的 current_* 字段，"*" 条目作用于所有玩家。"""
+    common = decisions.get("*", {})
+    for p in players:
+        decision = decisions.get(p.player_id)
+        for fields in (common, decision or {}):
+            for field, value in fields.items():
+                if field not in DECISION_FIELDS:
+                    raise ValueError(f"决策脚本包含不支持的字段: {field}")
+                setattr(p, field, value)
+
+
+def build_round_history(markets: list[Market], players: list[Player]) -> dict:
+    """与管理员端推进回合时记录的回合历史格式相同。"""
+    return {
+        "round": markets[0].current_round if markets else 0,
+        "market_params": [m.to_dict() for m in markets],
+        "player_states": [p.to_dict() for p in players],
+    }
+
+
+def run_game(players: list[Player], markets: list[Market], settings: GameSettings, script: dict = None,
+             strategy: str = "keep", rounds: int = None, seed: int = 0, history=None, on_round=None,
+             record_history: bool = True):
+    """
+    跑完 rounds 个回合（默认到 settings.total_rounds 为止）。
+    strategy 为 "random" 时每回合先生成随机决策，再叠加决策脚本中的条目。
+    history 为任何带 append(round_data) 的对象（list 或 RoundHistoryStore），默认返回新的 list。
+    on_round(round_number, players, markets, elapsed_seconds) 在每回合结束后调用。
+    record_history 为 False 时不生成回合快照（只关心最终结果或 on_round 统计时更快）。
+    """
+    rng = random.Random(seed)
+    history = [] if history is None else history
+    start_round = markets[0].current_round if markets else 0
+    if rounds is None:
+        rounds = max(0, settings.total_rounds - start_round)
+
+    for _ in range(rounds):
+        round_number = (markets[0].current_round if markets else 0) + 1
+        if strategy == "random":
+            apply_decisions(players, random_decisions(players, markets, settings, rng))
+        if script:
+            apply_decisions(players, scripted_decisions(script, round_number))
+
+        start = time.perf_counter()
+        players, markets = calculate_round_results(players, markets, settings)
+        elapsed = time.perf_counter() - start
+
+        if record_history:
+            history.append(build_round_history(markets, players))
+        if on_round is not None:
+            on_round(round_number, players, markets, elapsed)
+    return players, markets, history
+
+
+class _JsonLinesWriter:
+    """把每回合的历史写成一行 JSON，不在内存中保留整局历史。"""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def append(self, round_data: dict):
+        self.stream.write(json.dumps(round_data, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+
+class _StorageHistory:
+    """把回合历史追加到存储后端。"""
+    def __init__(self, storage):
+        self.storage = storage
+
+    def append(self, round_data: dict):
+        self.storage.save_round_history(round_data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面运行商业模拟游戏的所有回合")
+    parser.add_argument("--data-dir", help="从该数据目录加载玩家、市场和游戏设置；不指定时随机生成")
+    parser.add_argument("--game", default=DEFAULT_GAME_ID, help="--data-dir 下的游戏编号")
+    parser.add_argument("--players", type=int, default=100, help="生成的玩家数量")
+    parser.add_argument("--cities", type=int, default=5, help="生成的城市市场数量")
+    parser.add_argument("--rounds", type=int, help="运行的回合数，默认跑到 total_rounds")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--strategy", choices=["keep", "random"], default="random",
+                        help="keep: 沿用玩家当前决策；random: 每回合随机生成决策")
+    parser.add_argument("--decisions", help="决策脚本 JSON 文件")
+    parser.add_argument("--output-dir", help="把回合历史写入该目录（rounds_history.jsonl）")
+    parser.add_argument("--overwrite", action="store_true", help="--output-dir 中已有回合历史时删除后重新写入")
+    parser.add_argument("--save", action="store_true", help="把最终状态写回 --data-dir")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        history = RoundHistoryStore(args.output_dir)
+        # 输出目录可能是一局正在进行的游戏的数据目录，不经确认不删除其中的历史
+        if not args.overwrite and any(os.path.exists(path) for path in
+                                      (history.data_file, history.index_file, history.legacy_file)):
+            parser.error(f"{args.output_dir} 中已有回合历史；确认要删除时加上 --overwrite")
+
+    if args.data_dir:
+        storage = get_storage(args.data_dir, game_id=args.game)
+        players = storage.load_players_data()
+        markets = storage.load_markets_data()
+        settings = storage.load_game_settings() or GameSettings()
+        decision_log = storage.load_decision_log()
+        apply_decision_log(players, decision_log) # 玩家已提交、尚未结算的决策和报表购买
+    else:
+        players, markets, settings = generate_game(args.players, args.cities, args.seed)
+
+    script = None
+    if args.decisions:
+        with open(args.decisions, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+
+    if args.output_dir:
+        history.clear()
+    elif args.save and args.data_dir:
+        history = _StorageHistory(storage)
+    else:
+        history = _JsonLinesWriter(sys.stdout) # 回合历史以 JSON Lines 输出到标准输出
+
+    def report(round_number, players, markets, elapsed):
+        print(f"回合 {round_number}: 计算 {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+    players, markets, _ = run_game(players, markets, settings, script=script, strategy=args.strategy,
+                                   rounds=args.rounds, seed=args.seed, history=history, on_round=report)
+
+    if args.save and args.data_dir:
+        # 回合历史已逐回合追加；玩家数据与已结算决策的日志标记一起写入，这些决策不会再叠加一次
+        storage.commit_round(players, markets, None, decision_events=len(decision_log))
+
+    print("最终排名（前 10 名，按资金）:", file=sys.stderr)
+    for rank, p in enumerate(Leaderboard(players).top(10), start=1):
+        print(f"  {rank:>3}. {p.player_id:<12} 资金 ¥{p.capital:,.2f}  净资产 ¥{p.net_asset:,.2f}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,794 @@
+# game_logic/storage.py
+
+import contextlib
+import copy
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+from game_logic.models import Player, Market, GameSettings
+from game_logic.history import RoundHistoryStore
+from game_logic.cache import file_cache
+from game_logic.locking import file_lock
+from game_logic.decisions import fold_decisions, apply_pending
+from game_logic import instrumentation
+
+# 存储后端通过环境变量选择: "json"（默认）或 "sqlite"
+STORAGE_BACKEND_ENV = "BOYI_STORAGE_BACKEND"
+SQLITE_DB_NAME = "game.db"
+
+# 多局游戏：默认游戏的数据直接放在数据目录下（兼容单局部署），
+# 其他游戏各自使用 数据目录/games/<游戏编号>/，数据与缓存互相隔离
+DEFAULT_GAME_ID = "default"
+GAMES_DIR_NAME = "games"
+_GAME_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# 城市报表快照不可变，读取后放在 file_cache 中本游戏的分区里（计入缓存上限，随分区淘汰）
+CITY_REPORTS_CACHE_KIND = "city_reports"
+# JSON 后端决策日志的增量解析状态（同样放在 file_cache 中本游戏的分区里）
+DECISION_LOG_CACHE_KIND = "decision_log"
+
+# 加载数据时可能出现的错误，调用方可以统一捕获并提示
+STORAGE_ERRORS = (OSError, ValueError, sqlite3.DatabaseError)
+
+
+def _state_from_snapshot(round_data: dict):
+    """把回合历史快照还原为 (玩家列表, 市场列表)。"""
+    players = [Player.from_dict(p) for p in round_data.get('player_states', [])]
+    markets = [Market.from_dict(m) for m in round_data.get('market_params', [])]
+    return players, markets
+
+
+class JsonStorage:
+    """
+    基于 JSON 文件的存储后端（players.json / market.json / game_settings.json），
+    回合历史保存在追加写入的 rounds_history.jsonl 中（见 game_logic/history.py），
+    玩家提交的决策追加到 decisions.jsonl（见 game_logic/decisions.py），
+    players.json 中同时记录玩家数据已结算到日志的哪个位置。
+    加载结果经由进程级 file_cache 共享，文件未变化时不重复解析。
+    也作为 SQLite 后端的导入/导出格式。
+    """
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.players_file = os.path.join(data_dir, 'players.json')
+        self.markets_file = os.path.join(data_dir, 'market.json')
+        self.game_settings_file = os.path.join(data_dir, 'game_settings.json')
+        self.history = RoundHistoryStore(data_dir)
+        # 城市报表快照：每回合一条完整记录（不做差异编码、不压缩，记录长度即缓存时计入的大小），按回合号经索引直接定位
+        self.city_reports = RoundHistoryStore(data_dir, name='city_reports', keyframe_interval=1, compression_level=0)
+        self.decisions_file = os.path.join(data_dir, 'decisions.jsonl')
+        # 追加与压缩互斥：进程内用 _decisions_lock，玩家端和管理端之间用 decisions.lock 文件锁
+        self.decisions_lock_file = os.path.join(data_dir, 'decisions.lock')
+        self._decisions_lock = threading.Lock()
+
+    def _read(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            instrumentation.add_bytes_read(os.fstat(f.fileno()).st_size)
+            return json.load(f)
+
+    def _write(self, path, data):
+        """先写临时文件再替换，读者不会看到写了一半的文件。"""
+        self._write_many([(path, data)])
+
+    def _write_many(self, items, stages: dict = None):
+        """
+        写入多个文件：先全部写成临时文件，都成功后再依次替换。
+        序列化或写临时文件出错时不替换任何文件；替换本身失败时，之前的文件已经是新的，
+        因此多个文件之间的一致性不能依赖这里（决策日志的处理见 commit_round）。
+        stages 为 {路径: 阶段名} 时，各文件的序列化和写入分别计入对应的计时阶段。
+        data 也可以是返回字节串的函数，写到该文件时才调用，原样写入（用于决策日志）。
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+        replacements = []
+        try:
+            for path, data in items:
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                replacements.append((tmp_path, path))
+                stage = instrumentation.stage(stages[path]) if stages and path in stages else contextlib.nullcontext()
+                if callable(data):
+                    with stage, open(tmp_path, 'wb') as f:
+                        f.write(data())
+                        instrumentation.add_bytes_written(f.tell())
+                    continue
+                with stage, open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=4, ensure_ascii=False)
+                    instrumentation.add_bytes_written(f.tell())
+        except BaseException:
+            for tmp_path, _ in replacements:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        for tmp_path, path in replacements:
+            os.replace(tmp_path, path)
+            file_cache.invalidate(path)
+
+    def _read_players(self, path):
+        """
+        解析玩家文件，返回 (决策日志标记, 玩家记录列表)。
+        标记 {"log": 日志编号, "offset": 已结算到的逻辑偏移} 与玩家数据写在同一个文件里，
+        两者总是一起替换（见 commit_round）；旧格式的文件只是玩家列表，没有标记。
+        """
+        data = self._read(path)
+        if isinstance(data, dict):
+            return data.get('decision_log'), data['players']
+        return None, data
+
+    @staticmethod
+    def _players_document(players_data: list, marker) -> object:
+        return {'decision_log': marker, 'players': players_data} if marker is not None else players_data
+
+    def _load_players(self, path):
+        marker, records = self._read_players(path)
+        return marker, [Player.from_dict(p) for p in records]
+
+    def _index_players(self, path):
+        """player_id -> 缓存的 Player，由 _load_players 的同一次解析建立，不再读取文件。"""
+        return {p.player_id: p for p in file_cache.get(path, self._load_players)[1]}
+
+    def _players(self):
+        """(决策日志标记, 缓存的玩家列表)；整个文件只解析一次，调用方不能修改列表中的对象。"""
+        if not os.path.exists(self.players_file):
+            return None, []
+        return file_cache.get(self.players_file, self._load_players)
+
+    def _log_marker(self):
+        """玩家数据中记录的决策日志标记，没有时返回 None（日志中的事件都未结算）。"""
+        return self._players()[0]
+
+    def _load_markets(self, path):
+        return [Market.from_dict(m) for m in self._read(path)]
+
+    def _load_game_settings(self, path):
+        return GameSettings.from_dict(self._read(path))
+
+    def load_players_data(self) -> list[Player]:
+        return [copy.copy(p) for p in self._players()[1]]
+
+    def load_player(self, player_id: str):
+        """
+        按 ID 读取单个玩家（复制缓存中的这一位玩家）；不存在时返回 None。
+        玩家已提交、尚未结算的决策和报表购买会叠加到返回的对象上（load_players_data 返回的是上次结算后的原始数据）。
+        """
+        if not os.path.exists(self.players_file):
+            return None
+        cached = file_cache.get(self.players_file, self._index_players, key='index').get(player_id)
+        if cached is None:
+            return None
+        player = copy.copy(cached)
+        pending = self._pending_for(player_id)
+        if pending:
+            apply_pending(player, pending)
+        return player
+
+    def player_count(self) -> int:
+        if not os.path.exists(self.players_file):
+            return 0
+        return len(file_cache.get(self.players_file, self._index_players, key='index'))
+
+    def data_version(self) -> tuple:
+        """
+        玩家、市场和游戏设置的数据版本：三个文件的签名。任何一次写入（包括其他进程的写入）都会改变它，
+        重置或回溯后也不会与之前的版本相同。页面视图和排行榜按它缓存（尚未结算的决策不计入）。
+        """
+        return tuple(file_cache.signature(path) for path in (self.players_file, self.markets_file, self.game_settings_file))
+
+    def save_players_data(self, players: list[Player]):
+        """保存玩家数据，保留原有的决策日志标记（已结算的事件仍不再叠加）。"""
+        self._write(self.players_file, self._players_document([p.to_dict() for p in players], self._log_marker()))
+
+    @staticmethod
+    def _decision_log_header(log_id, base: int) -> bytes:
+        """日志头部：日志编号和头部之后第一个字节的逻辑偏移（压缩删掉的字节数）。"""
+        return (json.dumps({'log': log_id, 'base': base}) + '\n').encode('utf-8')
+
+    @staticmethod
+    def _consumed_offset(marker, log_id) -> int:
+        """标记指向这份日志时返回已结算到的逻辑偏移，否则（旧标记、日志已清空重建）返回 0。"""
+        return marker['offset'] if marker is not None and marker['log'] == log_id else 0
+
+    def _sync_decision_log(self):
+        """
+        返回日志的解析状态 {'file': (设备, inode), 'marker': 解析时玩家数据中的标记, 'log': 日志编号,
+        'base': 头部之后的逻辑偏移, 'header': 头部字节数, 'offset': 已解析的字节数, 'events': [...], 'folded': {...}}。
+        日志只追加，状态保存在 file_cache 中本游戏的分区里，每次只解析 offset 之后新追加的完整行
+        并在已有的叠加结果上继续叠加；文件被替换（压缩）、变短或标记变化（结算）时从头解析。
+        逻辑偏移小于标记的事件已经结算到玩家数据中，跳过。调用方须持有 _decisions_lock。
+        """
+        try:
+            st = os.stat(self.decisions_file)
+        except FileNotFoundError:
+            file_cache.forget(self.data_dir, DECISION_LOG_CACHE_KIND)
+            return {'file': None, 'offset': 0, 'events': [], 'folded': {}}
+        marker = self._log_marker()
+        state = file_cache.recall(self.data_dir, (DECISION_LOG_CACHE_KIND,))
+        if (state is None or state['file'] != (st.st_dev, st.st_ino) or st.st_size < state['offset']
+                or state['marker'] != marker):
+            state = {'file': (st.st_dev, st.st_ino), 'marker': marker, 'log': None, 'base': 0, 'header': 0,
+                     'offset': 0, 'events': [], 'folded': {}}
+        if st.st_size > state['offset']:
+            with open(self.decisions_file, 'rb') as f:
+                f.seek(state['offset'])
+                tail = f.read()
+            complete = tail[:tail.rfind(b'\n') + 1] # 其他进程正在追加的半行留到下次读取
+            instrumentation.add_bytes_read(len(complete))
+            events = []
+            position = state['offset']
+            for line in complete.splitlines(keepends=True):
+                record = json.loads(line)
+                if position == 0 and 'base' in record: # 头部（旧版本写的日志没有头部）
+                    state['log'], state['base'], state['header'] = record['log'], record['base'], len(line)
+                elif state['base'] + position - state['header'] >= self._consumed_offset(marker, state['log']):
+                    events.append(record)
+                position += len(line)
+            state['events'].extend(events)
+            fold_decisions(events, state['folded'])
+            state['offset'] = position
+        file_cache.remember(self.data_dir, (DECISION_LOG_CACHE_KIND,), state, state['offset'])
+        return state
+
+    def append_decision(self, event: dict):
+        """追加一条决策或购买事件（见 game_logic/decisions.py），只写一行，与玩家数量无关。"""
+        line = (json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._decisions_lock, file_lock(self.decisions_lock_file):
+            with open(self.decisions_file, 'ab') as f:
+                if f.tell() == 0:
+                    # 新日志使用随机编号：清空后重建的日志不会被玩家数据中的旧标记跳过
+                    f.write(self._decision_log_header(secrets.token_hex(8), 0))
+                f.write(line)
+        instrumentation.add_bytes_written(len(line))
+
+    def load_decision_log(self) -> list[dict]:
+        """尚未结算的决策和购买事件（按提交顺序）。"""
+        with self._decisions_lock:
+            return list(self._sync_decision_log()['events'])
+
+    def _pending_for(self, player_id: str):
+        """
+        一位玩家叠加后的未结算事件（复制一份，之后的叠加不会改动它），没有时返回 None。
+        只解析上次读取之后追加的事件，一回合内逐条提交、逐次读取的总开销与事件数成正比。
+        """
+        with self._decisions_lock:
+            pending = self._sync_decision_log()['folded'].get(player_id)
+            return {name: dict(value) for name, value in pending.items()} if pending else None
+
+    def pending_decisions(self) -> dict:
+        """叠加后的未结算事件 {玩家ID: 叠加结果}（见 decisions.fold_decisions）的副本。"""
+        with self._decisions_lock:
+            folded = self._sync_decision_log()['folded']
+            return {player_id: {name: dict(value) for name, value in pending.items()} for player_id, pending in folded.items()}
+
+    def _read_decision_log(self):
+        """读取整个日志，返回 (日志编号, 头部之后的逻辑偏移, 头部字节数, 内容)。调用方须持有日志锁。"""
+        with open(self.decisions_file, 'rb') as f:
+            data = f.read()
+        instrumentation.add_bytes_read(len(data))
+        first = data[:data.find(b'\n') + 1]
+        header = json.loads(first) if first else {}
+        if 'base' in header:
+            return header['log'], header['base'], len(first), data
+        return None, 0, 0, data
+
+    def _consume_decisions(self, count: int, marker):
+        """标记之后最早的 count 条未结算事件结算后的新标记。调用方须持有日志锁。"""
+        log_id, base, header, data = self._read_decision_log()
+        consumed = self._consumed_offset(marker, log_id)
+        position = header
+        for line in data[header:].splitlines(keepends=True):
+            if count == 0 or not line.endswith(b'\n'):
+                break
+            if base + position - header >= consumed:
+                count -= 1
+            position += len(line)
+        return {'log': log_id, 'offset': base + position - header}
+
+    def _compact_to(self, marker):
+        """删除日志中逻辑偏移在标记之前（已结算）的事件，之后追加的事件保留。调用方须持有日志锁。"""
+        log_id, base, header, data = self._read_decision_log()
+        if marker is None or marker['log'] != log_id or marker['offset'] <= base:
+            return
+        remaining = data[header + marker['offset'] - base:]
+        self._write_many([(self.decisions_file, lambda: self._decision_log_header(log_id, marker['offset']) + remaining)],
+                         stages={self.decisions_file: "commit.decision_log"})
+        file_cache.forget(self.data_dir, DECISION_LOG_CACHE_KIND)
+
+    def compact_decision_log(self, count: int):
+        """删除日志中最早的 count 条未结算事件（已随回合快照保存），之后追加的事件保留。"""
+        if count <= 0 or not os.path.exists(self.decisions_file):
+            return
+        with self._decisions_lock, file_lock(self.decisions_lock_file):
+            self._compact_to(self._consume_decisions(count, self._log_marker()))
+
+    def clear_decision_log(self):
+        with self._decisions_lock, file_lock(self.decisions_lock_file):
+            if os.path.exists(self.decisions_file):
+                os.remove(self.decisions_file)
+            file_cache.forget(self.data_dir, DECISION_LOG_CACHE_KIND)
+
+    def load_markets_data(self) -> list[Market]:
+        if not os.path.exists(self.markets_file):
+            return []
+        return file_cache.get_copy(self.markets_file, self._load_markets)
+
+    def save_markets_data(self, markets: list[Market]):
+        self._write(self.markets_file, [m.to_dict() for m in markets])
+
+    def load_game_settings(self):
+        """加载游戏设置，文件不存在时返回 None。"""
+        if not os.path.exists(self.game_settings_file):
+            return None
+        return file_cache.get_copy(self.game_settings_file, self._load_game_settings)
+
+    def save_game_settings(self, settings: GameSettings):
+        self._write(self.game_settings_file, settings.to_dict())
+
+    def load_round_history(self) -> list[dict]:
+        return self.history.load_all()
+
+    def iter_round_history(self):
+        """逐回合读取历史数据。"""
+        return self.history.iter_rounds()
+
+    def load_round(self, round_number: int):
+        """读取单个回合的历史数据，不存在时返回 None。"""
+        return self.history.load_round(round_number)
+
+    def save_round_history(self, round_data: dict):
+        """追加一个回合的历史数据，开销只与该回合的数据大小有关。"""
+        self.history.append(round_data)
+
+    def clear_round_history(self):
+        """删除回合历史以及各回合的城市报表。"""
+        self.history.clear()
+        self.city_reports.clear()
+        file_cache.forget(self.data_dir, CITY_REPORTS_CACHE_KIND)
+
+    def history_rounds(self) -> list[int]:
+        """已记录历史的回合号（按写入顺序）。"""
+        return self.history.rounds()
+
+    def load_state_at(self, round_number: int):
+        """读取第 round_number 回合结束时的 (玩家列表, 市场列表)，没有该回合的历史时返回 None。"""
+        round_data = self.history.load_round(round_number)
+        return _state_from_snapshot(round_data) if round_data is not None else None
+
+    def restore_round(self, round_number: int):
+        """
+        把游戏回退到第 round_number 回合结束时的状态：恢复玩家和市场，
+        并删除之后各回合的历史、城市报表和尚未结算的决策。没有该回合的历史时抛出 ValueError。
+        """
+        state = self.load_state_at(round_number)
+        if state is None:
+            raise ValueError(f"没有第 {round_number} 回合的历史数据")
+        players, markets = state
+        players_data = [p.to_dict() for p in players]
+        markets_data = [m.to_dict() for m in markets]
+        with self._decisions_lock, file_lock(self.decisions_lock_file):
+            # 标记指向日志末尾，与玩家数据写入同一个文件：删除日志之前失败，旧的决策也不会叠加到恢复后的玩家上
+            marker = None
+            if os.path.exists(self.decisions_file):
+                log_id, base, header, data = self._read_decision_log()
+                marker = {'log': log_id, 'offset': base + len(data) - header}
+            self._write_many([(self.players_file, self._players_document(players_data, marker)),
+                              (self.markets_file, markets_data)])
+            try:
+                if marker is not None:
+                    os.remove(self.decisions_file)
+            except OSError:
+                pass # 标记已经跳过这些事件
+            file_cache.forget(self.data_dir, DECISION_LOG_CACHE_KIND)
+        self.history.truncate_after_round(round_number)
+        self.city_reports.truncate_after_round(round_number)
+        file_cache.forget(self.data_dir, CITY_REPORTS_CACHE_KIND)
+
+    def load_city_reports(self, round_number: int):
+        """
+        读取某回合的城市报表快照，不存在时返回 None。
+        缓存按记录在文件中的位置区分：其他进程回退后重新写入的同一回合不会读到旧的快照。
+        """
+        location = self.city_reports.record_location(round_number)
+        if location is None:
+            return None
+        key = (CITY_REPORTS_CACHE_KIND, round_number, location)
+        reports = file_cache.recall(self.data_dir, key)
+        if reports is None:
+            reports = self.city_reports.load_round(round_number)
+            if reports is not None:
+                file_cache.remember(self.data_dir, key, reports, location[1])
+        return reports
+
+    def iter_city_reports(self):
+        return self.city_reports.iter_rounds()
+
+    def save_city_reports(self, reports: dict):
+        self.city_reports.append(reports)
+        location = self.city_reports.record_location(reports['round'])
+        file_cache.remember(self.data_dir, (CITY_REPORTS_CACHE_KIND, reports['round'], location), reports, location[1])
+
+    def commit_round(self, players: list[Player], markets: list[Market], round_data: dict | None,
+                     city_reports: dict = None, decision_events: int = 0):
+        """
+        推进回合后保存玩家和市场，再追加回合历史和城市报表快照（round_data 为 None 时不追加历史）。
+        已结算的前 decision_events 条决策事件在日志中的位置作为标记与玩家数据写入同一个文件：
+        之后任何一步失败，这些事件都不会再叠加一次；随后从日志中删除它们只是为了让日志变短。
+        每一步分别计时（commit.save_players / save_markets / decision_log / append_history / city_reports）。
+        """
+        with instrumentation.stage("commit.save_players"):
+            players_data = [p.to_dict() for p in players]
+        with instrumentation.stage("commit.save_markets"):
+            markets_data = [m.to_dict() for m in markets]
+        stages = {self.players_file: "commit.save_players", self.markets_file: "commit.save_markets"}
+        with self._decisions_lock, file_lock(self.decisions_lock_file):
+            marker = self._log_marker()
+            if decision_events > 0 and os.path.exists(self.decisions_file):
+                with instrumentation.stage("commit.decision_log"):
+                    marker = self._consume_decisions(decision_events, marker)
+            self._write_many([(self.players_file, self._players_document(players_data, marker)),
+                              (self.markets_file, markets_data)], stages=stages)
+            try:
+                self._compact_to(marker)
+            except OSError:
+                pass # 标记已经跳过这些事件，日志留到下次结算时再压缩
+            file_cache.forget(self.data_dir, DECISION_LOG_CACHE_KIND)
+        if round_data is not None:
+            with instrumentation.stage("commit.append_history"):
+                self.history.append(round_data)
+        if city_reports is not None:
+            with instrumentation.stage("commit.city_reports"):
+                self.save_city_reports(city_reports)
+
+
+class SqliteStorage:
+    """
+    基于 SQLite（WAL 模式）的存储后端。
+    每个玩家是 players 表中的一行；提交决策只向 decision_log 表插入一行，
+    多个玩家并发提交时不会互相覆盖。
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS players (
+                    player_id TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS markets (
+                    position INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS game_settings (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS rounds_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    round INTEGER,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS rounds_history_round ON rounds_history (round);
+                CREATE TABLE IF NOT EXISTS city_reports (
+                    round INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS decision_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    player_id TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS decision_log_player ON decision_log (player_id);
+                CREATE TABLE IF NOT EXISTS data_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    epoch TEXT NOT NULL,
+                    version INTEGER NOT NULL
+                );
+            """)
+            # epoch 在建库时随机生成：删除重建数据库后版本号不会与之前的重复
+            conn.execute("INSERT OR IGNORE INTO data_version (id, epoch, version) VALUES (1, ?, 0)", (secrets.token_hex(8),))
+        self._cache_dir = os.path.dirname(os.path.abspath(db_path)) # 本游戏在 file_cache 中的分区
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程复用一个连接（Streamlit 的每个会话运行在独立线程中）。"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _dumps(data) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    def load_players_data(self) -> list[Player]:
+        rows = self._connect().execute("SELECT data FROM players ORDER BY position").fetchall()
+        instrumentation.add_bytes_read(sum(len(row[0]) for row in rows))
+        return [Player.from_dict(json.loads(row[0])) for row in rows]
+
+    def load_player(self, player_id: str):
+        """
+        按主键读取单个玩家；不存在时返回 None。
+        叠加该玩家已提交、尚未结算的决策和报表购买（load_players_data 返回的是上次结算后的原始数据）。
+        """
+        conn = self._connect()
+        row = conn.execute("SELECT data FROM players WHERE player_id = ?", (player_id,)).fetchone()
+        if row is None:
+            return None
+        player = Player.from_dict(json.loads(row[0]))
+        events = conn.execute("SELECT data FROM decision_log WHERE player_id = ? ORDER BY id", (player_id,))
+        pending = fold_decisions(json.loads(event[0]) for event in events).get(player_id)
+        if pending:
+            apply_pending(player, pending)
+        return player
+
+    def player_count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def data_version(self) -> tuple:
+        """
+        玩家、市场和游戏设置的数据版本 (epoch, 写入计数)：每个写入这三张表的事务都会把计数加一，
+        其他进程的写入同样可见。页面视图和排行榜按它缓存（尚未结算的决策不计入）。
+        """
+        return self._connect().execute("SELECT epoch, version FROM data_version WHERE id = 1").fetchone()
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+
+    def _replace_players(self, conn, players: list[Player]):
+        self._bump_version(conn)
+        conn.execute("DELETE FROM players")
+        rows = [(p.player_id, i, self._dumps(p.to_dict())) for i, p in enumerate(players)]
+        instrumentation.add_bytes_written(sum(len(row[2]) for row in rows))
+        conn.executemany("INSERT INTO players (player_id, position, data) VALUES (?, ?, ?)", rows)
+
+    def save_players_data(self, players: list[Player]):
+        """整体替换玩家列表（管理员生成账户、推进回合时使用），在一个事务内完成。"""
+        with self._connect() as conn:
+            self._replace_players(conn, players)
+
+    def append_decision(self, event: dict):
+        """插入一条决策或购买事件（见 game_logic/decisions.py）。"""
+        data = self._dumps(event)
+        instrumentation.add_bytes_written(len(data))
+        with self._connect() as conn:
+            conn.execute("INSERT INTO decision_log (player_id, data) VALUES (?, ?)", (event['player_id'], data))
+
+    def load_decision_log(self) -> list[dict]:
+        """尚未结算的决策和购买事件（按提交顺序）。"""
+        return [json.loads(row[0]) for row in self._connect().execute("SELECT data FROM decision_log ORDER BY id")]
+
+    def pending_decisions(self) -> dict:
+        """叠加后的未结算事件 {玩家ID: 叠加结果}（见 decisions.fold_decisions）。"""
+        return fold_decisions(self.load_decision_log())
+
+    def _compact_decision_log(self, conn, count: int):
+        if count > 0:
+            conn.execute("DELETE FROM decision_log WHERE id IN (SELECT id FROM decision_log ORDER BY id LIMIT ?)", (count,))
+
+    def compact_decision_log(self, count: int):
+        """删除日志中最早的 count 条事件（已随回合快照保存），之后插入的事件保留。"""
+        with self._connect() as conn:
+            self._compact_decision_log(conn, count)
+
+    def clear_decision_log(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM decision_log")
+
+    def load_markets_data(self) -> list[Market]:
+        rows = self._connect().execute("SELECT data FROM markets ORDER BY position").fetchall()
+        return [Market.from_dict(json.loads(row[0])) for row in rows]
+
+    def _replace_markets(self, conn, markets: list[Market]):
+        self._bump_version(conn)
+        conn.execute("DELETE FROM markets")
+        conn.executemany(
+            "INSERT INTO markets (position, data) VALUES (?, ?)",
+            [(i, self._dumps(m.to_dict())) for i, m in enumerate(markets)]
+        )
+
+    def save_markets_data(self, markets: list[Market]):
+        with self._connect() as conn:
+            self._replace_markets(conn, markets)
+
+    def load_game_settings(self):
+        """加载游戏设置，尚未保存过时返回 None。"""
+        row = self._connect().execute("SELECT data FROM game_settings WHERE id = 1").fetchone()
+        return GameSettings.from_dict(json.loads(row[0])) if row else None
+
+    def save_game_settings(self, settings: GameSettings):
+        with self._connect() as conn:
+            self._bump_version(conn)
+            conn.execute(
+                "INSERT INTO game_settings (id, data) VALUES (1, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+                (self._dumps(settings.to_dict()),)
+            )
+
+    def load_round_history(self) -> list[dict]:
+        rows = self._connect().execute("SELECT data FROM rounds_history ORDER BY id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_round_history(self):
+        """逐回合读取历史数据。"""
+        for row in self._connect().execute("SELECT data FROM rounds_history ORDER BY id"):
+            yield json.loads(row[0])
+
+    def load_round(self, round_number: int):
+        """读取单个回合的历史数据，不存在时返回 None。"""
+        row = self._connect().execute(
+            "SELECT data FROM rounds_history WHERE round = ? ORDER BY id DESC LIMIT 1", (round_number,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _insert_round(self, conn, round_data: dict):
+        data = self._dumps(round_data)
+        instrumentation.add_bytes_written(len(data))
+        conn.execute("INSERT INTO rounds_history (round, data) VALUES (?, ?)", (round_data.get('round'), data))
+
+    def save_round_history(self, round_data: dict):
+        with self._connect() as conn:
+            self._insert_round(conn, round_data)
+
+    def clear_round_history(self):
+        """删除回合历史以及各回合的城市报表。"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM rounds_history")
+            conn.execute("DELETE FROM city_reports")
+        file_cache.forget(self._cache_dir, CITY_REPORTS_CACHE_KIND)
+
+    def history_rounds(self) -> list[int]:
+        """已记录历史的回合号（按写入顺序）。"""
+        return [row[0] for row in self._connect().execute("SELECT round FROM rounds_history ORDER BY id")]
+
+    def load_state_at(self, round_number: int):
+        """读取第 round_number 回合结束时的 (玩家列表, 市场列表)，没有该回合的历史时返回 None。"""
+        round_data = self.load_round(round_number)
+        return _state_from_snapshot(round_data) if round_data is not None else None
+
+    def restore_round(self, round_number: int):
+        """
+        把游戏回退到第 round_number 回合结束时的状态：在同一个事务内恢复玩家和市场，
+        并删除之后各回合的历史、城市报表和尚未结算的决策。没有该回合的历史时抛出 ValueError。
+        """
+        state = self.load_state_at(round_number)
+        if state is None:
+            raise ValueError(f"没有第 {round_number} 回合的历史数据")
+        players, markets = state
+        with self._connect() as conn:
+            self._replace_players(conn, players)
+            self._replace_markets(conn, markets)
+            last_id = conn.execute("SELECT MAX(id) FROM rounds_history WHERE round = ?", (round_number,)).fetchone()[0]
+            conn.execute("DELETE FROM rounds_history WHERE id > ?", (last_id,))
+            conn.execute("DELETE FROM city_reports WHERE round > ?", (round_number,))
+            conn.execute("DELETE FROM decision_log")
+        file_cache.forget(self._cache_dir, CITY_REPORTS_CACHE_KIND)
+
+    def load_city_reports(self, round_number: int):
+        """读取某回合的城市报表快照，不存在时返回 None。"""
+        reports = file_cache.recall(self._cache_dir, (CITY_REPORTS_CACHE_KIND, round_number))
+        if reports is None:
+            row = self._connect().execute("SELECT data FROM city_reports WHERE round = ?", (round_number,)).fetchone()
+            if row is not None:
+                reports = json.loads(row[0])
+                file_cache.remember(self._cache_dir, (CITY_REPORTS_CACHE_KIND, round_number), reports, len(row[0]))
+        return reports
+
+    def iter_city_reports(self):
+        for row in self._connect().execute("SELECT data FROM city_reports ORDER BY round"):
+            yield json.loads(row[0])
+
+    def _insert_city_reports(self, conn, reports: dict) -> int:
+        """写入一回合的城市报表，返回序列化后的长度。"""
+        data = self._dumps(reports)
+        conn.execute("INSERT OR REPLACE INTO city_reports (round, data) VALUES (?, ?)", (reports['round'], data))
+        return len(data)
+
+    def save_city_reports(self, reports: dict):
+        with self._connect() as conn:
+            size = self._insert_city_reports(conn, reports)
+        file_cache.remember(self._cache_dir, (CITY_REPORTS_CACHE_KIND, reports['round']), reports, size)
+
+    def commit_round(self, players: list[Player], markets: list[Market], round_data: dict | None,
+                     city_reports: dict = None, decision_events: int = 0):
+        """
+        推进回合后在同一个事务内保存玩家、市场、回合历史和城市报表快照（round_data 为 None 时不写历史），
+        并从决策日志中删除已结算的前 decision_events 条事件。
+        事务内的每一步分别计时（commit.save_players / save_markets / append_history / city_reports /
+        decision_log），事务提交本身只计入外层的 commit 阶段。
+        """
+        with self._connect() as conn:
+            with instrumentation.stage("commit.save_players"):
+                self._replace_players(conn, players)
+            with instrumentation.stage("commit.save_markets"):
+                self._replace_markets(conn, markets)
+            if round_data is not None:
+                with instrumentation.stage("commit.append_history"):
+                    self._insert_round(conn, round_data)
+            if city_reports is not None:
+                with instrumentation.stage("commit.city_reports"):
+                    size = self._insert_city_reports(conn, city_reports)
+            with instrumentation.stage("commit.decision_log"):
+                self._compact_decision_log(conn, decision_events)
+        if city_reports is not None:
+            file_cache.remember(self._cache_dir, (CITY_REPORTS_CACHE_KIND, city_reports['round']), city_reports, size)
+
+
+def copy_storage(source, target):
+    """在两个存储后端之间复制全部数据（用于 JSON 与 SQLite 之间的导入/导出）。"""
+    target.save_players_data(source.load_players_data())
+    target.save_markets_data(source.load_markets_data())
+    settings = source.load_game_settings()
+    if settings is not None:
+        target.save_game_settings(settings)
+    target.clear_round_history()
+    for round_data in source.iter_round_history():
+        target.save_round_history(round_data)
+    for reports in source.iter_city_reports():
+        target.save_city_reports(reports)
+    target.clear_decision_log()
+    for event in source.load_decision_log():
+        target.append_decision(event)
+
+
+def game_data_dir(data_dir: str, game_id: str = None) -> str:
+    """返回游戏 game_id 的数据目录；游戏编号只允许字母、数字、下划线和连字符。"""
+    if not game_id or game_id == DEFAULT_GAME_ID:
+        return data_dir
+    if not _GAME_ID_PATTERN.match(game_id):
+        raise ValueError(f"无效的游戏编号: {game_id}")
+    return os.path.join(data_dir, GAMES_DIR_NAME, game_id)
+
+
+def list_games(data_dir: str) -> list[str]:
+    """列出 data_dir 下已有的游戏编号（默认游戏排在最前）。"""
+    games_dir = os.path.join(data_dir, GAMES_DIR_NAME)
+    games = []
+    if os.path.isdir(games_dir):
+        games = sorted(name for name in os.listdir(games_dir)
+                       if _GAME_ID_PATTERN.match(name) and os.path.isdir(os.path.join(games_dir, name)))
+    return [DEFAULT_GAME_ID] + [g for g in games if g != DEFAULT_GAME_ID]
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+def get_storage(data_dir: str, backend: str = None, game_id: str = None):
+    """
+    返回 data_dir 下游戏 game_id 对应的存储后端（进程内共享同一个实例）。
+    backend 为空时读取环境变量 BOYI_STORAGE_BACKEND，默认使用 JSON 文件。
+    game_id 为空时使用默认游戏。
+    """
+    backend = backend or os.environ.get(STORAGE_BACKEND_ENV, "json")
+    data_dir = game_data_dir(data_dir, game_id)
+    key = (backend, os.path.abspath(data_dir))
+    with _storages_lock:
+        if key not in _storages:
+            if backend == "json":
+                _storages[key] = JsonStorage(data_dir)
+            elif backend == "sqlite":
+                _storages[key] = SqliteStorage(os.path.join(data_dir, SQLITE_DB_NAME))
+            else:
+                raise ValueError(f"未知的存储后端: {backend}")
+        return _storages[key]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="在 JSON 文件与 SQLite 数据库之间导入/导出游戏数据")
+    parser.add_argument("action", choices=["import", "export"], help="import: JSON -> SQLite；export: SQLite -> JSON")
+    parser.add_argument("data_dir", help="数据目录（包含 JSON 文件和 game.db）")
+    parser.add_argument("--game", default=DEFAULT_GAME_ID, help="游戏编号，默认为数据目录下的默认游戏")
+    args = parser.parse_args()
+
+    json_storage = get_storage(args.data_dir, "json", args.game)
+    sqlite_storage = get_storage(args.data_dir, "sqlite", args.game)
+    if args.action == "import":
+        copy_storage(json_storage, sqlite_storage)
+    else:
+        copy_storage(sqlite_storage, json_storage)
+    print(f"{args.action} 完成: {args.data_dir}")
@@ -0,0 +1,191 @@
+# game_logic/sweep.py
+"""
+GameSettings / Market 参数的蒙特卡洛扫描：对每组参数组合模拟多局游戏，
+在进程池中并行运行，汇总破产率、利润离散度和排名稳定性。
+
+用法示例:
+    python -m game_logic.sweep --grid engineer_efficiency=30,40,50 --grid city_store_cost=5000,10000 \\
+        --dist loan_interest_rate=uniform:0.02:0.10 --games 200 --players 50 --cities 5 --output sweep.csv
+
+--grid 的取值构成参数组合（笛卡尔积）；--dist 的取值在每局游戏中独立抽样，支持
+uniform:低:高、normal:均值:标准差、choice:值1:值2:...
+Market 参数（如 total_market_size）作用于所有城市。
+"""
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from game_logic.models import GAME_SETTINGS_FIELDS, MARKET_FIELDS
+from game_logic.simulate import generate_game, run_game
+
+SETTINGS_PARAMS = {f.name for f in GAME_SETTINGS_FIELDS}
+MARKET_PARAMS = {f.name for f in MARKET_FIELDS} - {"name", "current_round"}
+
+
+def parse_value(text: str):
+    """把命令行中的参数值解析为 int 或 float。"""
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parse_grid(items: list[str]) -> dict:
+    """解析 --grid 名称=值1,值2,..."""
+    grid = {}
+    for item in items or []:
+        name, _, values = item.partition("=")
+        _check_param(name)
+        grid[name] = [parse_value(v) for v in values.split(",")]
+    return grid
+
+
+def parse_dists(items: list[str]) -> dict:
+    """解析 --dist 名称=分布:参数..."""
+    dists = {}
+    for item in items or []:
+        name, _, spec = item.partition("=")
+        _check_param(name)
+        kind, *args = spec.split(":")
+        if kind not in ("uniform", "normal", "choice"):
+            raise ValueError(f"不支持的分布: {kind}")
+        dists[name] = (kind, [parse_value(a) for a in args])
+    return dists
+
+
+def _check_param(name: str):
+    if name not in SETTINGS_PARAMS and name not in MARKET_PARAMS:
+        raise ValueError(f"未知的参数: {name}")
+
+
+def sample(dist: tuple, rng: np.random.Generator):
+    kind, args = dist
+    if kind == "uniform":
+        return float(rng.uniform(args[0], args[1]))
+    if kind == "normal":
+        return float(rng.normal(args[0], args[1]))
+    return args[int(rng.integers(len(args)))]
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    """两组取值的 Spearman 秩相关系数；任一组全部相同时返回 nan。"""
+    if len(a) < 2:
+        return float("nan")
+    rank_a = np.argsort(np.argsort(a, kind="stable"), kind="stable")
+    rank_b = np.argsort(np.argsort(b, kind="stable"), kind="stable")
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+
+def simulate_one(task: tuple) -> dict:
+    """
+    运行一局模拟并返回结果指标。task 中的 seed 来自 SeedSequence.spawn，
+    每局游戏拥有独立的随机数流，结果与运行在哪个进程、以什么顺序执行无关。
+    """
+    config_id, grid_values, dists, seed, num_players, num_cities, rounds = task
+    rng = np.random.default_rng(seed)
+    params = dict(grid_values)
+    for name, dist in dists.items():
+        params[name] = sample(dist, rng)
+
+    game_seed, strategy_seed = (int(x) for x in rng.integers(0, 2**32, size=2))
+    players, markets, settings = generate_game(num_players, num_cities, seed=game_seed)
+    for name, value in params.items():
+        if name in SETTINGS_PARAMS:
+            setattr(settings, name, value)
+        else:
+            for m in markets:
+                setattr(m, name, value)
+    if "initial_player_capital" in params:
+        for p in players:
+            p.capital = p.net_asset = settings.initial_player_capital
+
+    capitals = []
+    def record(round_number, players, markets, elapsed):
+        capitals.append(np.fromiter((p.capital for p in players), dtype=float, count=len(players)))
+
+    players, markets, _ = run_game(players, markets, settings, strategy="random", rounds=rounds, seed=strategy_seed,
+                                   on_round=record, record_history=False)
+
+    net_asset = np.fromiter((p.net_asset for p in players), dtype=float, count=len(players))
+    profit = net_asset - settings.initial_player_capital
+    stability = [_spearman(a, b) for a, b in zip(capitals, capitals[1:])]
+    return {
+        "config_id": config_id,
+        **params,
+        "bankruptcy_rate": float((net_asset < 0).mean()) if len(net_asset) else 0.0,
+        "mean_profit": float(profit.mean()) if len(profit) else 0.0,
+        "profit_std": float(profit.std()) if len(profit) else 0.0,
+        "rank_stability": float(np.nanmean(stability)) if stability and not np.all(np.isnan(stability)) else float("nan"),
+        "final_vs_first_rank": _spearman(capitals[0], capitals[-1]) if capitals else float("nan"),
+    }
+
+
+def build_tasks(grid: dict, dists: dict, games: int, seed: int, num_players: int, num_cities: int, rounds: int) -> list:
+    """为每个参数组合生成 games 局任务，每局一个独立的子随机种子。"""
+    names = list(grid)
+    combinations = list(itertools.product(*(grid[n] for n in names))) or [()]
+    children = np.random.SeedSequence(seed).spawn(len(combinations) * games)
+    tasks = []
+    for config_id, values in enumerate(combinations):
+        for g in range(games):
+            child = children[config_id * games + g]
+            tasks.append((config_id, dict(zip(names, values)), dists, child, num_players, num_cities, rounds))
+    return tasks
+
+
+def run_sweep(grid: dict, dists: dict = None, games: int = 100, seed: int = 0, num_players: int = 50,
+              num_cities: int = 5, rounds: int = None, workers: int = None) -> tuple:
+    """
+    运行参数扫描，返回 (每局结果 DataFrame, 每个参数组合的汇总 DataFrame)。
+    workers 为 1 时在当前进程中顺序执行（便于调试），否则使用进程池。
+    """
+    tasks = build_tasks(grid, dists or {}, games, seed, num_players, num_cities, rounds)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        rows = [simulate_one(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            rows = list(pool.map(simulate_one, tasks, chunksize=chunksize))
+
+    runs = pd.DataFrame(rows)
+    group_by = ["config_id"] + list(grid)
+    metrics = ["bankruptcy_rate", "mean_profit", "profit_std", "rank_stability", "final_vs_first_rank"]
+    summary = runs.groupby(group_by)[metrics].agg(["mean", "std"])
+    summary.columns = [f"{metric}_{stat}" for metric, stat in summary.columns]
+    summary["games"] = runs.groupby(group_by).size()
+    return runs, summary.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GameSettings / Market 参数的蒙特卡洛扫描")
+    parser.add_argument("--grid", action="append", help="参数网格，例如 engineer_efficiency=30,40,50（可重复）")
+    parser.add_argument("--dist", action="append", help="参数分布，例如 loan_interest_rate=uniform:0.02:0.1（可重复）")
+    parser.add_argument("--games", type=int, default=100, help="每个参数组合模拟的局数")
+    parser.add_argument("--players", type=int, default=50, help="每局玩家数量")
+    parser.add_argument("--cities", type=int, default=5, help="每局城市数量")
+    parser.add_argument("--rounds", type=int, help="每局回合数，默认使用 total_rounds")
+    parser.add_argument("--seed", type=int, default=0, help="根随机种子")
+    parser.add_argument("--workers", type=int, help="进程数，默认等于 CPU 核数")
+    parser.add_argument("--output", help="汇总表 CSV 输出路径")
+    parser.add_argument("--runs-output", help="每局结果 CSV 输出路径")
+    args = parser.parse_args(argv)
+
+    runs, summary = run_sweep(parse_grid(args.grid), parse_dists(args.dist), games=args.games, seed=args.seed,
+                              num_players=args.players, num_cities=args.cities, rounds=args.rounds,
+                              workers=args.workers)
+    if args.runs_output:
+        runs.to_csv(args.runs_output, index=False)
+    if args.output:
+        summary.to_csv(args.output, index=False)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# game_logic/view_cache.py
+"""
+按 (游戏编号, 数据版本, 玩家ID, 视图名) 缓存的页面视图（视图本身见 game_logic/views.py）。
+不依赖 pandas：后台推进回合的任务（game_logic/round_jobs.py）提交后清除视图时不必导入它。
+"""
+
+import threading
+from collections import OrderedDict
+
+MAX_CACHED_VIEWS = 4096 # 每位在线玩家一项，排名表每页一项
+
+_views = OrderedDict() # 按最近使用排序，多局游戏共享
+_views_lock = threading.Lock()
+
+def get_view(key: tuple, builder):
+    """
+    返回 key 对应的视图，不存在时调用 builder() 构建并缓存。
+    key 为 (游戏编号, 数据版本, 玩家ID, 视图名)，与玩家无关的视图（排名表）玩家ID 取 None。
+    builder 返回 None（例如玩家不存在）时不缓存。
+    """
+    with _views_lock:
+        view = _views.get(key)
+        if view is not None:
+            _views.move_to_end(key)
+            return view
+    # 构建时要读取存储，不持有锁；并发构建同一个视图时结果相同，后写入的覆盖先写入的
+    view = builder()
+    if view is None:
+        return None
+    with _views_lock:
+        _views[key] = view
+        while len(_views) > MAX_CACHED_VIEWS:
+            _views.popitem(last=False)
+    return view
+
+def invalidate_views(game_id: str = None, player_id: str = None):
+    """
+    清除视图缓存。不给参数时全部清除；只给 game_id 时清除该游戏的所有视图（回合提交、回溯、重置后）；
+    同时给 player_id 时只清除该玩家的视图（保存决策、购买报表后）。
+    """
+    with _views_lock:
+        if game_id is None:
+            _views.clear()
+            return
+        for key in [k for k in _views if k[0] == game_id and (player_id is None or k[2] == player_id)]:
+            del _views[key]
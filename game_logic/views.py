@@ -0,0 +1,170 @@
+# game_logic/views.py
+"""
+页面视图模型的缓存：玩家页面的各部分数据和管理员端的玩家总览（PlayerOverview）。
+
+Streamlit 每次交互都会从头运行页面脚本。玩家页面上的侧边栏、运营报表、市场信息和排名表
+只在推进回合（以及玩家自己提交决策、购买报表）时变化，这里把它们整理成可以直接展示的
+文本和表格行，按 (游戏编号, 数据版本, 玩家ID, 视图名) 缓存。同一数据版本内重复运行页面时
+不重新加载玩家数据，也不重新排名和格式化。
+
+数据版本取存储的 data_version()，玩家、市场或设置的每次写入（包括其他进程的写入）都会改变它，
+旧版本的视图不会再被命中，随 LRU 淘汰。同一进程内的回合提交、回溯、重置后仍调用 invalidate_views()
+尽早释放内存；尚未结算的决策不计入数据版本，玩家保存决策或购买报表后清除该玩家的视图。
+"""
+
+import numpy as np
+import pandas as pd
+from game_logic.models import Player, Market, GameSettings
+from game_logic.leaderboard import Leaderboard
+from game_logic.view_cache import get_view, invalidate_views # 缓存本身不依赖 pandas，推进回合的任务直接从 view_cache 导入
+
+# 决策调整报告中的决策名（见 calculations.DECISIONS）
+DECISION_LABELS = {
+    "loan": "申请贷款",
+    "repay": "偿还贷款",
+    "price": "产品定价",
+    "plan": "生产数量",
+    "new_stores": "新增店铺数量",
+    "advertising": "广告投入",
+    "performance": "性能投资",
+    "welfare": "福利投资",
+}
+
+
+class PlayerView:
+    """
+    某位玩家在某一数据版本下的页面数据。
+    player 是构建时读取的玩家对象，用作决策表单的初始值；adjustments 是上一回合被调整的决策的表格行；
+    其余字段都是格式化好的 (标签, 数值)。
+    """
+    __slots__ = ('player', 'sidebar', 'report', 'adjustments', 'markets', 'surplus', 'rank', 'ranking_pages')
+
+    def __init__(self, player: Player, markets: list[Market], settings: GameSettings,
+                 leaderboard: Leaderboard, page_size: int):
+        current_round = markets[0].current_round
+        self.player = player
+        self.sidebar = [
+            ("当前资金", f"¥{player.capital:,.2f}"),
+            ("净资产", f"¥{player.net_asset:,.2f}"),
+            ("当前回合", current_round),
+            ("剩余回合", settings.total_rounds - current_round),
+        ]
+        self.report = [
+            ("上一回合收入", f"¥{player.last_round_revenue:,.2f}"),
+            ("上一回合成本", f"¥{player.last_round_costs:,.2f}"),
+            ("上一回合利润", f"¥{player.last_round_profit:,.2f}"),
+            ("您的总市场份额", f"{player.market_share:.2%}"),
+        ]
+        self.adjustments = [
+            {
+                "决策": DECISION_LABELS.get(name, name),
+                "提交值": f"{item['requested']:,.2f}",
+                "执行值": f"{item['actual']:,.2f}",
+                "原因": item["reason"],
+            }
+            for name, item in player.decision_adjustments.items()
+        ]
+        self.markets = [
+            (m.name, [
+                (f"{m.name} - 总需求", m.total_market_size),
+                (f"{m.name} - 您在该市场的CPI", f"{player.cpi_per_city.get(m.name, 0):.2%}"),
+                (f"{m.name} - 实际销售量", f"{player.actual_sales_per_city.get(m.name, 0)} 单位"),
+            ])
+            for m in markets
+        ]
+        self.surplus = f"{player.surplus_goods} 单位"
+        self.rank = f"{leaderboard.rank_of(player.player_id)} / {len(leaderboard)}"
+        self.ranking_pages = leaderboard.page_count(page_size)
+
+
+def ranking_rows(leaderboard: Leaderboard, page: int, page_size: int) -> list[dict]:
+    """排名表第 page 页的表格行。"""
+    return [
+        {
+            "排名": rank,
+            "公司名称": p.company_name,
+            "当前资金": f"¥{p.capital:,.2f}",
+            "净资产": f"¥{p.net_asset:,.2f}",
+            "上一回合利润": f"¥{p.last_round_profit:,.2f}",
+            "总市场份额": f"{p.market_share:.2%}",
+        }
+        for rank, p in leaderboard.page(page, page_size)
+    ]
+
+
+class PlayerOverview:
+    """
+    管理员端的玩家总览。
+
+    每个数据版本只构建一次数值 DataFrame（金额和份额保持为数值），排序、筛选和分页都在
+    DataFrame 上完成，只有当前页的行会被格式化成展示用的字符串。玩家数量很多时，
+    每次页面重新运行的开销只与页大小有关。
+    """
+    CURRENCY_COLUMNS = ("当前资金", "净资产", "贷款总额", "上一回合利润")
+    PERCENT_COLUMNS = ("总市场份额",)
+    SORT_COLUMNS = ("排名", "公司名称", "ID") + CURRENCY_COLUMNS + PERCENT_COLUMNS
+
+    def __init__(self, leaderboard: Leaderboard):
+        players = leaderboard.players
+        n = len(players)
+
+        def column(attr, dtype=float):
+            return np.fromiter((getattr(p, attr) for p in players), dtype=dtype, count=n)
+
+        ranks = np.empty(n, dtype=np.int64)
+        ranks[leaderboard.order("capital")] = np.arange(1, n + 1)
+        self.frame = pd.DataFrame({
+            "排名": ranks,
+            "公司名称": [p.company_name for p in players],
+            "ID": [p.player_id for p in players],
+            "当前资金": column("capital"),
+            "净资产": column("net_asset"),
+            "贷款总额": column("debt"),
+            "上一回合利润": column("last_round_profit"),
+            "总市场份额": column("market_share"),
+        })
+        self._search_text = (self.frame["公司名称"] + "\n" + self.frame["ID"]).str.lower()
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _order(self, sort_by: str, ascending: bool) -> np.ndarray:
+        """按列排序后的行号，每种排序只计算一次（同值保持排名顺序）。"""
+        key = (sort_by, ascending)
+        order = self._orders.get(key)
+        if order is None:
+            by_rank = np.argsort(self.frame["排名"].to_numpy(), kind="stable")
+            values = self.frame[sort_by].to_numpy()[by_rank]
+            if ascending:
+                order = by_rank[np.argsort(values, kind="stable")]
+            else:
+                # 倒序数组上稳定排序再整体反转：降序，且同值仍按排名顺序
+                order = by_rank[len(values) - 1 - np.argsort(values[::-1], kind="stable")][::-1]
+            self._orders[key] = order
+        return order
+
+    def query(self, search: str = "", sort_by: str = "排名", ascending: bool = True) -> np.ndarray:
+        """筛选（公司名称或 ID 包含 search，不区分大小写）并排序，返回行号。"""
+        if sort_by not in self.SORT_COLUMNS:
+            raise ValueError(f"未知的排序列: {sort_by}")
+        order = self._order(sort_by, ascending)
+        search = search.strip().lower()
+        if search:
+            matches = self._search_text.str.contains(search, regex=False).to_numpy()
+            order = order[matches[order]]
+        return order
+
+    def page(self, rows: np.ndarray, page: int, page_size: int) -> pd.DataFrame:
+        """格式化 rows（query 的结果）中第 page 页（从 1 开始）的行。"""
+        start = max(0, (page - 1) * page_size)
+        visible = self.frame.iloc[rows[start:start + page_size]].copy()
+        for name in self.CURRENCY_COLUMNS:
+            visible[name] = [f"¥{v:,.2f}" for v in visible[name]]
+        for name in self.PERCENT_COLUMNS:
+            visible[name] = [f"{v:.2%}" for v in visible[name]]
+        return visible
+
+    @staticmethod
+    def page_count(rows: np.ndarray, page_size: int) -> int:
+        return max(1, -(-len(rows) // page_size))
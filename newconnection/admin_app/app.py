@@ -1,90 +1,94 @@
 # admin_app/app.py (修改后，将大部分代码封装在函数中)
 
 import streamlit as st
-import json
+import io
 import os
+import time
 from game_logic.models import Player, Market, GameSettings
-from game_logic.calculations import calculate_round_results, get_ranked_players
+from game_logic.leaderboard import Leaderboard, get_leaderboard, invalidate_leaderboards
+from game_logic.views import PlayerOverview, get_view, invalidate_views
+from game_logic.provisioning import provision_players, sequential_roster, read_roster_csv
+from game_logic.storage import get_storage, DEFAULT_GAME_ID, STORAGE_ERRORS
+from game_logic.round_jobs import submit_round, get_job, active_job, JOB_DONE, JOB_FAILED
+from game_logic import instrumentation
 import pandas as pd
 from datetime import datetime
 
-# --- 数据文件路径 ---
+# --- 数据存储后端（JSON 文件或 SQLite，见 game_logic/storage.py）---
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-PLAYERS_FILE = os.path.join(DATA_DIR, 'players.json')
-MARKETS_FILE = os.path.join(DATA_DIR, 'market.json')
-GAME_SETTINGS_FILE = os.path.join(DATA_DIR, 'game_settings.json')
-ROUNDS_HISTORY_FILE = os.path.join(DATA_DIR, 'rounds_history.json')
+RECENT_TIMINGS_SHOWN = 10 # 总览页展示最近多少次推进回合的分阶段耗时
+ROUND_JOB_POLL_SECONDS = 1.0 # 后台推进回合时页面刷新进度的间隔
+OVERVIEW_PAGE_SIZE = 50 # 玩家总览每页显示的玩家数
+
+# --- 数据加载与保存辅助函数 ---
+def current_game_id() -> str:
+    """当前会话所在的游戏编号（登录时选择），未选择时为默认游戏。"""
+    return st.session_state.get('game_id', DEFAULT_GAME_ID)
+
+def current_storage():
+    """当前会话所在游戏的存储后端；每局游戏的数据和缓存互相独立。"""
+    return get_storage(DATA_DIR, game_id=current_game_id())
 
-# --- 数据加载与保存辅助函数 (保持不变) ---
 def load_players_data():
-    # ... (与之前相同)
-    if not os.path.exists(PLAYERS_FILE):
-        return []
+    """加载玩家数据。"""
     try:
-        with open(PLAYERS_FILE, 'r', encoding='utf-8') as f:
-            players_data = json.load(f)
-            return [Player.from_dict(p) for p in players_data]
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        return current_storage().load_players_data()
+    except STORAGE_ERRORS as e:
         st.error(f"加载玩家数据出错: {e}")
         return []
 
+def player_count() -> int:
+    """当前游戏的玩家人数，不复制玩家对象（每次页面重新运行都会调用）。读取出错时返回 0。"""
+    try:
+        return current_storage().player_count()
+    except STORAGE_ERRORS as e:
+        st.error(f"加载玩家数据出错: {e}")
+        return 0
+
+def data_version():
+    """当前游戏的数据版本（见 storage.data_version），玩家总览和排行榜按它缓存。读取出错时返回 None。"""
+    try:
+        return current_storage().data_version()
+    except STORAGE_ERRORS as e:
+        st.error(f"加载游戏数据出错: {e}")
+        return None
+
 def save_players_data(players: list[Player]):
-    # ... (与之前相同)
-    with open(PLAYERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([p.to_dict() for p in players], f, indent=4, ensure_ascii=False)
+    """保存玩家数据。管理员保存玩家时排名可能变化，同时清空排行榜和玩家页面视图缓存。"""
+    current_storage().save_players_data(players)
+    invalidate_leaderboards()
+    invalidate_views(current_game_id())
 
 def load_markets_data():
-    # ... (与之前相同)
-    if not os.path.exists(MARKETS_FILE):
-        return []
+    """加载市场数据。"""
     try:
-        with open(MARKETS_FILE, 'r', encoding='utf-8') as f:
-            markets_data = json.load(f)
-            return [Market.from_dict(m) for m in markets_data]
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        return current_storage().load_markets_data()
+    except STORAGE_ERRORS as e:
         st.error(f"加载市场数据出错: {e}")
         return []
 
 def save_markets_data(markets: list[Market]):
-    # ... (与之前相同)
-    with open(MARKETS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([m.to_dict() for m in markets], f, indent=4, ensure_ascii=False)
+    """保存市场数据，并清除玩家页面视图缓存（视图中包含市场信息）。"""
+    current_storage().save_markets_data(markets)
+    invalidate_views(current_game_id())
 
 def load_game_settings():
-    # ... (与之前相同)
-    if not os.path.exists(GAME_SETTINGS_FILE):
-        default_settings = GameSettings()
-        save_game_settings(default_settings)
-        return default_settings
+    """加载游戏设置。"""
     try:
-        with open(GAME_SETTINGS_FILE, 'r', encoding='utf-8') as f:
-            settings_data = json.load(f)
-            return GameSettings.from_dict(settings_data)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        settings = current_storage().load_game_settings()
+    except STORAGE_ERRORS as e:
         st.error(f"加载游戏设置出错: {e}")
-        default_settings = GameSettings()
-        save_game_settings(default_settings)
-        return default_settings
+        settings = None
+    if settings is None:
+        # 如果尚未保存或加载出错，则创建默认设置，避免程序崩溃
+        settings = GameSettings()
+        save_game_settings(settings)
+    return settings
 
 def save_game_settings(settings: GameSettings):
-    # ... (与之前相同)
-    with open(GAME_SETTINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(settings.to_dict(), f, indent=4, ensure_ascii=False)
-
-def save_round_history(round_data: dict):
-    # ... (与之前相同)
-    history = []
-    if os.path.exists(ROUNDS_HISTORY_FILE):
-        try:
-            with open(ROUNDS_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-        except json.JSONDecodeError:
-            st.warning("警告：历史数据文件损坏，将重新创建。")
-            history = []
-    
-    history.append(round_data)
-    with open(ROUNDS_HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history, f, indent=4, ensure_ascii=False)
+    """保存游戏设置，并清除玩家页面视图缓存（视图中包含剩余回合）。"""
+    current_storage().save_game_settings(settings)
+    invalidate_views(current_game_id())
 
 
 # --- 核心管理员应用逻辑封装在函数中 ---
@@ -95,16 +99,16 @@ def admin_app_main():
     st.set_page_config(layout="wide", page_title="商业模拟运营游戏 - 管理员端") # Streamlit 1.x 可以在函数内设置
     st.title("商业模拟运营游戏 - 管理员端")
 
-    # 重新加载数据以确保最新状态
-    current_players = load_players_data()
+    # 重新加载数据以确保最新状态（玩家列表只在游戏准备页加载，总览使用按数据版本缓存的视图）
     current_markets = load_markets_data()
     current_game_settings = load_game_settings()
 
-    if not current_players or not current_markets or not current_game_settings:
+    if not player_count() or not current_markets or not current_game_settings:
         st.warning("数据加载失败或文件不存在，请检查您的 'data' 文件夹并确保数据文件已初始化。")
         # st.stop() # 不再在这里停止，因为主应用会处理初始状态
 
     st.sidebar.subheader("游戏控制")
+    st.sidebar.metric("当前游戏", current_game_id())
     st.sidebar.metric("当前游戏回合", current_markets[0].current_round if current_markets else "未设置")
     st.sidebar.metric("总回合数", current_game_settings.total_rounds)
 
@@ -114,25 +118,35 @@ def admin_app_main():
 
     if admin_page_selection == "游戏准备":
         st.header("🎮 游戏开始前准备")
+        current_players = load_players_data()
 
         # (1) 设置玩家数量和生成密码
         st.subheader("1. 玩家与密码设置")
         num_players_input = st.number_input("设置玩家数量:", min_value=1, value=len(current_players), step=1)
         
         if st.button("生成/更新玩家账户"):
-            new_players_list = []
-            for i in range(num_players_input):
-                player_id = f"player{i+1}"
-                existing_player = next((p for p in current_players if p.player_id == player_id), None)
-                if existing_player:
-                    new_players_list.append(existing_player)
-                else:
-                    new_players_list.append(Player(player_id=player_id, company_name=f"公司{i+1}", initial_capital=current_game_settings.initial_player_capital))
-            
+            # 按玩家ID 哈希索引合并现有玩家（保留密码），新玩家的密码批量生成
+            new_players_list, _, _ = provision_players(current_players, sequential_roster(num_players_input),
+                                                       current_game_settings.initial_player_capital, replace=True, rename=False)
             save_players_data(new_players_list)
             st.success(f"已生成/更新 {num_players_input} 位玩家账户。")
             st.experimental_rerun()
 
+        st.write("#### 从 CSV 批量导入玩家")
+        roster_file = st.file_uploader("上传名单（player_id / company_name 两列，也可以使用下载的登录信息 CSV）", type="csv")
+        if roster_file is not None and st.button("导入名单"):
+            try:
+                roster = read_roster_csv(io.TextIOWrapper(roster_file, encoding='utf-8-sig', newline=''))
+            except (ValueError, UnicodeDecodeError) as e:
+                st.error(f"名单格式错误: {e}")
+            else:
+                # 与现有玩家合并：已有玩家保留密码和游戏数据并更新公司名称，名单外的玩家保持不变
+                new_players_list, created, updated = provision_players(current_players, roster,
+                                                                       current_game_settings.initial_player_capital)
+                save_players_data(new_players_list)
+                st.success(f"已导入名单：新增 {created} 位玩家，更新 {updated} 位玩家。")
+                st.experimental_rerun()
+
         if current_players:
             st.markdown("---")
             st.write("### 玩家登录信息")
@@ -252,63 +266,121 @@ def admin_app_main():
         st.header("➡️ 推进回合")
         st.warning("请确保所有玩家已提交本回合决策，再推进下一回合！")
 
-        if st.button("推进下一回合"):
-            st.info("正在计算本回合结果...")
-            
+        # 回合在后台线程中计算（见 game_logic/round_jobs.py），页面只轮询任务进度；
+        # 刷新页面后通过 active_job 找回正在运行的任务
+        round_job_message = st.session_state.pop('round_job_message', None)
+        if round_job_message:
+            status, text = round_job_message
+            (st.success if status == JOB_DONE else st.error)(text)
+
+        round_job = active_job(current_game_id())
+        if round_job is None and 'round_job_id' in st.session_state:
+            round_job = get_job(st.session_state.pop('round_job_id'))
+            if round_job is not None and round_job.game_id != current_game_id(): # 会话切换了游戏
+                round_job = None
+
+        if st.button("推进下一回合", disabled=round_job is not None and round_job.is_active):
+            # 为了简化，我们假设只有一个主市场来跟踪回合数
             main_market = current_markets[0] if current_markets else None
             if not main_market:
                 st.error("无法推进回合：未设置任何市场数据。")
-                # st.stop() # 不在这里停止
-                return # 退出函数，避免后续错误
-
-            # Placeholder for actual calculation logic from game_logic/calculations.py
-            # This needs to be implemented fully in Stage 2
-            # For now, just advance round and save
-            
-            # TODO: Integrate the full Stage 2 calculation logic here!
-            # Example: updated_players, updated_markets = calculate_round_results(current_players, current_markets, current_game_settings)
-            # For now, just a dummy increment:
-            main_market.current_round += 1 # Only update the main market's round
-            
-            save_players_data(current_players) # Save player decisions (they're already updated by players)
-            save_markets_data(current_markets) # Save updated market data (including round increment)
-
-            # Record round history (needs to be more detailed after calculations)
-            round_history_data = {
-                "round": main_market.current_round,
-                "market_params": [m.to_dict() for m in current_markets],
-                "player_states": [p.to_dict() for p in current_players]
-            }
-            save_round_history(round_history_data)
-
-            st.success(f"回合 {main_market.current_round} 已成功推进！")
-            st.experimental_rerun()
+                st.stop()
+            round_job = submit_round(current_storage(), current_game_id(), main_market.current_round)
+
+        if round_job is not None:
+            st.session_state['round_job_id'] = round_job.job_id
+            if round_job.is_active:
+                st.info(f"正在计算本回合结果（任务 {round_job.job_id}，阶段: {round_job.stage or '排队中'}）...")
+                st.progress(round_job.progress)
+                time.sleep(ROUND_JOB_POLL_SECONDS)
+                st.experimental_rerun()
+            else:
+                # 任务结束后重新运行一次页面，重新加载已提交的最新数据
+                if round_job.status == JOB_DONE:
+                    st.session_state['round_job_message'] = (JOB_DONE, f"回合 {round_job.result_round} 已成功推进！")
+                else:
+                    st.session_state['round_job_message'] = (JOB_FAILED, f"推进回合失败: {round_job.error}")
+                del st.session_state['round_job_id']
+                st.experimental_rerun()
 
         st.markdown("---")
         # --- 玩家总览 ---
         st.header("📋 玩家总览")
-        if current_players:
-            # get_ranked_players needs to be updated to work with new Player model attributes
-            ranked_players_for_display = get_ranked_players(current_players)
-            overview_data = []
-            for i, p in enumerate(ranked_players_for_display):
-                overview_data.append({
-                    "排名": i + 1,
+        if player_count():
+            version = data_version() # 先取版本再加载玩家，加载期间其他进程的写入只会让下次运行重建
+            # 数值表每个数据版本只构建一次；排序、筛选和分页都在服务端完成，只格式化当前页
+            if version is None:
+                overview = PlayerOverview(Leaderboard(load_players_data()))
+            else:
+                overview = get_view((current_game_id(), version, None, "overview"),
+                                    lambda: PlayerOverview(get_leaderboard(load_players_data, (current_game_id(), version))))
+            search_col, sort_col, order_col = st.columns([2, 1, 1])
+            overview_search = search_col.text_input("搜索公司名称或 ID", key="overview_search")
+            overview_sort = sort_col.selectbox("排序", PlayerOverview.SORT_COLUMNS, key="overview_sort")
+            overview_ascending = order_col.selectbox("顺序", ["升序", "降序"], key="overview_order") == "升序"
+            overview_rows = overview.query(overview_search, overview_sort, overview_ascending)
+            overview_page = st.number_input("页码", min_value=1, max_value=PlayerOverview.page_count(overview_rows, OVERVIEW_PAGE_SIZE),
+                                            value=1, step=1, key="overview_page")
+            st.caption(f"共 {len(overview_rows)} / {len(overview)} 位玩家，每页 {OVERVIEW_PAGE_SIZE} 位")
+            st.dataframe(overview.page(overview_rows, overview_page, OVERVIEW_PAGE_SIZE), use_container_width=True, hide_index=True)
+        else:
+            st.info("暂无玩家数据。请在 '游戏准备' 页面设置玩家。")
+
+        st.markdown("---")
+        # --- 回合回溯 ---
+        st.header("⏪ 回合回溯")
+        history_rounds = sorted(set(current_storage().history_rounds()))
+        if history_rounds:
+            travel_round = st.selectbox("选择回合", history_rounds, index=len(history_rounds) - 1)
+            if st.checkbox("查看该回合结束时的状态", key="view_round_state"):
+                # 通过历史索引直接定位到该回合（最多读取一个关键帧间隔的记录），不解析全部历史
+                travel_players, travel_markets = current_storage().load_state_at(travel_round)
+                st.dataframe(pd.DataFrame([{
                     "公司名称": p.company_name,
                     "ID": p.player_id,
                     "当前资金": f"¥{p.capital:,.2f}",
                     "净资产": f"¥{p.net_asset:,.2f}",
                     "贷款总额": f"¥{p.debt:,.2f}",
                     "上一回合利润": f"¥{p.last_round_profit:,.2f}",
-                    "总市场份额": f"{p.market_share:.2%}"
-                })
-            st.dataframe(pd.DataFrame(overview_data), use_container_width=True, hide_index=True)
+                    "市场份额 (总)": f"{p.market_share:.2%}",
+                } for p in travel_players]), use_container_width=True, hide_index=True)
+                st.dataframe(pd.DataFrame([{
+                    "市场名称": m.name,
+                    "市场总需求量": f"{m.total_market_size:,} 单位",
+                    "当前回合": m.current_round,
+                } for m in travel_markets]), use_container_width=True, hide_index=True)
+            restore_confirmed = st.checkbox(f"我确认要把游戏回退到第 {travel_round} 回合结束时的状态（之后各回合的历史将被删除）", key="restore_confirm_checkbox")
+            if st.button("恢复到该回合", disabled=not restore_confirmed or active_job(current_game_id()) is not None):
+                current_storage().restore_round(travel_round)
+                invalidate_leaderboards()
+                invalidate_views(current_game_id())
+                st.success(f"游戏已回退到第 {travel_round} 回合！")
+                st.experimental_rerun()
         else:
-            st.info("暂无玩家数据。请在 '游戏准备' 页面设置玩家。")
+            st.info("暂无回合历史。")
+
+        st.markdown("---")
+        # --- 推进回合耗时 ---
+        st.header("⏱️ 推进回合耗时")
+        recent_timings = instrumentation.recent_rounds(RECENT_TIMINGS_SHOWN, game_id=current_game_id()) # 只显示当前游戏的记录
+        if recent_timings:
+            timing_rows = []
+            for t in reversed(recent_timings): # 最新的在最上面
+                row = {"回合": t["label"], "开始时间": t["started_at"], "总耗时 (ms)": t["total_seconds"] * 1000}
+                row.update({f"{name} (ms)": seconds * 1000 for name, seconds in t["stages"].items()})
+                row["读取 (KB)"] = t["bytes_read"] / 1024
+                row["写入 (KB)"] = t["bytes_written"] / 1024
+                timing_rows.append(row)
+            st.dataframe(pd.DataFrame(timing_rows).round(2), use_container_width=True, hide_index=True)
+            st.download_button("导出计时数据 (JSON)", instrumentation.export_json(game_id=current_game_id()),
+                               file_name=f"round_timings_{current_game_id()}.json", mime="application/json")
+        else:
+            st.info("本次运行中尚未推进回合。")
 
         st.markdown("---")
         st.header("⚠️ 危险操作")
-        if st.button("重置游戏数据 (请谨慎操作！)", help="这将清空所有玩家数据、市场数据和历史记录，并重置游戏到初始状态。"):
+        if st.button("重置游戏数据 (请谨慎操作！)", help="这将清空所有玩家数据、市场数据和历史记录，并重置游戏到初始状态。",
+                     disabled=active_job(current_game_id()) is not None): # 结算期间重置会被回合提交覆盖
             if st.checkbox("我确认要重置游戏数据", key="reset_confirm_checkbox"):
                 initial_players_data_raw = [{"player_id": f"player{i+1}", "company_name": f"公司{i+1}"} for i in range(2)]
                 initial_players_objects = [Player(p['player_id'], p['company_name'], initial_capital=current_game_settings.initial_player_capital) for p in initial_players_data_raw]
@@ -323,8 +395,8 @@ def admin_app_main():
                 save_markets_data(initial_markets_objects)
                 save_game_settings(GameSettings())
 
-                if os.path.exists(ROUNDS_HISTORY_FILE):
-                    os.remove(ROUNDS_HISTORY_FILE)
+                current_storage().clear_round_history()
+                current_storage().clear_decision_log()
                 
                 st.success("游戏数据已重置！请刷新页面。")
                 st.experimental_rerun()
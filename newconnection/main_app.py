@@ -1,11 +1,9 @@
 # main_app.py
 import streamlit as st
-import json
-import os
-from game_logic.models import Player # 需要Player类来验证玩家
 # 导入封装好的玩家和管理员应用主函数
-from player_app.app import player_app_main, load_players_data, load_markets_data, load_game_settings
-from admin_app.app import admin_app_main, load_players_data as admin_load_players_data # 避免名称冲突
+from player_app.app import player_app_main, load_player, current_game_id, current_storage, DATA_DIR
+from admin_app.app import admin_app_main
+from game_logic.storage import game_data_dir, list_games
 
 # 定义管理员的硬编码密码 (在实际应用中，这应该更安全地存储)
 ADMIN_PASSWORD = "adminpass" # 您可以设置一个您自己的管理员密码
@@ -25,9 +23,14 @@ def login_page():
     st.title("欢迎来到商业模拟运营游戏")
     st.subheader("请登录以继续")
 
-    players = load_players_data() # 加载玩家数据用于验证
+    # 一个进程可同时承载多局游戏（例如多个班级），登录时先选择游戏编号。
+    # 登录前只能选择数据目录中已有的游戏，不会为任意输入的编号创建存储；新游戏由管理员登录时创建
+    existing_games = list_games(DATA_DIR)
+    game_id = st.selectbox("游戏编号:", existing_games, index=existing_games.index(current_game_id()) if current_game_id() in existing_games else 0,
+                           help="由管理员提供")
+    st.session_state['game_id'] = game_id
 
-    if not players:
+    if current_storage().player_count() == 0:
         st.warning("系统尚未初始化玩家数据。请联系管理员进行设置。")
         st.info("如果您是管理员，可以通过输入管理员密码直接进入管理员界面。")
         st.markdown("---") # 分割线
@@ -40,11 +43,9 @@ def login_page():
         login_button = st.button("玩家登录")
 
         if login_button:
-            found_player = None
-            for p in players:
-                if p.player_id == player_id and p.password == password:
-                    found_player = p
-                    break
+            found_player = load_player(player_id) # 按 ID 索引查找，不加载全部玩家
+            if found_player and found_player.password != password:
+                found_player = None
             
             if found_player:
                 st.session_state['logged_in'] = True
@@ -57,10 +58,18 @@ def login_page():
 
     elif login_type == "管理员登录":
         admin_password_input = st.text_input("管理员密码:", type="password", key="admin_pass_input")
+        new_game_id = st.text_input("新建游戏编号（可选）:", help="留空则进入上面选择的游戏；输入新的编号即可创建一局新游戏").strip()
         admin_login_button = st.button("管理员登录")
 
         if admin_login_button:
             if admin_password_input == ADMIN_PASSWORD:
+                if new_game_id:
+                    try:
+                        game_data_dir(DATA_DIR, new_game_id)
+                    except ValueError as e:
+                        st.error(f"{e}（只允许字母、数字、下划线和连字符）")
+                        return
+                    st.session_state['game_id'] = new_game_id # 验证密码之后才为新游戏创建存储
                 st.session_state['logged_in'] = True
                 st.session_state['user_type'] = 'admin'
                 st.success("管理员登录成功！")
@@ -81,22 +90,9 @@ def main():
             st.experimental_rerun() # 重新运行以显示登录页
 
         if st.session_state['user_type'] == 'player':
-            # 确保传递给玩家应用的 player 对象是最新加载的
-            # 由于 Streamlit 每次 rerun 都会从头运行脚本，
-            # 我们需要确保 player_app_main 拿到的 current_player_obj 是最新的数据
-            updated_players = load_players_data()
-            current_player_id = st.session_state['current_player_obj'].player_id
-            current_player_obj = next((p for p in updated_players if p.player_id == current_player_id), None)
-            
-            if current_player_obj:
-                player_app_main(current_player_obj)
-            else:
-                st.error("无法加载您的玩家数据，请重新登录。")
-                # 强制登出
-                st.session_state['logged_in'] = False
-                st.session_state['user_type'] = None
-                st.session_state['current_player_obj'] = None
-                st.experimental_rerun()
+            # 玩家的最新状态由 player_app_main 从按回合版本缓存的页面视图中读取，
+            # 这里不在每次 rerun 时重新加载玩家数据
+            player_app_main(st.session_state['current_player_obj'])
 
         elif st.session_state['user_type'] == 'admin':
             admin_app_main()
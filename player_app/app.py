@@ -1,70 +1,129 @@
 # player_app/app.py
 
 import streamlit as st
-import json
 import os
 from game_logic.models import Player, Market, GameSettings # 引入 GameSettings
-from game_logic.calculations import get_ranked_players # get_ranked_players 可能需要调整以适应新模型
+from game_logic.leaderboard import get_leaderboard
+from game_logic.views import PlayerView, ranking_rows, get_view, invalidate_views
+from game_logic.reports import format_city_report
+from game_logic.decisions import decision_event, purchase_event, decision_fields
+from game_logic.storage import get_storage, list_games, DEFAULT_GAME_ID, STORAGE_ERRORS
 import pandas as pd
 
-# --- 数据文件路径 ---
+# --- 数据存储后端（JSON 文件或 SQLite，见 game_logic/storage.py）---
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-PLAYERS_FILE = os.path.join(DATA_DIR, 'players.json')
-MARKETS_FILE = os.path.join(DATA_DIR, 'market.json') # 注意这里是 MARKETS_FILE
-GAME_SETTINGS_FILE = os.path.join(DATA_DIR, 'game_settings.json') # 新增游戏设置文件路径
+RANKING_PAGE_SIZE = 20 # 排名表每页显示的玩家数
+
+# --- 数据加载与保存辅助函数 ---
+def current_game_id() -> str:
+    """当前会话所在的游戏编号（登录时选择），未选择时为默认游戏。"""
+    return st.session_state.get('game_id', DEFAULT_GAME_ID)
+
+def current_storage():
+    """当前会话所在游戏的存储后端；每局游戏的数据和缓存互相独立。"""
+    return get_storage(DATA_DIR, game_id=current_game_id())
 
-# --- 数据加载辅助函数 ---
 def load_players_data():
     """加载玩家数据。"""
-    if not os.path.exists(PLAYERS_FILE):
-        return []
     try:
-        with open(PLAYERS_FILE, 'r', encoding='utf-8') as f:
-            players_data = json.load(f)
-            return [Player.from_dict(p) for p in players_data]
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        return current_storage().load_players_data()
+    except STORAGE_ERRORS as e:
         st.error(f"加载玩家数据出错: {e}")
         return []
 
-def save_players_data(players: list[Player]):
-    """保存玩家数据。"""
-    with open(PLAYERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([p.to_dict() for p in players], f, indent=4, ensure_ascii=False)
+def load_player(player_id: str):
+    """按 ID 读取单个玩家（O(1) 索引查找，不解码其他玩家）。"""
+    try:
+        return current_storage().load_player(player_id)
+    except STORAGE_ERRORS as e:
+        st.error(f"加载玩家数据出错: {e}")
+        return None
+
+def save_player_decision(player: Player, round_number: int):
+    """把玩家的决策作为一条事件追加到决策日志（不重写玩家数据），并清除该玩家的页面视图缓存。"""
+    current_storage().append_decision(decision_event(player.player_id, round_number, decision_fields(player)))
+    invalidate_views(current_game_id(), player.player_id)
+
+def save_report_purchase(player: Player, round_number: int, city: str, cost: float):
+    """
+    把购买城市报表作为一条事件追加到决策日志，推进回合时与决策一起结算，并清除该玩家的页面视图缓存。
+    不写回页面上的玩家对象：它可能已经过时（后台刚提交了新回合），也带着尚未结算的决策。
+    """
+    current_storage().append_decision(purchase_event(player.player_id, round_number, city, cost))
+    invalidate_views(current_game_id(), player.player_id)
 
 def load_markets_data():
     """加载市场数据。"""
-    if not os.path.exists(MARKETS_FILE):
-        return []
     try:
-        with open(MARKETS_FILE, 'r', encoding='utf-8') as f:
-            markets_data = json.load(f)
-            return [Market.from_dict(m) for m in markets_data]
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        return current_storage().load_markets_data()
+    except STORAGE_ERRORS as e:
         st.error(f"加载市场数据出错: {e}")
         return []
 
+def load_city_reports(round_number: int):
+    """读取某回合的城市报表快照（推进回合时已生成，不在页面上重新计算）。"""
+    try:
+        return current_storage().load_city_reports(round_number)
+    except STORAGE_ERRORS as e:
+        st.error(f"加载城市报表出错: {e}")
+        return None
+
 def load_game_settings():
     """加载游戏设置。"""
-    if not os.path.exists(GAME_SETTINGS_FILE):
-        return GameSettings() # 返回默认设置
     try:
-        with open(GAME_SETTINGS_FILE, 'r', encoding='utf-8') as f:
-            settings_data = json.load(f)
-            return GameSettings.from_dict(settings_data)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        settings = current_storage().load_game_settings()
+    except STORAGE_ERRORS as e:
         st.error(f"加载游戏设置出错: {e}")
         return GameSettings()
+    return settings if settings is not None else GameSettings() # 返回默认设置
+
+def data_version():
+    """
+    当前游戏的数据版本（见 storage.data_version）：玩家、市场或设置的任何一次写入都会改变它，
+    包括管理员端等其他进程的写入。读取出错时返回 None。
+    """
+    try:
+        return current_storage().data_version()
+    except STORAGE_ERRORS as e:
+        st.error(f"加载游戏数据出错: {e}")
+        return None
+
+def current_leaderboard(version):
+    """该数据版本的排行榜（同一版本只排序一次）；只有缓存未命中时才加载全部玩家。"""
+    return get_leaderboard(load_players_data, (current_game_id(), version))
+
+def player_view(player_id: str, markets: list[Market], game_settings: GameSettings, version):
+    """
+    该玩家在数据版本 version 下的页面视图（见 game_logic/views.py），同一版本内只构建一次，
+    之后页面重新运行时不再加载玩家数据。玩家不存在时返回 None。
+    """
+    def build():
+        player = load_player(player_id)
+        if player is None:
+            return None
+        return PlayerView(player, markets, game_settings, current_leaderboard(version), RANKING_PAGE_SIZE)
+    return get_view((current_game_id(), version, player_id, "dashboard"), build)
+
+def ranking_page_rows(version, page: int):
+    """排名表某一页的表格行，所有玩家共用同一份缓存。"""
+    return get_view((current_game_id(), version, None, ("ranking", page)),
+                    lambda: ranking_rows(current_leaderboard(version), page, RANKING_PAGE_SIZE))
+
 
 # --- Streamlit 页面配置 ---
 st.set_page_config(layout="wide", page_title="商业模拟运营游戏 - 玩家端")
 st.title("商业模拟运营游戏 - 玩家端")
 
-# --- 加载所有数据 ---
-players = load_players_data()
+# --- 选择游戏（由管理员提供游戏编号）---
+existing_games = list_games(DATA_DIR)
+st.session_state['game_id'] = st.sidebar.selectbox("选择游戏", existing_games, index=existing_games.index(current_game_id()) if current_game_id() in existing_games else 0)
+
+# --- 加载市场和设置（数据很小，有文件缓存）；玩家相关的数据从按数据版本缓存的页面视图读取 ---
+version = data_version() # 先取版本再加载：加载期间发生的写入只会让下次运行重建视图
 markets = load_markets_data() # 加载所有市场
 game_settings = load_game_settings() # 加载游戏设置
 
-if not players or not markets or not game_settings:
+if version is None or not markets or not game_settings:
     st.warning("数据加载失败或文件不存在，请检查您的 'data' 文件夹。请联系管理员初始化游戏。")
     st.stop() # 停止运行 Streamlit 应用
 
@@ -73,25 +132,23 @@ st.sidebar.subheader("玩家登录")
 player_id_input = st.sidebar.text_input("请输入您的玩家ID (例如: player1):")
 password_input = st.sidebar.text_input("请输入您的密码:", type="password")
 
-current_player = None
+view = None
 if player_id_input and password_input:
-    for p in players:
-        if p.player_id == player_id_input and p.password == password_input:
-            current_player = p
-            break
-    if current_player is None:
+    login_player = load_player(player_id_input) # 按存储中的当前密码验证，不使用缓存的视图
+    if login_player is not None and login_player.password == password_input:
+        view = player_view(player_id_input, markets, game_settings, version) # 同一数据版本内只构建一次
+    if view is None:
         st.sidebar.error("玩家ID或密码不正确。")
 else:
     st.sidebar.info("请输入您的玩家ID和密码登录。")
 
-if current_player is None:
+if view is None:
     st.stop() # 未登录则停止显示后续内容
+current_player = view.player
 
 st.sidebar.subheader(f"欢迎您，{current_player.company_name}！")
-st.sidebar.metric("当前资金", f"¥{current_player.capital:,.2f}")
-st.sidebar.metric("净资产", f"¥{current_player.net_asset:,.2f}")
-st.sidebar.metric("当前回合", markets[0].current_round if markets else "N/A") # 显示第一个市场的回合数
-st.sidebar.metric("剩余回合", game_settings.total_rounds - (markets[0].current_round if markets else 0))
+for label, value in view.sidebar:
+    st.sidebar.metric(label, value)
 
 # --- 决策界面 ---
 st.header("⚙️ 决策中心")
@@ -158,40 +215,54 @@ with st.form("decision_form"):
         
         # 实时保存决策（此处只保存玩家自己的决策，并不触发回合计算）
         # 回合计算应该由管理员端触发
-        save_players_data(players) 
+        save_player_decision(current_player, markets[0].current_round)
         st.success("您的决策已提交！请等待管理员推进下一回合。")
+        st.experimental_rerun() # 重新加载以更新显示（本次运行中的 view 已经过时）
 
 # --- 运营报表和信息 ---
 st.markdown("---")
 st.header("📊 运营报表")
 
-col1, col2, col3, col4 = st.columns(4)
-col1.metric("上一回合收入", f"¥{current_player.last_round_revenue:,.2f}")
-col2.metric("上一回合成本", f"¥{current_player.last_round_costs:,.2f}")
-col3.metric("上一回合利润", f"¥{current_player.last_round_profit:,.2f}")
-col4.metric("您的总市场份额", f"{current_player.market_share:.2%}")
+for column, (label, value) in zip(st.columns(len(view.report)), view.report):
+    column.metric(label, value)
+if view.adjustments:
+    st.warning("上一回合部分决策超出了资金、产能或允许范围，已按以下数值执行：")
+    st.dataframe(pd.DataFrame(view.adjustments), hide_index=True)
 
 st.subheader("市场信息")
-for market_obj in markets:
-    st.write(f"#### {market_obj.name}")
-    st.metric(f"{market_obj.name} - 总需求", market_obj.total_market_size)
-    st.metric(f"{market_obj.name} - 您在该市场的CPI", f"{current_player.cpi_per_city.get(market_obj.name, 0):.2%}")
-    st.metric(f"{market_obj.name} - 实际销售量", f"{current_player.actual_sales_per_city.get(market_obj.name, 0)} 单位")
+for market_name, metrics in view.markets:
+    st.write(f"#### {market_name}")
+    for label, value in metrics:
+        st.metric(label, value)
+
+st.metric("剩余未售货物", view.surplus)
 
-st.metric("剩余未售货物", f"{current_player.surplus_goods} 单位")
+st.markdown("---")
+st.header("🗂️ 城市报表")
+if markets[0].current_round == 0:
+    st.info("第一回合结算后才会生成城市报表。")
+else:
+    report_round = st.number_input("查看回合", min_value=1, max_value=markets[0].current_round, value=markets[0].current_round, step=1)
+    round_reports = load_city_reports(report_round)
+    for market_obj in markets:
+        with st.expander(f"{market_obj.name} 报表"):
+            if not current_player.bought_city_reports.get(market_obj.name):
+                st.write(f"购买后可查看该城市每回合的价格分布、供需和 CPI 分布（¥{game_settings.city_report_cost:,.2f}，购买后所有回合有效）。")
+                if st.button(f"购买 {market_obj.name} 报表", key=f"buy_report_{market_obj.name}"):
+                    if current_player.capital < game_settings.city_report_cost:
+                        st.error("资金不足，无法购买报表。")
+                    else:
+                        save_report_purchase(current_player, markets[0].current_round, market_obj.name, game_settings.city_report_cost)
+                        st.experimental_rerun()
+            elif round_reports is None or market_obj.name not in round_reports["cities"]:
+                st.info("该回合没有该城市的报表。")
+            else:
+                st.dataframe(pd.DataFrame(format_city_report(round_reports["cities"][market_obj.name])), hide_index=True, use_container_width=True)
 
 # 显示资金排名
 st.markdown("---")
 st.header("🏆 资金排名")
-ranked_players = get_ranked_players(players)
-ranked_data = []
-for i, p in enumerate(ranked_players):
-    ranked_data.append({
-        "排名": i + 1,
-        "公司名称": p.company_name,
-        "当前资金": f"¥{p.capital:,.2f}",
-        "净资产": f"¥{p.net_asset:,.2f}",
-        "上一回合利润": f"¥{p.last_round_profit:,.2f}",
-        "总市场份额": f"{p.market_share:.2%}"
-    })
+st.metric("您的资金排名", view.rank)
+ranking_page = st.number_input("排名页码", min_value=1, max_value=view.ranking_pages, value=1, step=1)
+ranked_data = ranking_page_rows(version, ranking_page)
 st.dataframe(pd.DataFrame(ranked_data), hide_index=True)
@@ -0,0 +1,6 @@
+# tests/conftest.py
+# 让直接运行 pytest（不经过 python -m pytest）时也能导入仓库根目录下的 game_logic 和 benchmarks
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
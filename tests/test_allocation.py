@@ -0,0 +1,105 @@
+# tests/test_allocation.py
+"""calculations.water_fill 与逐轮重新分配的朴素实现（benchmarks/bench_allocation.py）结果一致。"""
+
+import numpy as np
+import pytest
+from game_logic.calculations import water_fill, OUTSIDE_OPTION_WEIGHT
+from benchmarks.bench_allocation import iterative_fill, adversarial
+
+OUTSIDE_WEIGHTS = (0.0, OUTSIDE_OPTION_WEIGHT, 5.0)
+
+
+def assert_matches_iterative(market_size, weights, caps, outside_weight):
+    weights = np.asarray(weights, dtype=float)
+    caps = np.asarray(caps, dtype=float)
+    expected, _ = iterative_fill(market_size, weights, caps, outside_weight)
+    actual = water_fill(np.array([market_size], dtype=float), weights[:, None], caps[:, None], outside_weight)[:, 0]
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+    assert (actual <= caps + 1e-9).all()
+    return actual
+
+
+@pytest.mark.parametrize("outside_weight", OUTSIDE_WEIGHTS)
+def test_every_player_capped(outside_weight):
+    # 总需求远大于总库存：所有玩家都卖空
+    caps = [10.0, 20.0, 5.0, 40.0]
+    actual = assert_matches_iterative(1e6, [1.0, 3.0, 0.5, 2.0], caps, outside_weight)
+    np.testing.assert_allclose(actual, caps)
+
+
+@pytest.mark.parametrize("outside_weight", OUTSIDE_WEIGHTS)
+def test_no_player_capped(outside_weight):
+    # 库存充足：按吸引力比例分配，没有溢出
+    weights = np.array([1.0, 3.0, 0.5, 2.0])
+    actual = assert_matches_iterative(100.0, weights, [1e6] * 4, outside_weight)
+    np.testing.assert_allclose(actual, 100.0 * weights / (weights.sum() + outside_weight))
+
+
+@pytest.mark.parametrize("outside_weight", OUTSIDE_WEIGHTS)
+def test_some_players_capped(outside_weight):
+    assert_matches_iterative(300.0, [4.0, 1.0, 2.0, 2.0, 0.5], [10.0, 100.0, 30.0, 200.0, 5.0], outside_weight)
+
+
+@pytest.mark.parametrize("outside_weight", (0.0, OUTSIDE_OPTION_WEIGHT))
+def test_ties_at_cap_boundary(outside_weight):
+    # 吸引力和库存都相同的玩家，需求恰好等于卖空所需的量：同时卖空，分到的量相同
+    weights = [2.0, 2.0, 2.0, 1.0]
+    caps = [20.0, 20.0, 20.0, 1e6]
+    level = 10.0 # 前三位玩家在水位 10 时卖空
+    market_size = 3 * 20.0 + level * (1.0 + outside_weight)
+    actual = assert_matches_iterative(market_size, weights, caps, outside_weight)
+    assert actual[0] == actual[1] == actual[2]
+    np.testing.assert_allclose(actual[:3], 20.0)
+
+
+@pytest.mark.parametrize("outside_weight", OUTSIDE_WEIGHTS)
+def test_ties_just_past_cap_boundary(outside_weight):
+    weights = [1.0, 1.0, 1.0, 3.0]
+    caps = [15.0, 15.0, 15.0, 15.0]
+    assert_matches_iterative(60.0 + 1e-6, weights, caps, outside_weight)
+    assert_matches_iterative(60.0 - 1e-6, weights, caps, outside_weight)
+
+
+@pytest.mark.parametrize("outside_weight", OUTSIDE_WEIGHTS)
+def test_zero_total_demand(outside_weight):
+    actual = assert_matches_iterative(0.0, [1.0, 2.0, 3.0], [10.0, 10.0, 10.0], outside_weight)
+    assert (actual == 0).all()
+
+
+def test_players_without_attractiveness_get_nothing():
+    actual = assert_matches_iterative(50.0, [0.0, 1.0, 0.0, 2.0], [100.0, 10.0, 100.0, 100.0], OUTSIDE_OPTION_WEIGHT)
+    assert actual[0] == actual[2] == 0
+
+
+@pytest.mark.parametrize("outside_weight", OUTSIDE_WEIGHTS)
+def test_random_cases(outside_weight):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 30))
+        weights = np.where(rng.random(n) < 0.1, 0.0, rng.exponential(1.0, n))
+        # 一部分玩家的吸引力和库存取相同的值，制造同一水位的并列
+        weights[: n // 3] = weights[0]
+        caps = rng.uniform(0, 50, n)
+        caps[: n // 3] = caps[0]
+        market_size = float(rng.uniform(0, 1.5) * caps.sum())
+        assert_matches_iterative(market_size, weights, caps, outside_weight)
+
+
+def test_adversarial_case_sells_out_one_player_per_pass():
+    market_size, weights, caps = adversarial(np.random.default_rng(2), passes=15, n=200)
+    _, passes = iterative_fill(market_size, weights, caps)
+    assert passes == 16
+    actual = assert_matches_iterative(market_size, weights, caps, OUTSIDE_OPTION_WEIGHT)
+    assert np.isclose(actual, caps, rtol=1e-9).sum() == 15
+
+
+def test_columns_are_independent():
+    # 多个城市一次计算，与逐个城市计算的结果相同
+    rng = np.random.default_rng(1)
+    weights = rng.exponential(1.0, (20, 4))
+    caps = rng.uniform(0, 30, (20, 4))
+    sizes = np.array([0.0, 100.0, 400.0, 1e5])
+    combined = water_fill(sizes, weights, caps)
+    for j in range(4):
+        expected, _ = iterative_fill(sizes[j], weights[:, j], caps[:, j])
+        np.testing.assert_allclose(combined[:, j], expected, rtol=1e-9, atol=1e-9)
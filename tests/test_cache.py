@@ -0,0 +1,66 @@
+# tests/test_cache.py
+"""共享文件缓存：不同会话拿到的副本互不影响，按 ID 查找玩家复用同一次解析；页面视图缓存的清除范围。"""
+
+import copy
+import pytest
+from game_logic.cache import file_cache
+from game_logic.models import Player, Market, PLAYER_FIELDS
+from game_logic.storage import JsonStorage
+from game_logic.view_cache import get_view, invalidate_views
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield JsonStorage(str(tmp_path))
+    file_cache.invalidate()
+
+
+def test_player_copy_does_not_share_dict_fields():
+    player = Player("p1", "公司", password="pw")
+    player.cpi_per_city = {"城市A": 0.5}
+    clone = copy.copy(player)
+    assert clone.to_dict() == player.to_dict()
+    for field in PLAYER_FIELDS:
+        if field.type is dict:
+            assert getattr(clone, field.name) is not getattr(player, field.name)
+
+
+def test_sessions_do_not_see_each_others_changes(storage):
+    player = Player("p1", "公司", password="pw")
+    player.cpi_per_city = {"城市A": 0.5}
+    storage.save_players_data([player])
+    storage.save_markets_data([Market("城市A")])
+
+    a = storage.load_players_data()[0]
+    a.cpi_per_city["城市A"] = 9.0
+    a.bought_city_reports["城市A"] = True
+    a.capital = 0
+    b = storage.load_players_data()[0]
+    assert (b.cpi_per_city, b.bought_city_reports, b.capital) == ({"城市A": 0.5}, {}, 100000)
+
+    storage.load_markets_data()[0].current_round = 5
+    assert storage.load_markets_data()[0].current_round == 0
+
+
+def test_player_lookup_reuses_the_cached_parse(storage, monkeypatch):
+    storage.save_players_data([Player(f"p{i}", "公司", password="pw") for i in range(3)])
+    storage.load_players_data()
+    reads = []
+    monkeypatch.setattr(storage, "_read", lambda path: reads.append(path))
+    assert storage.load_player("p2").player_id == "p2"
+    assert storage.player_count() == 3
+    assert reads == []
+    storage.load_player("p2").cpi_per_city["城市A"] = 1.0
+    assert storage.load_player("p2").cpi_per_city == {}
+
+
+def test_invalidate_views_by_game_and_player():
+    keys = [("g1", 1, "p1", "overview"), ("g1", 1, "p2", "overview"), ("g2", 1, "p1", "overview")]
+    for key in keys:
+        get_view(key, lambda: "old")
+    invalidate_views("g1", "p1")
+    assert [get_view(key, lambda: "new") for key in keys] == ["new", "old", "old"]
+    invalidate_views("g1")
+    assert [get_view(key, lambda: "newer") for key in keys] == ["newer", "newer", "old"]
+    invalidate_views()
+    assert get_view(keys[2], lambda: "newer") == "newer"
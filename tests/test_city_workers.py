@@ -0,0 +1,33 @@
+# tests/test_city_workers.py
+"""按城市分块并行计算时，结果与线程数无关（BOYI_CITY_WORKERS=1 与多线程逐位相同）。"""
+
+from game_logic import calculations
+from game_logic.calculations import CITY_CHUNK, CITY_WORKERS_ENV
+from game_logic.simulate import generate_game, run_game
+
+NUM_CITIES = 2 * CITY_CHUNK + 5 # 最后一个城市块不满
+
+
+def play(monkeypatch, workers: int):
+    """用 workers 个线程跑同一局随机游戏的 3 个回合，返回 (玩家数据, 市场数据)。"""
+    monkeypatch.setenv(CITY_WORKERS_ENV, str(workers))
+    monkeypatch.setattr(calculations, "_city_executor", None) # 线程池按环境变量重新创建
+    players, markets, settings = generate_game(60, NUM_CITIES, seed=7)
+    try:
+        players, markets, _ = run_game(players, markets, settings, strategy="random", rounds=3, seed=7,
+                                       record_history=False)
+    finally:
+        calculations._get_city_executor().shutdown()
+    return [p.to_dict() for p in players], [m.to_dict() for m in markets]
+
+
+def test_results_independent_of_workers(monkeypatch):
+    assert NUM_CITIES % CITY_CHUNK
+    players_serial, markets_serial = play(monkeypatch, 1)
+    players_parallel, markets_parallel = play(monkeypatch, 4)
+    assert players_parallel == players_serial
+    assert markets_parallel == markets_serial
+    assert any(p["actual_sales_per_city"] for p in players_serial) # 确实有销售，比较的不是空结果
+    # 每城市字段只保存非零项
+    for field in ("cpi_per_city", "hidden_cpi_per_city", "actual_sales_per_city", "stores_per_city"):
+        assert all(value for p in players_serial for value in p[field].values())
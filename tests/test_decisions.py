@@ -0,0 +1,223 @@
+# tests/test_decisions.py
+"""决策日志：事件叠加、报表购买只扣一次款，以及两个存储后端的未结算事件与回合提交。"""
+
+import os
+import pytest
+from game_logic.cache import file_cache
+from game_logic.decisions import (decision_event, purchase_event, fold_decisions, apply_pending,
+                                  apply_decision_log)
+from game_logic.models import Player, Market
+from game_logic.simulate import generate_game, main as simulate_main
+from game_logic.storage import JsonStorage, SqliteStorage
+
+
+def make_player(player_id: str = "p1", capital: float = 1000.0) -> Player:
+    return Player(player_id, f"公司-{player_id}", initial_capital=capital, password="pw")
+
+
+# --- 叠加 ---
+def test_unknown_field_rejected():
+    with pytest.raises(ValueError):
+        decision_event("p1", 1, {"capital": 1e9})
+
+
+def test_later_fields_override_earlier():
+    folded = fold_decisions([
+        decision_event("p1", 1, {"current_price": 10.0, "current_production_plan": 100}),
+        decision_event("p2", 1, {"current_price": 30.0}),
+        decision_event("p1", 1, {"current_price": 12.0}),
+    ])
+    assert folded["p1"]["fields"] == {"current_price": 12.0, "current_production_plan": 100}
+    assert folded["p2"]["fields"] == {"current_price": 30.0}
+
+
+def test_repeated_purchase_folded_once():
+    folded = fold_decisions([purchase_event("p1", 1, "城市A", 100.0), purchase_event("p1", 1, "城市A", 100.0)])
+    assert folded["p1"]["city_reports"] == {"城市A": 100.0}
+
+
+def test_incremental_fold_matches_full_fold():
+    events = [
+        decision_event("p1", 1, {"current_price": 10.0}),
+        purchase_event("p1", 1, "城市A", 100.0),
+        decision_event("p2", 1, {"current_new_stores": {"城市A": 1}}),
+        decision_event("p1", 1, {"current_price": 11.0}),
+        purchase_event("p2", 1, "城市B", 100.0),
+    ]
+    assert fold_decisions(events[3:], fold_decisions(events[:3])) == fold_decisions(events)
+
+
+def test_purchase_charged_once():
+    player = make_player()
+    pending = fold_decisions([purchase_event("p1", 1, "城市A", 100.0)])["p1"]
+    apply_pending(player, pending)
+    apply_pending(player, pending) # 已购买的报表不再扣款
+    assert player.capital == 900.0
+    assert player.net_asset == 900.0
+    assert player.bought_city_reports == {"城市A": True}
+
+
+def test_purchase_skipped_without_capital():
+    player = make_player(capital=50.0)
+    apply_pending(player, fold_decisions([purchase_event("p1", 1, "城市A", 100.0)])["p1"])
+    assert player.capital == 50.0
+    assert not player.bought_city_reports.get("城市A")
+
+
+def test_dict_values_copied():
+    event = decision_event("p1", 1, {"current_new_stores": {"城市A": 1}})
+    player = make_player()
+    apply_pending(player, fold_decisions([event])["p1"])
+    event["fields"]["current_new_stores"]["城市A"] = 5
+    assert player.current_new_stores == {"城市A": 1}
+
+
+def test_apply_decision_log_ignores_unknown_players():
+    players = [make_player("p1"), make_player("p2")]
+    events = [decision_event("p1", 1, {"current_price": 15.0}), decision_event("gone", 1, {"current_price": 1.0})]
+    assert apply_decision_log(players, events) == 1
+    assert players[0].current_price == 15.0
+    assert players[1].current_price == 0
+
+
+# --- 存储后端 ---
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        yield JsonStorage(str(tmp_path))
+    else:
+        yield SqliteStorage(os.path.join(str(tmp_path), "game.db"))
+    file_cache.invalidate()
+
+
+def test_load_player_overlays_pending_events(storage):
+    storage.save_players_data([make_player("p1"), make_player("p2")])
+    storage.append_decision(decision_event("p1", 0, {"current_price": 10.0}))
+    assert storage.load_player("p1").current_price == 10.0
+    # 读取之后追加的事件继续叠加在之前的结果上
+    storage.append_decision(purchase_event("p1", 0, "城市A", 100.0))
+    storage.append_decision(decision_event("p1", 0, {"current_price": 12.0}))
+    player = storage.load_player("p1")
+    assert (player.current_price, player.capital) == (12.0, 900.0)
+    assert storage.load_player("p2").current_price == 0
+    assert storage.load_players_data()[0].current_price == 0 # 原始数据不含未结算事件
+    assert set(storage.pending_decisions()) == {"p1"}
+
+
+def test_commit_round_keeps_events_submitted_during_calculation(storage):
+    storage.save_players_data([make_player("p1")])
+    storage.append_decision(purchase_event("p1", 0, "城市A", 100.0))
+    players = storage.load_players_data()
+    log = storage.load_decision_log()
+    apply_decision_log(players, log)
+    storage.append_decision(decision_event("p1", 0, {"current_price": 20.0})) # 计算期间提交
+    markets = [Market("城市A", current_round=1)]
+    storage.commit_round(players, markets, {"round": 1, "decision_log": log}, decision_events=len(log))
+
+    assert [e.get("fields") for e in storage.load_decision_log()] == [{"current_price": 20.0}]
+    player = storage.load_player("p1")
+    assert (player.capital, player.current_price) == (900.0, 20.0) # 购买只结算一次
+
+
+@pytest.mark.parametrize("storage", ["json"], indirect=True)
+def test_json_commit_failure_leaves_log_with_old_players(storage, monkeypatch):
+    storage.save_players_data([make_player("p1")])
+    storage.append_decision(purchase_event("p1", 0, "城市A", 100.0))
+    players = storage.load_players_data()
+    log = storage.load_decision_log()
+    apply_decision_log(players, log)
+
+    def fail(src, dst):
+        raise OSError("disk full")
+    with monkeypatch.context() as m:
+        m.setattr(os, "replace", fail)
+        with pytest.raises(OSError):
+            storage.commit_round(players, [Market("城市A", current_round=1)], {"round": 1}, decision_events=len(log))
+    # 玩家数据和日志都没有替换：重新推进回合时购买仍只结算一次
+    assert storage.load_players_data()[0].capital == 1000.0
+    assert storage.load_player("p1").capital == 900.0
+
+
+@pytest.mark.parametrize("storage", ["json"], indirect=True)
+@pytest.mark.parametrize("failing_replace", [1, 2, 3]) # 玩家数据、市场数据、压缩后的日志
+def test_json_commit_partial_failure_applies_events_once(storage, monkeypatch, failing_replace):
+    storage.save_players_data([make_player("p1")])
+    storage.save_markets_data([Market("城市A")])
+    storage.append_decision(decision_event("p1", 0, {"current_loan_amount": 500.0}))
+    players = storage.load_players_data()
+    log = storage.load_decision_log()
+    apply_decision_log(players, log)
+    players[0].current_loan_amount = 0 # 回合计算发放贷款后清零
+
+    replace = os.replace
+    calls = []
+    def fail_nth(src, dst):
+        calls.append(dst)
+        if len(calls) == failing_replace:
+            raise OSError("disk full")
+        replace(src, dst)
+    with monkeypatch.context() as m:
+        m.setattr(os, "replace", fail_nth)
+        try:
+            storage.commit_round(players, [Market("城市A", current_round=1)], {"round": 1}, decision_events=len(log))
+        except OSError:
+            pass
+    file_cache.invalidate()
+    reopened = JsonStorage(storage.data_dir)
+    if failing_replace == 1: # 玩家数据没有替换：决策仍未结算
+        assert reopened.load_player("p1").current_loan_amount == 500.0
+    else: # 玩家数据已替换：决策不会再叠加一次，下一回合不会重复贷款
+        assert reopened.load_player("p1").current_loan_amount == 0
+        assert reopened.load_decision_log() == []
+
+
+@pytest.mark.parametrize("storage", ["json"], indirect=True)
+def test_json_log_recreated_after_clear_is_not_skipped(storage):
+    storage.save_players_data([make_player("p1")])
+    storage.append_decision(decision_event("p1", 0, {"current_price": 10.0}))
+    log = storage.load_decision_log()
+    storage.commit_round(storage.load_players_data(), [Market("城市A", current_round=1)], {"round": 1},
+                         decision_events=len(log))
+    storage.clear_decision_log()
+    storage.append_decision(decision_event("p1", 1, {"current_price": 15.0}))
+    assert storage.load_player("p1").current_price == 15.0
+
+
+@pytest.mark.parametrize("storage", ["json"], indirect=True)
+def test_json_restore_skips_old_log_if_removal_fails(storage, monkeypatch):
+    storage.save_players_data([make_player("p1")])
+    storage.commit_round(storage.load_players_data(), [Market("城市A", current_round=1)],
+                         {"round": 1, "player_states": [make_player("p1").to_dict()],
+                          "market_params": [Market("城市A", current_round=1).to_dict()]})
+    storage.append_decision(decision_event("p1", 1, {"current_price": 10.0}))
+
+    def fail(path):
+        raise OSError("busy")
+    with monkeypatch.context() as m:
+        m.setattr(os, "remove", fail)
+        storage.restore_round(1)
+    file_cache.invalidate()
+    reopened = JsonStorage(storage.data_dir)
+    assert reopened.load_decision_log() == []
+    assert reopened.load_player("p1").current_price == 0
+    reopened.append_decision(decision_event("p1", 1, {"current_price": 12.0})) # 之后提交的决策照常叠加
+    assert reopened.load_player("p1").current_price == 12.0
+
+
+@pytest.mark.parametrize("storage", ["json"], indirect=True)
+def test_simulate_save_settles_pending_decisions(storage, monkeypatch):
+    players, markets, settings = generate_game(3, 2, seed=1)
+    storage.save_players_data(players)
+    storage.save_markets_data(markets)
+    storage.save_game_settings(settings)
+    storage.append_decision(decision_event(players[0].player_id, 0, {"current_loan_amount": 500.0}))
+
+    def fail(self, marker):
+        raise OSError("disk full")
+    with monkeypatch.context() as m:
+        m.setattr(JsonStorage, "_compact_to", fail) # 压缩日志失败也不影响：玩家数据中的标记已跳过这条决策
+        simulate_main(["--data-dir", storage.data_dir, "--rounds", "1", "--strategy", "keep", "--save"])
+    file_cache.invalidate()
+    reopened = JsonStorage(storage.data_dir)
+    assert reopened.load_decision_log() == []
+    assert len(reopened.history_rounds()) == 1
@@ -0,0 +1,250 @@
+# tests/test_history.py
+"""回合历史存储：差异编码的往返、索引崩溃恢复、按回合截断，以及其他进程改写后的重新同步。"""
+
+import os
+import pytest
+from game_logic.cache import file_cache
+from game_logic.history import (RoundHistoryStore, _INDEX_RECORD, diff_player_state, apply_player_delta,
+                                encode_round, decode_round)
+from game_logic.storage import JsonStorage
+
+
+def make_round(round_number: int, num_players: int = 3) -> dict:
+    """构造一个回合快照，每回合资金和每城市字段都有变化。"""
+    return {
+        'round': round_number,
+        'market_params': [{'name': '城市A', 'current_round': round_number}],
+        'player_states': [
+            {
+                'player_id': f'player{i}',
+                'capital': 1000.0 * (i + 1) + round_number,
+                'cpi_per_city': {'城市A': 0.1 * round_number, **({'城市B': 0.5} if round_number % 2 else {})},
+                'main_city': '城市A',
+            }
+            for i in range(num_players)
+        ],
+    }
+
+
+# --- 差异编码 ---
+@pytest.mark.parametrize("old, new", [
+    ({}, {'player_id': 'p', 'capital': 1.0}),
+    ({'capital': 1.0, 'debt': 0.0}, {'capital': 1.0, 'debt': 0.0}),
+    ({'capital': 1.0, 'debt': 5.0}, {'capital': 2.0, 'debt': 5.0}),
+    ({'capital': 1.0, 'legacy': True}, {'capital': 1.0}),
+    ({'cpi': {'A': 0.1, 'B': 0.2}}, {'cpi': {'A': 0.3, 'C': 0.4}}),
+    ({'cpi': {'A': 0.1}}, {'cpi': {}}),
+    ({'cpi': {'A': 0.1}}, {'cpi': 0.5}), # 字段类型变化
+    ({'cpi': None}, {'cpi': {'A': 0.1}}),
+])
+def test_player_delta_round_trip(old, new):
+    delta = diff_player_state(old, new)
+    assert apply_player_delta(old, delta) == new
+    if old == new:
+        assert delta == {}
+
+
+def test_dict_delta_records_only_changed_keys():
+    old = {'cpi': {f'城市{i}': 0.1 for i in range(50)}}
+    new = {'cpi': {**old['cpi'], '城市3': 0.2}}
+    assert diff_player_state(old, new) == {'dict': {'cpi': {'set': {'城市3': 0.2}}}}
+
+
+def test_apply_player_delta_does_not_modify_input():
+    old = {'capital': 1.0, 'cpi': {'A': 0.1}}
+    apply_player_delta(old, diff_player_state(old, {'capital': 2.0, 'cpi': {'A': 0.5}}))
+    assert old == {'capital': 1.0, 'cpi': {'A': 0.1}}
+
+
+def test_encode_decode_round_trip():
+    previous = make_round(1)
+    current = make_round(2)
+    record = encode_round(previous, current)
+    assert not record['keyframe'] and 'player_order' not in record
+    assert decode_round(previous, record) == current
+
+
+def test_encode_decode_with_added_removed_and_reordered_players():
+    previous = make_round(1, num_players=4)
+    current = make_round(2, num_players=5)
+    del current['player_states'][1]
+    current['player_states'].reverse()
+    record = encode_round(previous, current)
+    assert record['player_order'] == [p['player_id'] for p in current['player_states']]
+    assert decode_round(previous, record) == current
+
+
+def test_unchanged_round_has_no_player_deltas():
+    state = make_round(3)
+    record = encode_round(state, make_round(3))
+    assert record['player_deltas'] == {}
+    assert decode_round(state, record) == state
+
+
+def test_extra_round_keys_are_kept():
+    previous = make_round(1)
+    current = {**make_round(2), 'decision_log': [{'player_id': 'player0', 'fields': {'current_price': 20.0}}]}
+    assert decode_round(previous, encode_round(previous, current)) == current
+
+
+def test_keyframe_record_decodes_without_previous():
+    current = make_round(4)
+    assert decode_round({}, {'round': 4, 'keyframe': True, 'data': current}) == current
+
+
+# --- 存储 ---
+@pytest.fixture
+def data_dir(tmp_path):
+    yield str(tmp_path)
+    file_cache.invalidate() # 不同测试之间不共享缓存的最后快照
+
+
+def fill(data_dir, rounds, keyframe_interval=3):
+    store = RoundHistoryStore(data_dir, keyframe_interval=keyframe_interval)
+    for r in rounds:
+        store.append(make_round(r))
+    return store
+
+
+def test_append_and_load_round_trip(data_dir):
+    store = fill(data_dir, range(1, 8))
+    assert store.rounds() == list(range(1, 8))
+    for r in range(1, 8):
+        assert store.load_round(r) == make_round(r)
+    assert store.load_all() == [make_round(r) for r in range(1, 8)]
+    assert RoundHistoryStore(data_dir, keyframe_interval=3).load_round(7) == make_round(7)
+
+
+def test_recover_rebuilds_missing_index_entries(data_dir):
+    store = fill(data_dir, range(1, 6))
+    # 进程在写入数据之后、写入索引之前中断：索引只剩前两条
+    with open(store.index_file, 'r+b') as f:
+        f.truncate(2 * _INDEX_RECORD.size)
+    file_cache.invalidate()
+    recovered = RoundHistoryStore(data_dir, keyframe_interval=3)
+    assert recovered.rounds() == [1, 2, 3, 4, 5]
+    assert recovered.load_round(5) == make_round(5)
+    assert os.path.getsize(store.index_file) == 5 * _INDEX_RECORD.size
+
+
+def test_recover_drops_half_written_index_record(data_dir):
+    store = fill(data_dir, range(1, 4))
+    with open(store.index_file, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    file_cache.invalidate()
+    recovered = RoundHistoryStore(data_dir, keyframe_interval=3)
+    assert recovered.rounds() == [1, 2, 3]
+    assert os.path.getsize(store.index_file) == 3 * _INDEX_RECORD.size
+
+
+def test_recover_discards_half_written_data_line(data_dir):
+    store = fill(data_dir, range(1, 4))
+    size = os.path.getsize(store.data_file)
+    with open(store.data_file, 'ab') as f:
+        f.write(b'{"round": 4, "keyframe": fal')
+    file_cache.invalidate()
+    recovered = RoundHistoryStore(data_dir, keyframe_interval=3)
+    assert recovered.rounds() == [1, 2, 3]
+    assert os.path.getsize(store.data_file) == size
+    recovered.append(make_round(4))
+    assert RoundHistoryStore(data_dir, keyframe_interval=3).load_round(4) == make_round(4)
+
+
+def test_truncate_after_round(data_dir):
+    store = fill(data_dir, range(1, 8))
+    store.truncate_after_round(4)
+    assert store.rounds() == [1, 2, 3, 4]
+    assert store.load_round(5) is None
+    # 截断后继续追加：差异以第 4 回合为基准，而不是截断前缓存的第 7 回合
+    changed = make_round(5)
+    changed['player_states'][0]['capital'] = -1.0
+    store.append(changed)
+    assert store.load_round(5) == changed
+    file_cache.invalidate()
+    reopened = RoundHistoryStore(data_dir, keyframe_interval=3)
+    assert reopened.rounds() == [1, 2, 3, 4, 5]
+    assert reopened.load_round(4) == make_round(4)
+    assert reopened.load_round(5) == changed
+
+
+def test_clear(data_dir):
+    store = fill(data_dir, range(1, 4))
+    store.clear()
+    assert store.rounds() == []
+    store.append(make_round(1))
+    assert store.load_all() == [make_round(1)]
+
+
+# --- 多进程：另一个实例（相当于另一个进程）改写历史后，本实例的索引随之更新 ---
+def test_sees_rounds_appended_by_another_store(data_dir):
+    reader = fill(data_dir, range(1, 3))
+    writer = RoundHistoryStore(data_dir, keyframe_interval=3)
+    for r in range(3, 6):
+        writer.append(make_round(r))
+    assert reader.rounds() == [1, 2, 3, 4, 5]
+    assert reader.load_round(5) == make_round(5)
+    assert list(reader.iter_rounds()) == [make_round(r) for r in range(1, 6)]
+
+
+def test_sees_truncation_by_another_store(data_dir):
+    reader = fill(data_dir, range(1, 8))
+    assert reader.load_round(7) == make_round(7)
+    writer = RoundHistoryStore(data_dir, keyframe_interval=3)
+    writer.truncate_after_round(3)
+    changed = make_round(4)
+    changed['player_states'][1]['capital'] = -1.0
+    writer.append(changed)
+    assert reader.rounds() == [1, 2, 3, 4]
+    assert reader.load_round(4) == changed
+    assert reader.load_round(7) is None
+
+
+def test_append_after_another_store_appended(data_dir):
+    first = fill(data_dir, [1])
+    other = RoundHistoryStore(data_dir, keyframe_interval=3)
+    changed = make_round(2)
+    changed['player_states'][0]['main_city'] = '城市B'
+    other.append(changed)
+    # 在另一个进程中，first 缓存的最后快照仍是第 1 回合；差异必须以文件中的第 2 回合为基准
+    file_cache.remember(data_dir, first._last_state_key, (make_round(1), 0), 0)
+    first.append(make_round(3))
+    file_cache.invalidate()
+    assert RoundHistoryStore(data_dir, keyframe_interval=3).load_round(3) == make_round(3)
+
+
+def test_sees_clear_by_another_store(data_dir):
+    reader = fill(data_dir, range(1, 4))
+    RoundHistoryStore(data_dir, keyframe_interval=3).clear()
+    assert reader.rounds() == []
+    assert reader.load_round(1) is None
+
+
+# --- 城市报表快照（玩家端与管理端在不同进程中各有一个存储实例）---
+def test_city_reports_written_by_another_storage(data_dir):
+    admin, player_side = JsonStorage(data_dir), JsonStorage(data_dir)
+    admin.save_city_reports({'round': 1, 'cities': {'城市A': 1}})
+    assert player_side.load_city_reports(1) == {'round': 1, 'cities': {'城市A': 1}}
+    admin.save_city_reports({'round': 2, 'cities': {'城市A': 2}})
+    assert player_side.load_city_reports(2) == {'round': 2, 'cities': {'城市A': 2}}
+    assert player_side.history_rounds() == []
+    # 回退后重新写入同一回合，另一个实例不会读到缓存的旧快照
+    admin.city_reports.truncate_after_round(1)
+    admin.save_city_reports({'round': 2, 'cities': {'城市A': 3}})
+    assert player_side.load_city_reports(2) == {'round': 2, 'cities': {'城市A': 3}}
+
+
+def test_reads_uncompressed_records(data_dir):
+    # compression_level=0 与旧版本写入的记录相同；压缩存储可以继续读取并追加
+    fill(data_dir, range(1, 5), keyframe_interval=3)
+    with open(os.path.join(data_dir, 'rounds_history.jsonl'), 'rb') as f:
+        assert b'"z"' in f.readline()
+    plain_dir = os.path.join(data_dir, 'plain')
+    plain = RoundHistoryStore(plain_dir, keyframe_interval=3, compression_level=0)
+    for r in range(1, 5):
+        plain.append(make_round(r))
+    with open(plain.data_file, 'rb') as f:
+        assert b'"z"' not in f.read()
+    file_cache.invalidate()
+    store = RoundHistoryStore(plain_dir, keyframe_interval=3)
+    store.append(make_round(5))
+    assert store.load_all() == [make_round(r) for r in range(1, 6)]
@@ -0,0 +1,92 @@
+# tests/test_validation.py
+"""calculations.validate_decisions 对每种决策给出的执行值和调整原因。"""
+
+import pytest
+from game_logic.calculations import (
+    validate_decisions, _market_arrays, _player_arrays, ADJUSTMENT_REASONS,
+    ADJUST_NEGATIVE, ADJUST_FUNDS, ADJUST_CAPACITY, ADJUST_EMPLOYEES, ADJUST_DEBT,
+    ADJUST_PRICE_RANGE, ADJUST_PRICE_DEFAULT,
+)
+from game_logic.models import Player, Market, GameSettings
+
+# 默认参数：材料 5/单位，工资 10/人，员工 10 人 × 效率 40 = 400 单位，产能 1000
+CITY = "城市A"
+UNIT_MATERIAL = 5.0
+WAGES = 10 * 10.0
+
+
+def validate(**fields):
+    """按给定字段构造一位玩家（其余为默认值，定价 20、计划 300），返回 (该玩家的执行值, 调整原因, DecisionValidation)。"""
+    player = Player("p1", "公司1", password="pw")
+    player.current_price = 20.0
+    player.current_production_plan = 300
+    for name, value in fields.items():
+        setattr(player, name, value)
+    markets = [Market(CITY, base_material_cost=UNIT_MATERIAL, base_labor_cost=10.0)]
+    names, _, material, labor, rate, ref_price = _market_arrays(markets)
+    arrays = _player_arrays([player], {name: j for j, name in enumerate(names)})
+    result = validate_decisions(arrays, material, labor, rate, ref_price, GameSettings())
+    actual = {name: value[0] for name, value in result.actual.items()}
+    reasons = {name: int(value[0]) for name, value in result.reasons.items()}
+    return actual, reasons, result
+
+
+def test_valid_decisions_not_adjusted():
+    actual, reasons, result = validate()
+    assert not any(reasons.values())
+    assert actual["plan"] == 300
+    assert len(result.adjusted()) == 0
+    assert result.player_report(0) == {}
+
+
+@pytest.mark.parametrize("fields, name, reason, expected", [
+    ({"current_loan_amount": -100}, "loan", ADJUST_NEGATIVE, 0),
+    ({"current_repay_loan_amount": -100}, "repay", ADJUST_NEGATIVE, 0),
+    ({"debt": 500.0, "current_repay_loan_amount": 800}, "repay", ADJUST_DEBT, 500),
+    ({"debt": 5000.0, "capital": 1000.0, "current_repay_loan_amount": 3000, "current_production_plan": 0},
+     "repay", ADJUST_FUNDS, 1000),
+    ({"current_price": 0.0}, "price", ADJUST_PRICE_DEFAULT, 20.0),
+    ({"current_price": 500.0}, "price", ADJUST_PRICE_RANGE, 100.0),
+    ({"current_production_plan": -10}, "plan", ADJUST_NEGATIVE, 0),
+    ({"employees": 100, "current_production_plan": 2000}, "plan", ADJUST_CAPACITY, 1000),
+    ({"current_production_plan": 600}, "plan", ADJUST_EMPLOYEES, 400),
+    ({"capital": WAGES + 200 * UNIT_MATERIAL}, "plan", ADJUST_FUNDS, 200),
+    ({"current_new_stores": {CITY: -1}}, "new_stores", ADJUST_NEGATIVE, 0),
+    ({"current_new_stores": {CITY: 20}}, "new_stores", ADJUST_FUNDS, 0),
+    ({"current_advertising_budget": -1}, "advertising", ADJUST_NEGATIVE, 0),
+    ({"current_performance_investment": -1}, "performance", ADJUST_NEGATIVE, 0),
+    ({"current_welfare_investment": -1}, "welfare", ADJUST_NEGATIVE, 0),
+])
+def test_reason_codes(fields, name, reason, expected):
+    actual, reasons, result = validate(**fields)
+    assert reasons[name] == reason
+    assert actual[name].sum() == pytest.approx(expected)
+    assert [other for other, code in reasons.items() if code] == [name]
+    assert result.player_report(0)[name]["reason"] == ADJUSTMENT_REASONS[reason]
+
+
+@pytest.mark.parametrize("name, field", [
+    ("advertising", "current_advertising_budget"),
+    ("performance", "current_performance_investment"),
+    ("welfare", "current_welfare_investment"),
+])
+def test_spending_cut_to_remaining_budget(name, field):
+    # 资金在支付工资和生产之后只剩 1000
+    capital = WAGES + 300 * UNIT_MATERIAL + 1000
+    actual, reasons, _ = validate(capital=capital, **{field: 5000})
+    assert reasons[name] == ADJUST_FUNDS
+    assert actual[name] == pytest.approx(1000)
+
+
+def test_fractional_plan_rounded_down_without_reason():
+    # 资金充足，计划带小数：向下取整执行，不报告为资金不足
+    actual, reasons, _ = validate(current_production_plan=300.5)
+    assert actual["plan"] == 300
+    assert reasons["plan"] == 0
+
+
+def test_funds_cover_rounded_plan():
+    # 资金恰好够生产取整后的数量
+    actual, reasons, _ = validate(capital=WAGES + 300 * UNIT_MATERIAL, current_production_plan=300.5)
+    assert actual["plan"] == 300
+    assert reasons["plan"] == 0